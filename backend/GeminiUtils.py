@@ -6,6 +6,12 @@ import os
 import json
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from llm_gateway import Provider, gateway
+from log_utils import get_logger
+from metrics import span
+
+logger = get_logger(__name__)
 
 # ============================================
 # 1️⃣ Environment Setup
@@ -13,42 +19,72 @@ import google.generativeai as genai
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Point at a compatible REST endpoint instead of Google (e.g. bench/'s stand-in)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 
 if GEMINI_API_KEY:
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("✅ [Gemini] API key configured successfully.")
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=GEMINI_API_KEY, transport="rest",
+                            client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=GEMINI_API_KEY)
+        logger.info("✅ [Gemini] API key configured successfully.")
     except Exception as e:
-        print(f"🔥 [Gemini Error] Failed to configure Gemini: {e}")
+        logger.error("🔥 [Gemini Error] Failed to configure Gemini: %s", e)
 else:
-    print("🔥 [Gemini Error] GEMINI_API_KEY not found in environment variables.")
+    logger.error("🔥 [Gemini Error] GEMINI_API_KEY not found in environment variables.")
     raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
 # Use the latest Gemini model
 MODEL_NAME = "gemini-2.5-flash"
 model = genai.GenerativeModel(MODEL_NAME)
-print(f"✅ [Gemini] Model '{MODEL_NAME}' loaded successfully.")
+logger.info("✅ [Gemini] Model '%s' loaded successfully.", MODEL_NAME)
+
+# Every request goes through the shared LLM gateway: a concurrency
+# limit, one deadline per call, jittered retries on transient errors
+# and a circuit breaker.
+gateway.register(Provider(
+    "gemini",
+    max_concurrency=int(os.getenv("LLM_GEMINI_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("LLM_GEMINI_TIMEOUT_SECONDS", "30")),
+    retry_on=(
+        google_exceptions.ServerError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        TimeoutError,
+        ConnectionError,
+    ),
+))
+
+
+def _generate(prompt: str):
+    """model.generate_content() with the gateway's per-attempt timeout."""
+    return gateway.call("gemini", lambda timeout: model.generate_content(prompt, request_options={"timeout": timeout}))
 
 
 # ============================================
 # 2️⃣ Gemini General Chat Interface
 # ============================================
 
+@span("gemini.generate_response")
 def gemini_generate_response(prompt: str, history: list = None) -> str:
     """
     Conversational mode — maintains context if history is given.
     Used for reflective reasoning or follow-up dialogue.
     """
     try:
-        print(f"🔹 [Gemini Chat] Sending prompt: {prompt[:80]}...")
+        logger.debug("🔹 [Gemini Chat] Sending prompt: %s...", prompt[:80])
         chat = model.start_chat(history=history if history else [])
-        response = chat.send_message(prompt)
+        response = gateway.call(
+            "gemini", lambda timeout: chat.send_message(prompt, request_options={"timeout": timeout})
+        )
         result = response.text.strip()
-        print(f"🌟 [Gemini Chat Output]: {result[:200]}")
+        logger.debug("🌟 [Gemini Chat Output]: %s", result[:200])
         return result
     except Exception as e:
         error_msg = f"🔥 [Gemini Chat Error] {str(e)}"
-        print(error_msg)
+        logger.error("%s", error_msg)
         return "I'm sorry, I couldn't process that right now."
 
 
@@ -56,24 +92,25 @@ def gemini_generate_response(prompt: str, history: list = None) -> str:
 # 3️⃣ Gemini Quick Task Utility
 # ============================================
 
+@span("gemini.quick_task")
 def gemini_quick_task(prompt: str, fallback_text: str = "Mindful Moment") -> str:
     """
     Lightweight one-shot generation — used for titles, naming, or short tasks.
     """
     try:
-        print(f"🔹 [Gemini Task] Sending quick prompt: {prompt[:80]}...")
-        response = model.generate_content(prompt)
+        logger.debug("🔹 [Gemini Task] Sending quick prompt: %s...", prompt[:80])
+        response = _generate(prompt)
         result = response.text.strip()
 
         if not result or "error" in result.lower():
-            print(f"⚠️ [Gemini Task Warning] Invalid or empty response: {result}")
+            logger.warning("⚠️ [Gemini Task Warning] Invalid or empty response: %s", result)
             return fallback_text
 
-        print(f"🌟 [Gemini Task Output]: {result}")
+        logger.debug("🌟 [Gemini Task Output]: %s", result)
         return result
 
     except Exception as e:
-        print(f"🔥 [Gemini Task Error] {e}")
+        logger.error("🔥 [Gemini Task Error] %s", e)
         return fallback_text
 
 
@@ -81,6 +118,7 @@ def gemini_quick_task(prompt: str, fallback_text: str = "Mindful Moment") -> str
 # 4️⃣ Emotion & Tone Classification (Text Only)
 # ============================================
 
+@span("gemini.classify_emotion_and_tone")
 def gemini_classify_emotion_and_tone(text: str) -> dict:
     """
     Uses Gemini's language understanding to semantically classify emotion and tone.
@@ -107,10 +145,10 @@ User text:
 """
 
     try:
-        print(f"🔹 [Gemini Emotion] Analyzing text: '{text[:80]}...'")
-        response = model.generate_content(prompt)
+        logger.debug("🔹 [Gemini Emotion] Analyzing text: '%s...'", text[:80])
+        response = _generate(prompt)
         text_response = response.text.strip()
-        print(f"🧠 [Gemini Emotion Output]: {text_response}")
+        logger.debug("🧠 [Gemini Emotion Output]: %s", text_response)
 
         json_str = text_response[text_response.find('{'):text_response.rfind('}') + 1]
         if json_str:
@@ -121,11 +159,11 @@ User text:
                 "confidence": data.get("confidence", 0.5)
             }
         else:
-            print("⚠️ [Gemini Emotion Warning] No valid JSON found.")
+            logger.warning("⚠️ [Gemini Emotion Warning] No valid JSON found.")
             return {"emotion": "neutral", "tone": "neutral", "confidence": 0.0}
 
     except Exception as e:
-        print(f"🔥 [Gemini Emotion Error] {str(e)}")
+        logger.error("🔥 [Gemini Emotion Error] %s", str(e))
         return {"emotion": "neutral", "tone": "neutral", "confidence": 0.0}
 
 
@@ -133,18 +171,7 @@ User text:
 # 5️⃣ Session Summarization (For Memory Pipeline)
 # ============================================
 
-def gemini_summarize_session(conversation_history: list) -> dict:
-    """
-    Summarizes a complete chat session for long-term memory storage.
-    This is called when the session ends or is inactive.
-    """
-    prompt = f"""
-You are a professional session summarization AI for a mental health and wellbeing assistant.
-Your role is to create a structured, concise, emotionally aware summary of the conversation.
-
-Conversation History (JSON list of user and assistant messages):
-{json.dumps(conversation_history, ensure_ascii=False)}
-
+_SUMMARY_JSON_SPEC = """
 Generate a JSON summary capturing:
 1. "summary": A short paragraph (2-3 sentences) describing what the session was about and the user's mental/emotional focus.
 2. "emotional_trend": One word describing the change in mood (improving / declining / stable / unclear).
@@ -152,38 +179,60 @@ Generate a JSON summary capturing:
 4. "confidence": A float (0.0–1.0) estimating how confident you are about your interpretation.
 
 Output ONLY JSON in this exact structure:
-{{
+{
   "summary": "<text>",
   "emotional_trend": "<trend>",
   "topics": ["topic1", "topic2"],
   "confidence": <float>
-}}
+}
 """
 
+
+def _parse_summary(text_response: str):
+    """Summary dict from a Gemini reply, or None if it holds no JSON object."""
+    json_str = text_response[text_response.find('{'):text_response.rfind('}') + 1]
+    if not json_str:
+        return None
+    summary = json.loads(json_str)
+    summary.setdefault("confidence", 0.8)
+    summary.setdefault("topics", [])
+    summary.setdefault("emotional_trend", "unclear")
+    return summary
+
+
+@span("gemini.summarize_session")
+def gemini_summarize_session(conversation_history: list) -> dict:
+    """
+    Summarizes a complete chat session for long-term memory storage.
+    `conversation_history` is a list of {"role", "text"} turns.
+    """
+    prompt = f"""
+You are a professional session summarization AI for a mental health and wellbeing assistant.
+Your role is to create a structured, concise, emotionally aware summary of the conversation.
+
+Conversation History (JSON list of user and assistant messages):
+{json.dumps(conversation_history, ensure_ascii=False)}
+{_SUMMARY_JSON_SPEC}"""
+
     try:
-        print("🔹 [Gemini Summary] Generating session summary...")
-        response = model.generate_content(prompt)
+        logger.debug("🔹 [Gemini Summary] Generating session summary...")
+        response = _generate(prompt)
         text_response = response.text.strip()
-        print(f"🧩 [Gemini Summary Output]: {text_response}")
+        logger.debug("🧩 [Gemini Summary Output]: %s", text_response)
 
-        json_str = text_response[text_response.find('{'):text_response.rfind('}') + 1]
-        if json_str:
-            summary = json.loads(json_str)
-            summary.setdefault("confidence", 0.8)
-            summary.setdefault("topics", [])
-            summary.setdefault("emotional_trend", "unclear")
+        summary = _parse_summary(text_response)
+        if summary is not None:
             return summary
-        else:
-            print("⚠️ [Gemini Summary Warning] No JSON found in output.")
-            return {
-                "summary": "No summary available.",
-                "emotional_trend": "unclear",
-                "topics": [],
-                "confidence": 0.0
-            }
+        logger.warning("⚠️ [Gemini Summary Warning] No JSON found in output.")
+        return {
+            "summary": "No summary available.",
+            "emotional_trend": "unclear",
+            "topics": [],
+            "confidence": 0.0
+        }
 
     except Exception as e:
-        print(f"🔥 [Gemini Summary Error] {str(e)}")
+        logger.error("🔥 [Gemini Summary Error] %s", str(e))
         return {
             "summary": "Session summary could not be generated.",
             "emotional_trend": "unknown",
@@ -192,10 +241,84 @@ Output ONLY JSON in this exact structure:
         }
 
 
+@span("gemini.update_session_summary")
+def gemini_update_session_summary(previous_summary: dict, new_turns: list):
+    """
+    Folds the turns since the last summary into it.
+    `new_turns` is a list of {"role", "text"} turns. Returns the updated
+    summary dict, or None if Gemini fails (callers re-summarize in full).
+    """
+    prompt = f"""
+You are a professional session summarization AI for a mental health and wellbeing assistant.
+You are updating the summary of an ongoing conversation: the existing summary already covers
+everything before the new messages. The updated summary must describe the whole session.
+
+Existing summary (JSON):
+{json.dumps(previous_summary, ensure_ascii=False)}
+
+New messages since that summary (JSON list of user and assistant messages):
+{json.dumps(new_turns, ensure_ascii=False)}
+{_SUMMARY_JSON_SPEC}"""
+
+    try:
+        logger.debug("🔹 [Gemini Summary] Folding %s new turns into session summary...", len(new_turns))
+        response = _generate(prompt)
+        text_response = response.text.strip()
+        logger.debug("🧩 [Gemini Summary Update Output]: %s", text_response)
+        summary = _parse_summary(text_response)
+        if summary is None:
+            logger.warning("⚠️ [Gemini Summary Warning] No JSON found in update output.")
+        return summary
+    except Exception as e:
+        logger.error("🔥 [Gemini Summary Update Error] %s", e)
+        return None
+
+
+# ============================================
+# 6️⃣ Rolling Context Compaction (In-Session Memory)
+# ============================================
+
+@span("gemini.compact_conversation")
+def gemini_compact_conversation(previous_summary: str, turns: list) -> str:
+    """
+    Folds older turns of the current session into a running summary.
+    `turns` is a list of {"user_input", "gpt_response"} dicts.
+    Returns the updated summary text, or None if Gemini fails.
+    """
+    transcript = "\n".join(
+        f"User: {t.get('user_input', '')}\nAssistant: {t.get('gpt_response', '')}" for t in turns
+    )
+    prompt = f"""
+You maintain a running summary of an ongoing mental health support conversation.
+The summary replaces older messages in the assistant's context window, so it must keep
+everything needed to continue the conversation naturally: the user's situation, feelings,
+important names/events, coping strategies already suggested, and any open questions.
+
+Current summary (may be empty):
+{previous_summary or "(none)"}
+
+New turns to fold into the summary:
+{transcript}
+
+Write the updated summary as plain text, at most 150 words, third person ("The user ...").
+Output ONLY the summary.
+"""
+    try:
+        logger.debug("🔹 [Gemini Compact] Folding %s turns into running summary...", len(turns))
+        response = _generate(prompt)
+        result = response.text.strip()
+        logger.debug("🧩 [Gemini Compact Output]: %s", result[:200])
+        return result or None
+    except Exception as e:
+        logger.error("🔥 [Gemini Compact Error] %s", e)
+        return None
+
+
 # ============================================
-# 6️⃣ Optional: Context Relevance (for future)
+# 7️⃣ Optional: Context Relevance (for future)
 # ============================================
 
+@span("gemini.assess_relevance")
 def gemini_assess_relevance(new_message: str, past_summary: str) -> float:
     """
     Determines how relevant a previous session summary is to the new message.
@@ -215,13 +338,13 @@ Output ONLY a float between 0.0 and 1.0 indicating how relevant the past summary
 (0.0 = completely unrelated, 1.0 = directly related).
 """
     try:
-        response = model.generate_content(prompt)
+        response = _generate(prompt)
         score_text = response.text.strip()
-        print(f"🔹 [Gemini Relevance Output]: {score_text}")
+        logger.debug("🔹 [Gemini Relevance Output]: %s", score_text)
         try:
             return float(score_text)
         except ValueError:
             return 0.5
     except Exception as e:
-        print(f"🔥 [Gemini Relevance Error] {e}")
+        logger.error("🔥 [Gemini Relevance Error] %s", e)
         return 0.5
@@ -3,13 +3,20 @@
 # ===========================================================
 
 import os
+import time
 import re
-import speech_recognition as sr
-from openai import OpenAI
-from transformers import pipeline
+import json
+import httpx
+import numpy as np
+from openai import (
+    APIConnectionError,
+    DefaultHttpxClient,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
 from dotenv import load_dotenv
-import traceback
-from datetime import datetime, timezone
+from concurrent.futures import Future
 
 # Firebase helpers
 from firebase_utils import (
@@ -17,35 +24,178 @@ from firebase_utils import (
     update_session_title,
     get_session_details,
     get_user_recent_summaries,
+    list_sessions_page,
     save_session_summary,
-    get_last_message_time,
+    find_idle_sessions,
 )
 
 # Gemini utilities
-from GeminiUtils import (
-    gemini_quick_task,
-    gemini_summarize_session,
-)
+from GeminiUtils import gemini_generate_response, gemini_quick_task
+
+from emotion_batcher import MicroBatcher
+from model_registry import ModelRegistry
+from context_builder import build_context_messages, compact_session_context
+from prompt_builder import SYSTEM_PROMPT, render_turn_context, token_usage
+from job_queue import JobQueue
+from onnx_backend import INFERENCE_BACKEND, MANIFEST_FILE_NAME, artifact_dir, load_pipeline
+from emotion_cache import EmotionCache, model_fingerprint
+from stage_runner import Stage, StageRunner
+from audio_utils import AUDIO_SAMPLE_RATE, decode_audio_file, split_windows, trim_silence
+from asr_backend import create_transcriber
+from session_sweeper import SESSION_SWEEPER_ENABLED, SessionSweeper
+from session_summarizer import SessionSummarizer
+from summary_index import MEMORY_EMBED_MODEL_ID, MEMORY_RETRIEVAL, SummaryIndex, embed_texts
+from llm_gateway import LLM_FAILOVER, LLMUnavailable, Provider, gateway as llm
+from log_utils import get_logger
+from metrics import observe, registry, span
+
+logger = get_logger(__name__)
 
 # ===========================================================
 # Initialization
 # ===========================================================
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-print("🔊 Initializing tone classifier...")
-tone_classifier = pipeline(
-    "audio-classification",
-    model="ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition"
+# One pooled HTTP client per process; retries and timeouts are owned by
+# the LLM gateway (deadline per call, jittered backoff, circuit breaker)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("LLM_OPENAI_MAX_CONCURRENCY", "16"))
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=0,
+    http_client=DefaultHttpxClient(limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONCURRENCY * 2,  # room for hedged duplicates
+        max_keepalive_connections=OPENAI_MAX_CONCURRENCY,
+    )),
+)
+llm.register(Provider(
+    "openai",
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+    timeout=float(os.getenv("LLM_OPENAI_TIMEOUT_SECONDS", "30")),
+    retry_on=(APIConnectionError, RateLimitError, InternalServerError),  # APITimeoutError is a connection error
+))
+
+TONE_MODEL_ID = "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition"
+TEXT_MODEL_ID = "j-hartmann/emotion-english-distilroberta-base"
+TONE_SAMPLE_RATE = AUDIO_SAMPLE_RATE  # voice uploads are decoded once at this rate
+
+# lazy    → load each model on first use (fast worker boot)
+# preload → load at import; pair with `gunicorn --preload` to share weights across workers
+# warmup  → load and run a dummy inference in the background at worker start
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "lazy").strip().lower()
+
+
+def _load_tone_classifier():
+    logger.info("🔊 Initializing tone classifier...")
+    return load_pipeline("audio-classification", TONE_MODEL_ID)
+
+
+def _load_text_classifier():
+    logger.info("📝 Initializing text emotion classifier...")
+    return load_pipeline("text-classification", TEXT_MODEL_ID, top_k=None)
+
+
+def _load_summary_embedder():
+    logger.info("🧭 Initializing summary embedding model...")
+    return load_pipeline("feature-extraction", MEMORY_EMBED_MODEL_ID)
+
+
+def _warmup_tone_classifier(classifier):
+    classifier({"raw": np.zeros(TONE_SAMPLE_RATE, dtype=np.float32), "sampling_rate": TONE_SAMPLE_RATE})
+
+
+def _warmup_text_classifier(classifier):
+    classifier(["warming up"], batch_size=1, truncation=True)
+
+
+models = ModelRegistry(mode=MODEL_LOAD_MODE)
+models.register("tone", _load_tone_classifier, warmup=_warmup_tone_classifier)
+models.register("text", _load_text_classifier, warmup=_warmup_text_classifier)
+if MEMORY_RETRIEVAL:
+    models.register("embedder", _load_summary_embedder, warmup=lambda e: embed_texts(e, ["warming up"]))
+
+# ASR_BACKEND=local also registers the speech model as "asr"
+transcriber = create_transcriber(models)
+
+
+@span("text_classifier")
+def _classify_text_batch(texts):
+    """Run the text classifier over a padded batch of inputs."""
+    return models.get("text")(texts, batch_size=len(texts), truncation=True)
+
+
+# Concurrent /text requests share forward passes through the batcher
+TEXT_BATCH_MAX_SIZE = int(os.getenv("TEXT_BATCH_MAX_SIZE", "16"))
+TEXT_BATCH_MAX_WAIT_MS = float(os.getenv("TEXT_BATCH_MAX_WAIT_MS", "10"))
+text_batcher = MicroBatcher(
+    _classify_text_batch,
+    max_batch_size=TEXT_BATCH_MAX_SIZE,
+    max_wait_ms=TEXT_BATCH_MAX_WAIT_MS,
+    name="text-emotion",
 )
-print("📝 Initializing text emotion classifier...")
-text_classifier = pipeline(
-    "text-classification",
-    model="j-hartmann/emotion-english-distilroberta-base",
-    top_k=None
+
+
+# Repeated short messages ("thanks", "idk") are answered from a memo
+# cache instead of the classifier. Keys are scoped by a fingerprint of
+# everything that can change the model's outputs.
+def _text_model_fingerprint():
+    try:
+        from importlib.metadata import version
+        transformers_version = version("transformers")
+    except Exception:
+        transformers_version = "unknown"
+    export_stamp = ""
+    if INFERENCE_BACKEND == "onnx":
+        try:
+            with open(os.path.join(artifact_dir(TEXT_MODEL_ID), MANIFEST_FILE_NAME), encoding="utf-8") as f:
+                export_stamp = json.load(f).get("exported_at", "")
+        except (OSError, ValueError):
+            pass
+    return model_fingerprint(
+        TEXT_MODEL_ID, INFERENCE_BACKEND, transformers_version, export_stamp,
+        os.getenv("EMOTION_CACHE_VERSION", "1"),
+    )
+
+
+emotion_cache = EmotionCache(
+    _text_model_fingerprint(),
+    max_entries=int(os.getenv("EMOTION_CACHE_MAX_ENTRIES", "4096")),
+    db_path=os.getenv("EMOTION_CACHE_DB") or None,
+    max_chars=int(os.getenv("EMOTION_CACHE_MAX_CHARS", "280")),
 )
-print("✅ AI models loaded successfully.")
+
+
+def classify_text_emotions(user_input) -> Future:
+    """All-label text emotion scores for a message, memoized by normalized text."""
+    key = emotion_cache.key(user_input)
+    if key is None:
+        emotion_cache.skip()
+        return text_batcher.submit(user_input)
+
+    cached = emotion_cache.get(key)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    def _remember(done):
+        if not done.cancelled() and done.exception() is None:
+            emotion_cache.set(key, done.result())
+
+    future = text_batcher.submit(user_input)
+    future.add_done_callback(_remember)
+    return future
+
+
+def warmup_models():
+    """Load every model and run a dummy inference through it."""
+    return models.warmup()
+
+
+if MODEL_LOAD_MODE == "preload":
+    models.load_all()
+elif MODEL_LOAD_MODE == "warmup":
+    models.start_background_warmup()
 
 
 # ===========================================================
@@ -53,31 +203,29 @@ print("✅ AI models loaded successfully.")
 # ===========================================================
 
 def record_audio_from_file(filepath):
-    """Convert audio file to text using Google Speech Recognition."""
-    print(f"🔊 Starting transcription for: {filepath}")
-    recognizer = sr.Recognizer()
+    """Convert an audio file to text with the configured ASR engine."""
+    logger.debug("🔊 Starting transcription for: %s", filepath)
     try:
-        with sr.AudioFile(filepath) as source:
-            audio = recognizer.record(source)
-        print("✅ Audio file loaded")
-        try:
-            text = recognizer.recognize_google(audio)
-            print(f"📝 Transcription: '{text}'")
-            return audio, text
-        except sr.UnknownValueError:
-            print("❌ Google Speech Recognition could not understand audio")
-            return audio, ""
-        except sr.RequestError as e:
-            print(f"❌ Google Speech Recognition service error: {e}")
-            return audio, ""
+        audio = decode_audio_file(filepath, TONE_SAMPLE_RATE)
+        logger.debug("✅ Audio file loaded")
     except Exception:
-        print(f"❌ Audio file loading error: {traceback.format_exc()}")
+        logger.warning("❌ Audio file loading error", exc_info=True)
         return None, ""
+    return audio, transcribe_audio(audio)
+
+
+def transcribe_audio(audio):
+    """Transcribe an already-decoded voice message (audio_utils.DecodedAudio)."""
+    logger.debug("🔊 Starting %s transcription (%.1fs of audio)", transcriber.name, audio.duration)
+    with span("asr", backend=transcriber.name):
+        text = transcriber.transcribe(audio)
+    logger.debug("📝 Transcription: '%s'", text)
+    return text
 
 
 def _generate_title(conversation_history):
     """Generate a short title for the session using Gemini."""
-    print("🏷️ Generating session title...")
+    logger.debug("🏷️ Generating session title...")
     try:
         user_messages = [msg["content"] for msg in conversation_history if msg["role"] == "user"]
         bot_messages = [msg["content"] for msg in conversation_history if msg["role"] == "assistant"]
@@ -91,20 +239,79 @@ def _generate_title(conversation_history):
         )
         title = gemini_quick_task(prompt, fallback_text="Mindful Moment")
         clean_title = title.strip() or "Conversation"
-        print(f"🏷️ Generated title: '{clean_title}'")
+        logger.debug("🏷️ Generated title: '%s'", clean_title)
         return clean_title
     except Exception:
-        print(f"🔥 Title generation failed: {traceback.format_exc()}")
+        logger.exception("🔥 Title generation failed")
         return "Conversation"
 
 
 def format_gpt_reply(text):
     """Clean GPT text formatting."""
     cleaned = re.sub(r"\n{3,}", "\n\n", text).strip()
-    print(f"🧹 Cleaned GPT response: '{cleaned[:120]}...'")
+    logger.debug("🧹 Cleaned GPT response: '%s...'", cleaned[:120])
     return cleaned
 
 
+_NEWLINE_RUN = re.compile(r"\n{3,}")
+
+
+class ReplyStreamFormatter:
+    """Incremental equivalent of format_gpt_reply for streamed deltas.
+
+    Trailing whitespace is held back until more text arrives, so newline
+    runs are collapsed and the reply is stripped exactly as the
+    non-streaming path would.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+        self._parts = []
+
+    def feed(self, delta):
+        buf = self._pending + delta
+        body = buf.rstrip()
+        if not body:
+            self._pending = buf
+            return ""
+        self._pending = buf[len(body):]
+        if not self._started:
+            body = body.lstrip()
+            self._started = True
+        out = _NEWLINE_RUN.sub("\n\n", body)
+        self._parts.append(out)
+        return out
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+
+def _openai_reply(messages, temperature, timeout):
+    """One non-streamed gpt-4o-mini call; records its token usage."""
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=temperature,
+        timeout=timeout,
+    )
+    token_usage.record(response.usage, response.model, mode="chat")
+    return response.choices[0].message.content
+
+
+def _gemini_reply(messages):
+    """Failover reply: the GPT payload replayed as a Gemini chat."""
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    turns = [m for m in messages if m["role"] != "system"]
+    history = [
+        {"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+        for m in turns[:-1]
+    ]
+    prompt = f"{system}\n\n{turns[-1]['content']}" if system else turns[-1]["content"]
+    return gemini_generate_response(prompt, history)
+
+
 def adjust_temperature(emotion_score):
     """Scale GPT creativity according to emotion confidence."""
     if emotion_score >= 0.75:
@@ -115,152 +322,402 @@ def adjust_temperature(emotion_score):
         temp = 0.6
     else:
         temp = 0.45
-    print(f"🌡️ Adjusted temperature to {temp} (emotion score {emotion_score})")
+    logger.debug("🌡️ Adjusted temperature to %s (emotion score %s)", temp, emotion_score)
     return temp
 
 
-def should_summarize_session(last_message_time, timeout_minutes=10):
-    """Check if session should be summarized due to inactivity."""
-    if not last_message_time:
-        return False
-    now = datetime.now(timezone.utc)
-    diff = (now - last_message_time).total_seconds() / 60
-    return diff >= timeout_minutes
+DEFAULT_TEXT_EMOTION = {"label": "neutral", "score": 0.0}
+DEFAULT_TONE_EMOTION = {"label": "Unknown", "score": 0.0}
+
+
+# Tone cost is bounded by speech length, not upload length: silence is
+# trimmed, at most TONE_MAX_SECONDS are analyzed, and the speech is cut
+# into fixed windows that go through wav2vec2 as one batch.
+TONE_VAD = os.getenv("TONE_VAD", "1") == "1"
+TONE_VAD_THRESHOLD_DB = float(os.getenv("TONE_VAD_THRESHOLD_DB", "-35"))
+TONE_WINDOW_SECONDS = float(os.getenv("TONE_WINDOW_SECONDS", "4"))
+TONE_MAX_SECONDS = float(os.getenv("TONE_MAX_SECONDS", "30"))
+TONE_BATCH_SIZE = int(os.getenv("TONE_BATCH_SIZE", "8"))
+TONE_MIN_SPEECH_SECONDS = 0.3
+
+
+def _aggregate_tone_windows(window_results, weights):
+    """Length-weighted mean of per-window label scores → one tone_emotion."""
+    totals = {}
+    for scores, weight in zip(window_results, weights):
+        for entry in scores:
+            totals[entry["label"]] = totals.get(entry["label"], 0.0) + entry["score"] * weight
+    if not totals:
+        return DEFAULT_TONE_EMOTION
+    total_weight = float(sum(weights))
+    label = max(totals, key=totals.get)
+    return {"label": label, "score": totals[label] / total_weight}
+
+
+def _analyze_tone(audio):
+    """Classify vocal tone for a voice message (decoded buffer or file path)."""
+    logger.debug("🔊 Running tone emotion analysis (toggle ON)...")
+    if isinstance(audio, str):
+        audio = decode_audio_file(audio, TONE_SAMPLE_RATE)
+
+    speech = audio.samples
+    if TONE_VAD:
+        speech = trim_silence(speech, audio.sampling_rate, threshold_db=TONE_VAD_THRESHOLD_DB)
+    if len(speech) < TONE_MIN_SPEECH_SECONDS * audio.sampling_rate:
+        logger.debug("🔇 No speech detected for tone analysis.")
+        return DEFAULT_TONE_EMOTION
+
+    windows = split_windows(speech, audio.sampling_rate, TONE_WINDOW_SECONDS, TONE_MAX_SECONDS)
+    logger.debug("🎚️ Tone input: %.1fs → %.1fs speech, %s window(s)", audio.duration, len(speech) / audio.sampling_rate, len(windows))
+    classifier = models.get("tone")
+    with span("tone_classifier"):
+        window_results = classifier(
+            [{"raw": w, "sampling_rate": audio.sampling_rate} for w in windows],
+            batch_size=min(TONE_BATCH_SIZE, len(windows)),
+            top_k=classifier.model.config.num_labels,
+        )
+    tone_emotion = _aggregate_tone_windows(window_results, [len(w) for w in windows])
+    logger.debug("🎵 Detected tone emotion: %s", tone_emotion)
+    return tone_emotion
+
+
+# Cross-session memory: past summaries ranked by similarity to the
+# message. Users without an index yet get the most recent summaries
+# while a background job indexes what they already have.
+summary_index = SummaryIndex(lambda texts: embed_texts(models.get("embedder"), texts))
+
+
+def _load_relevant_summaries(user_id, session_id, user_input):
+    """Summaries from previous sessions most relevant to this message."""
+    if MEMORY_RETRIEVAL:
+        try:
+            matches = summary_index.search(user_id, user_input, exclude=session_id)
+        except Exception:
+            logger.warning("⚠️ Summary retrieval failed — using recent summaries", exc_info=True)
+        else:
+            if matches is not None:
+                return matches
+            _enqueue_memory_backfill(user_id)
+    return get_user_recent_summaries(user_id, limit=3) or []
+
+
+# Tone, text, transcript and summary lookups are independent, so they
+# run concurrently and the turn waits only for the slowest of them.
+# A stage that overruns its timeout is cancelled and falls back to a
+# neutral default so the reply is still generated.
+STAGE_TIMEOUT_TONE = float(os.getenv("STAGE_TIMEOUT_TONE", "20"))
+STAGE_TIMEOUT_TEXT = float(os.getenv("STAGE_TIMEOUT_TEXT", "10"))
+STAGE_TIMEOUT_HISTORY = float(os.getenv("STAGE_TIMEOUT_HISTORY", "10"))
+STAGE_TIMEOUT_SUMMARIES = float(os.getenv("STAGE_TIMEOUT_SUMMARIES", "5"))
+
+stage_runner = StageRunner(max_workers=int(os.getenv("STAGE_POOL_WORKERS", "16")), name="turn-stages")
+
+
+def _gather_turn_inputs(user_id, session_id, user_input, audio_path=None, audio=None):
+    """Run emotion analysis and context loading concurrently for one turn."""
+    stages = [
+        Stage("text", classify_text_emotions, user_input,
+              timeout=STAGE_TIMEOUT_TEXT, default=None, returns_future=True),
+        Stage("history", get_session_interactions, user_id, session_id,
+              timeout=STAGE_TIMEOUT_HISTORY, default=[]),
+        Stage("summaries", _load_relevant_summaries, user_id, session_id, user_input,
+              timeout=STAGE_TIMEOUT_SUMMARIES, default=[]),
+    ]
+    if audio is not None:
+        # Shares the buffer decoded for transcription; no second decode/resample
+        stages.append(Stage("tone", _analyze_tone, audio,
+                            timeout=STAGE_TIMEOUT_TONE, default=DEFAULT_TONE_EMOTION))
+    elif audio_path and os.path.exists(audio_path):
+        stages.append(Stage("tone", _analyze_tone, audio_path,
+                            timeout=STAGE_TIMEOUT_TONE, default=DEFAULT_TONE_EMOTION))
+    else:
+        logger.debug("🔇 Tone analysis skipped (toggle OFF or no audio).")
+
+    logger.debug("📝 Running emotion analysis and loading context...")
+    results, timings = stage_runner.run(stages)
+    logger.debug("⏱️ Stage timings: %s", ", ".join(f"{name}={secs * 1000:.0f}ms" for name, secs in timings.items()))
+
+    text_emotion = DEFAULT_TEXT_EMOTION
+    if results["text"]:
+        text_emotion = max(results["text"], key=lambda x: x["score"])
+        logger.debug("🧠 Detected text emotion: %s", text_emotion)
+
+    interactions = results["history"]
+    logger.debug("📚 Retrieved %s past messages.", len(interactions))
+    return (
+        text_emotion,
+        results.get("tone", DEFAULT_TONE_EMOTION),
+        interactions,
+        results["summaries"],
+    )
+
+
+def _build_messages(user_id, session_id, user_input, interactions, past_summaries, text_emotion, tone_emotion):
+    """Assemble the GPT payload: static system prompt, history, then this turn's context."""
+    turn_context = render_turn_context(past_summaries, text_emotion, tone_emotion)
+    # Older turns are folded into a running summary (refreshed in the background)
+    return build_context_messages(
+        user_id, session_id, SYSTEM_PROMPT, interactions, user_input, turn_context,
+        schedule_compaction=_enqueue_compaction,
+    )
 
 
 # ===========================================================
-# Core Logic
+# Post-Response Jobs
 # ===========================================================
+# Title generation, context compaction and idle-session summarization
+# run on the background job queue so /text and /voice return as soon
+# as the reply is ready.
+
+post_response_jobs = JobQueue(
+    db_path=os.getenv("JOB_QUEUE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db")),
+    workers=int(os.getenv("JOB_QUEUE_WORKERS", "2")),
+    max_attempts=int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3")),
+    name="post-response",
+)
 
-def analyze_and_respond(user_id, session_id, user_input, audio_path=None):
-    print(f"\n🤖 [analyze_and_respond] user={user_id}, session={session_id}")
-    print(f"🗣️ User input: '{user_input}'")
-    print(f"🔊 Audio path: {audio_path}")
 
-    # -------------------------------------------------------
-    # Emotion Analysis (Text + Optional Tone)
-    # -------------------------------------------------------
-    tone_emotion = {"label": "Unknown", "score": 0.0}
-    if audio_path and os.path.exists(audio_path):
+def _run_title_job(payload):
+    """Title the session from its latest exchange if it is still untitled."""
+    user_id, session_id = payload["user_id"], payload["session_id"]
+    session_data = get_session_details(user_id, session_id)
+    if not session_data or session_data.get("title") != "Untitled Session":
+        return
+    new_title = _generate_title([
+        {"role": "user", "content": payload["user_input"]},
+        {"role": "assistant", "content": payload["gpt_response"]},
+    ])
+    if new_title and new_title != "Mindful Moment":
+        if not update_session_title(user_id, session_id, new_title):
+            raise RuntimeError(f"Title update failed for session {session_id}")
+        logger.debug("🏷️ Updated title → %s", new_title)
+
+
+def _run_compaction_job(payload):
+    """Refresh the running context summary a turn found due for compaction."""
+    user_id, session_id = payload["user_id"], payload["session_id"]
+    compact_session_context(user_id, session_id, get_session_interactions(user_id, session_id))
+
+
+def _run_summary_job(payload):
+    """Summarize a session the sweeper found idle."""
+    user_id, session_id = payload["user_id"], payload["session_id"]
+    session_data = get_session_details(user_id, session_id)
+    if not session_data or not session_data.get("needs_summary"):
+        return  # already summarized (e.g. by another worker's sweep)
+    logger.debug("🧩 Session inactive → running Gemini summarization...")
+    # Raises when Gemini fails: the queue retries, the stored summary and needs_summary stay as they are
+    summary = session_summarizer.summarize(user_id, session_id, session_data)
+    if summary is None:
+        return
+    if not save_session_summary(user_id, session_id, summary, summarized_through=summary.get("through_at")):
+        raise RuntimeError(f"Summary save failed for session {session_id}")
+    logger.debug("📄 Summary saved: %s...", summary.get('summary', '')[:100])
+    if MEMORY_RETRIEVAL:
+        if not summary_index.has_index(user_id):
+            _enqueue_memory_backfill(user_id)  # indexes this summary along with older ones
+            return
         try:
-            print("🔊 Running tone emotion analysis (toggle ON)...")
-            tone_result = tone_classifier(audio_path)
-            if tone_result:
-                tone_emotion = tone_result[0]
-                print(f"🎵 Detected tone emotion: {tone_emotion}")
+            summary_index.add(user_id, session_id, summary)
         except Exception:
-            print(f"❌ Tone analysis error: {traceback.format_exc()}")
-    else:
-        print("🔇 Tone analysis skipped (toggle OFF or no audio).")
+            logger.warning("⚠️ Summary indexing failed for session %s", session_id, exc_info=True)
+
+
+def _run_memory_backfill_job(payload):
+    """Build the summary index of a user who has none yet from their stored summaries."""
+    user_id = payload["user_id"]
+    if summary_index.has_index(user_id):
+        return
+    summaries, cursor = [], None
+    while True:
+        page, cursor = list_sessions_page(
+            user_id, 100, start_after=cursor, fields=("session_id", "summary", "emotional_trend", "topics")
+        )
+        summaries.extend((s["session_id"], s) for s in page if s.get("summary"))
+        if not cursor:
+            break
+    embedded = summary_index.add_many(user_id, summaries)
+    logger.debug("🧭 Indexed %s past summaries for user %s", embedded, user_id)
 
-    text_emotion = {"label": "neutral", "score": 0.0}
-    try:
-        print("📝 Running text emotion analysis...")
-        text_emotions = text_classifier(user_input)[0]
-        text_emotion = max(text_emotions, key=lambda x: x["score"])
-        print(f"🧠 Detected text emotion: {text_emotion}")
-    except Exception:
-        print(f"❌ Text emotion analysis error: {traceback.format_exc()}")
 
-    temperature = adjust_temperature(text_emotion["score"])
+post_response_jobs.register("session_title", _run_title_job)
+post_response_jobs.register("context_compaction", _run_compaction_job)
+post_response_jobs.register("session_summary", _run_summary_job)
+post_response_jobs.register("memory_backfill", _run_memory_backfill_job)
 
-    # -------------------------------------------------------
-    # Retrieve Conversation Context
-    # -------------------------------------------------------
-    print("📚 Loading session history...")
-    interactions = get_session_interactions(user_id, session_id)
-    print(f"📚 Retrieved {len(interactions)} past messages.")
-
-    # Load summaries from previous sessions (cross-session memory)
-    past_summaries = get_user_recent_summaries(user_id, limit=3) or []
-    context_summary = "\n".join(
-        [f"- {s['summary']}" for s in past_summaries if s and s.get("summary")]
+
+def _enqueue_summary(user_id, session_id):
+    post_response_jobs.enqueue(
+        "session_summary",
+        {"user_id": user_id, "session_id": session_id},
+        dedupe_key=f"summary:{user_id}:{session_id}",
     )
 
-    # -------------------------------------------------------
-    # System Prompt (Intelligent Behavioral Framing)
-    # -------------------------------------------------------
-    system_prompt = f"""
-You are an emotionally intelligent AI companion specializing in mental health and wellbeing conversations.
-You are *not* a medical professional. You never diagnose, prescribe, or make clinical claims.
-Your role is to provide **empathetic understanding, gentle guidance, and positive coping support**.
-
-Communication Guidelines:
-- Respond with warmth, active listening, and encouragement.
-- Use clear, natural, and emotionally safe language.
-- Avoid judgment, over-assurance, or toxic positivity.
-- Reflect understanding before offering suggestions.
-- If user shows distress or crisis cues, gently encourage reaching out to a professional or trusted person.
-
-Context Awareness:
-Recent session summaries (for continuity):
-{context_summary or '- None available'}
-
-User's detected emotions this message:
-- Text Emotion → {text_emotion['label']} (confidence: {text_emotion['score']:.2f})
-- Voice Tone → {tone_emotion.get('label', 'N/A')} (confidence: {tone_emotion.get('score', 0):.2f})
-
-Now craft your response with empathy, calm tone, and helpful insights.
-Keep paragraphs short (2–4 lines) and conversational.
-If the user seeks advice, frame it as perspective, not instruction.
-    """.strip()
 
-    # -------------------------------------------------------
-    # Build Conversation Payload for GPT
-    # -------------------------------------------------------
-    messages = [{"role": "system", "content": system_prompt}]
-    for interaction in interactions:
-        messages.append({"role": "user", "content": interaction["user_input"]})
-        messages.append({"role": "assistant", "content": interaction["gpt_response"]})
-    messages.append({"role": "user", "content": user_input})
+def _enqueue_compaction(user_id, session_id):
+    post_response_jobs.enqueue(
+        "context_compaction",
+        {"user_id": user_id, "session_id": session_id},
+        dedupe_key=f"compaction:{user_id}:{session_id}",
+    )
 
-    # -------------------------------------------------------
-    # Generate GPT Response
-    # -------------------------------------------------------
-    gpt_response = "Error: GPT processing failed"
+
+def _enqueue_memory_backfill(user_id):
+    post_response_jobs.enqueue(
+        "memory_backfill", {"user_id": user_id}, dedupe_key=f"memory_backfill:{user_id}",
+    )
+
+
+# Idle sessions are summarized in the background, off the request path
+session_summarizer = SessionSummarizer()
+session_sweeper = SessionSweeper(find_idle_sessions, _enqueue_summary)
+
+
+def start_background_workers():
+    """Start this process's job workers, idle-session sweeper and metrics flusher."""
+    post_response_jobs.start()
+    registry.start()
+    if SESSION_SWEEPER_ENABLED:
+        session_sweeper.start()
+
+
+if MODEL_LOAD_MODE != "preload":
+    # Under --preload the master must not own threads; workers start in post_fork
+    start_background_workers()
+
+
+def schedule_post_response_tasks(user_id, session_id, user_input, result):
+    """Queue title work for a turn once its interaction is saved."""
     try:
-        print("💬 Generating GPT-4o-mini response...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=temperature,
+        post_response_jobs.enqueue(
+            "session_title",
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "user_input": user_input,
+                "gpt_response": result["gpt_response"],
+            },
+            dedupe_key=f"title:{user_id}:{session_id}",
         )
-        gpt_response = format_gpt_reply(response.choices[0].message.content)
-        print(f"🤖 GPT reply: {gpt_response[:100]}...")
     except Exception:
-        print(f"🔥 GPT error: {traceback.format_exc()}")
+        logger.exception("🔥 Post-response scheduling error")
 
-    # -------------------------------------------------------
-    # Update Session Title (if still Untitled)
-    # -------------------------------------------------------
-    try:
-        print("📝 Checking if session title needs update...")
-        session_data = get_session_details(user_id, session_id)
-        if session_data and session_data.get("title") == "Untitled Session":
-            new_title = _generate_title(messages + [{"role": "assistant", "content": gpt_response}])
-            if new_title and new_title != "Mindful Moment":
-                update_session_title(user_id, session_id, new_title)
-                print(f"🏷️ Updated title → {new_title}")
-    except Exception:
-        print(f"🔥 Title update error: {traceback.format_exc()}")
+
+# ===========================================================
+# Core Logic
+# ===========================================================
+
+@span("turn")
+def analyze_and_respond(user_id, session_id, user_input, audio_path=None, audio=None):
+    logger.debug("🤖 [analyze_and_respond] user=%s, session=%s", user_id, session_id)
+    logger.debug("🗣️ User input: '%s'", user_input)
+    if audio is not None:
+        logger.debug("🔊 Audio: %.1fs decoded in memory", audio.duration)
+    else:
+        logger.debug("🔊 Audio path: %s", audio_path)
+
+    text_emotion, tone_emotion, interactions, past_summaries = _gather_turn_inputs(
+        user_id, session_id, user_input, audio_path, audio
+    )
+    temperature = adjust_temperature(text_emotion["score"])
+    messages = _build_messages(
+        user_id, session_id, user_input, interactions, past_summaries, text_emotion, tone_emotion
+    )
 
     # -------------------------------------------------------
-    # Trigger Summarization if Session Inactive / Ended
+    # Generate GPT Response
     # -------------------------------------------------------
+    gpt_response = "Error: GPT processing failed"
     try:
-        last_time = get_last_message_time(user_id, session_id)
-        if should_summarize_session(last_time):
-            print("🧩 Session inactive → running Gemini summarization...")
-            conv = get_session_interactions(user_id, session_id)
-            summary = gemini_summarize_session(conv)
-            save_session_summary(user_id, session_id, summary)
-            print(f"📄 Summary saved: {summary.get('summary', '')[:100]}...")
+        logger.debug("💬 Generating GPT-4o-mini response...")
+        with span("openai.chat"):
+            reply = llm.call_with_failover(
+                "openai",
+                lambda timeout: _openai_reply(messages, temperature, timeout),
+                "gemini",
+                lambda: _gemini_reply(messages),
+                hedge=True,
+            )
+        gpt_response = format_gpt_reply(reply)
+        logger.debug("🤖 GPT reply: %s...", gpt_response[:100])
     except Exception:
-        print(f"⚠️ Summary generation failed: {traceback.format_exc()}")
+        logger.exception("🔥 GPT error")
 
-    print("✅ analyze_and_respond completed.\n")
+    logger.debug("✅ analyze_and_respond completed.")
     return {
         "gpt_response": gpt_response,
         "text_emotion": text_emotion,
         "tone_emotion": tone_emotion,
+        "title": "",
+    }
+
+
+def stream_analyze_and_respond(user_id, session_id, user_input, audio_path=None, audio=None):
+    """
+    Streaming variant of analyze_and_respond.
+    Yields (event, data) tuples: one "emotion" event up front, then
+    "token" events as GPT generates, then a final "reply" event with
+    the same result dict analyze_and_respond returns. Callers persist
+    the interaction and then call schedule_post_response_tasks().
+    """
+    logger.debug("🤖 [stream_analyze_and_respond] user=%s, session=%s", user_id, session_id)
+
+    text_emotion, tone_emotion, interactions, past_summaries = _gather_turn_inputs(
+        user_id, session_id, user_input, audio_path, audio
+    )
+    yield "emotion", {"emotion": text_emotion, "tone": tone_emotion}
+
+    temperature = adjust_temperature(text_emotion["score"])
+    messages = _build_messages(
+        user_id, session_id, user_input, interactions, past_summaries, text_emotion, tone_emotion
+    )
+
+    formatter = ReplyStreamFormatter()
+    failed = None
+    try:
+        logger.debug("💬 Streaming GPT-4o-mini response...")
+        started, first_token = time.perf_counter(), True
+        stream = llm.stream("openai", lambda timeout: client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        ))
+        for chunk in stream:
+            if chunk.usage is not None:
+                token_usage.record(chunk.usage, chunk.model, mode="stream")
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token:
+                observe("openai.first_token", time.perf_counter() - started)
+                first_token = False
+            text = formatter.feed(delta)
+            if text:
+                yield "token", {"text": text}
+        observe("openai.chat_stream", time.perf_counter() - started)
+    except LLMUnavailable as exc:
+        failed = exc  # already logged by the gateway
+    except Exception as exc:
+        failed = exc
+        logger.exception("🔥 GPT stream error")
+
+    if failed is not None and not formatter.text and LLM_FAILOVER:
+        # Nothing streamed yet: answer from Gemini in one piece instead
+        llm.record_failover("openai", "gemini", failed)
+        text = formatter.feed(_gemini_reply(messages))
+        if text:
+            yield "token", {"text": text}
+    gpt_response = formatter.text or "Error: GPT processing failed"
+    logger.debug("🤖 GPT streamed reply: %s...", gpt_response[:100])
+
+    yield "reply", {
+        "gpt_response": gpt_response,
+        "text_emotion": text_emotion,
+        "tone_emotion": tone_emotion,
+        "title": "",
     }
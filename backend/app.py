@@ -1,62 +1,135 @@
 # backend/app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import uuid
 from functools import wraps
 import firebase_admin
 from firebase_admin import auth
-from gtts import gTTS
 import base64
-from io import BytesIO
 from dotenv import load_dotenv
-import traceback
+import json
+import time
+import hashlib
 
 load_dotenv()
 
-from ai_core import analyze_and_respond, record_audio_from_file
+from ai_core import (
+    analyze_and_respond,
+    stream_analyze_and_respond,
+    schedule_post_response_tasks,
+    transcribe_audio,
+    text_batcher,
+    models,
+    post_response_jobs,
+    session_sweeper,
+    session_summarizer,
+    summary_index,
+    stage_runner,
+    transcriber,
+    emotion_cache,
+)
+from audio_utils import decode_upload, AudioDecodeError
+from auth_cache import VerifiedTokenCache, LastActiveWriter, KNOWN_USERS_MAX
+from cache_utils import LRUCache
+from tts_service import create_tts_service
 from firebase_utils import (
     ensure_user_exists,
-    get_all_sessions,
-    get_session_interactions,
+    user_exists,
+    touch_users_last_active,
+    list_sessions_page,
+    get_sessions_version,
+    list_interactions_page,
+    get_interactions_version,
+    SESSION_FIELDS,
+    INTERACTION_FIELDS,
     create_new_session,
     save_interaction_to_session,
-    db
+    session_cache,
+    store,
 )
+from llm_gateway import gateway as llm_gateway
+from prompt_builder import token_usage
+from log_utils import get_logger
+from metrics import HTTP_REQUESTS, HTTP_SECONDS, METRICS_ENABLED, registry, render_prometheus
+
+logger = get_logger(__name__)
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}}, expose_headers=["Authorization"])
+CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}}, expose_headers=["Authorization", "ETag"])
 
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+tts_service = create_tts_service()
 
 # === Authentication ===
+token_cache = VerifiedTokenCache()
+known_users = LRUCache(max_entries=KNOWN_USERS_MAX, name="known-users")
+last_active_writer = LastActiveWriter(touch_users_last_active)
+
+# === Request Metrics ===
+@app.before_request
+def _start_request_timer():
+    request.environ["mindmate.started"] = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = request.environ.get("mindmate.started")
+    if METRICS_ENABLED and started is not None:
+        # Label by route rule, not raw path, so ids don't explode cardinality
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+registry.register_gauge(
+    "job_queue_depth",
+    lambda: [({"status": status}, n) for status, n in post_response_jobs.depth().items()],
+    "Post-response jobs by status",
+)
+registry.register_gauge("text_batcher_queue_depth", lambda: text_batcher.stats()["queue_depth"],
+                        "Texts waiting for a classifier batch")
+registry.register_gauge("emotion_cache_hit_rate", lambda: emotion_cache.stats()["hit_rate"],
+                        "Text emotion memo cache hit rate")
+registry.register_gauge("session_cache_hit_rate", lambda: session_cache.stats()["hit_rate"],
+                        "Session transcript cache hit rate")
+registry.register_gauge("token_cache_hit_rate", lambda: token_cache.stats()["hit_rate"],
+                        "Verified ID token cache hit rate")
+registry.register_gauge("models_ready", lambda: int(models.status()["ready"]), "1 once this worker's models are warm")
+
+def _mark_user_active(user_id, verified_exists=False):
+    """Create the user on first sight; afterwards only a coalesced last_active write."""
+    if known_users.get(user_id):
+        last_active_writer.touch(user_id)
+        return
+    if verified_exists:
+        last_active_writer.touch(user_id)
+    elif ensure_user_exists(user_id):
+        last_active_writer.mark_written(user_id)
+    else:
+        return  # not cached as known, so the next request retries creation
+    known_users.set(user_id, True)
+
 def get_authenticated_user_id():
     auth_header = request.headers.get('Authorization')
     manual_user_id = request.headers.get('X-User-ID')
-    print(f"🔑 Auth Header: {auth_header}, Manual ID: {manual_user_id}")
 
     if auth_header and auth_header.startswith('Bearer '):
         try:
             id_token = auth_header.split('Bearer ')[1]
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = token_cache.verify(id_token, auth.verify_id_token)
             user_id = decoded_token['uid']
-            print(f"✅ Firebase authenticated user: {user_id}")
-            ensure_user_exists(user_id)
+            _mark_user_active(user_id)
             return user_id
         except Exception as e:
-            print(f"🔥 Firebase token error: {traceback.format_exc()}")
+            logger.exception("🔥 Firebase token error")
             return None
     elif manual_user_id:
         try:
-            user_ref = db.collection("conversations").document(manual_user_id)
-            if user_ref.get().exists:
-                print(f"✅ Manual auth user: {manual_user_id}")
-                ensure_user_exists(manual_user_id)
+            if known_users.get(manual_user_id) or user_exists(manual_user_id):
+                _mark_user_active(manual_user_id, verified_exists=True)
                 return manual_user_id
             return None
         except Exception as e:
-            print(f"🔥 Manual auth error: {traceback.format_exc()}")
+            logger.exception("🔥 Manual auth error")
             return None
     return None
 
@@ -65,7 +138,7 @@ def require_auth(f):
     def decorated_function(*args, **kwargs):
         user_id = get_authenticated_user_id()
         if not user_id:
-            print("⛔ No authenticated user")
+            logger.warning("⛔ No authenticated user")
             return jsonify({"error": "Authentication required"}), 401
         request.user_id = user_id
         return f(*args, **kwargs)
@@ -79,20 +152,19 @@ def handle_user():
         is_new = data.get('is_new', False)
         if is_new:
             user_id = f"user_{str(uuid.uuid4())[:8]}"
-            print(f"👤 Creating new user: {user_id}")
+            logger.debug("👤 Creating new user: %s", user_id)
             ensure_user_exists(user_id)
             return jsonify({"user_id": user_id, "message": "New user created"}), 201
         else:
             user_id = data.get('user_id', '').strip()
             if not user_id:
                 return jsonify({"error": "User ID required"}), 400
-            user_ref = db.collection("conversations").document(user_id)
-            if user_ref.get().exists:
-                print(f"👤 Existing user validated: {user_id}")
+            if user_exists(user_id):
+                logger.debug("👤 Existing user validated: %s", user_id)
                 return jsonify({"user_id": user_id, "message": "User validated"}), 200
             return jsonify({"error": "User not found"}), 404
     except Exception as e:
-        print(f"🔥 /user error: {traceback.format_exc()}")
+        logger.exception("🔥 /user error")
         return jsonify({"error": "Internal error"}), 500
 
 @app.route("/sessions/new", methods=["POST"])
@@ -100,11 +172,11 @@ def handle_user():
 def new_session():
     try:
         user_id = request.user_id
-        print(f"🆕 Creating new session for user: {user_id}")
+        logger.debug("🆕 Creating new session for user: %s", user_id)
         session_id = create_new_session(user_id)
         return jsonify({"session_id": session_id}), 201
     except Exception as e:
-        print(f"🔥 New session error: {traceback.format_exc()}")
+        logger.exception("🔥 New session error")
         return jsonify({"error": "Session creation failed"}), 500
 
 @app.route('/text', methods=['POST'])
@@ -115,11 +187,11 @@ def handle_text():
         user_id = request.user_id
         session_id = data['session_id']
         user_input = str(data['input_text'])
-        print(f"📝 Text input received - User: {user_id}, Session: {session_id}, Text: '{user_input[:50]}...'")
+        logger.debug("📝 Text input received - User: %s, Session: %s, Text: '%s...'", user_id, session_id, user_input[:50])
         
         # Get bot response
         result = analyze_and_respond(user_id, session_id, user_input, audio_path=None)
-        print(f"🤖 AI response generated - Emotion: {result['text_emotion']}, Tone: {result['tone_emotion']}")
+        logger.debug("🤖 AI response generated - Emotion: %s, Tone: %s", result['text_emotion'], result['tone_emotion'])
         
         # Save complete interaction
         save_interaction_to_session(
@@ -130,6 +202,7 @@ def handle_text():
             text_emotion=result['text_emotion'],
             tone_emotion=result['tone_emotion']
         )
+        schedule_post_response_tasks(user_id, session_id, user_input, result)
         
         return jsonify({
             "reply": result['gpt_response'],
@@ -138,54 +211,107 @@ def handle_text():
             "title": result.get('title', '')
         })
     except KeyError as e:
-        print(f"🔑 Missing key: {e} - Request data: {request.json}")
+        logger.debug("🔑 Missing key: %s - Request data: %s", e, request.json)
         return jsonify({"error": f"Missing data: {e}"}), 400
     except Exception as e:
-        print(f"❌ /text error: {traceback.format_exc()}")
+        logger.exception("❌ /text error")
         return jsonify({"error": "Processing failed"}), 500
 
+def _sse(event, data):
+    """Format a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route('/text/stream', methods=['POST'])
+@require_auth
+def handle_text_stream():
+    try:
+        data = request.json
+        user_id = request.user_id
+        session_id = data['session_id']
+        user_input = str(data['input_text'])
+    except KeyError as e:
+        logger.debug("🔑 Missing key: %s - Request data: %s", e, request.json)
+        return jsonify({"error": f"Missing data: {e}"}), 400
+    logger.debug("📝 Streaming text input - User: %s, Session: %s, Text: '%s...'", user_id, session_id, user_input[:50])
+
+    def generate():
+        try:
+            result = None
+            for event, payload in stream_analyze_and_respond(user_id, session_id, user_input):
+                if event == "reply":
+                    result = payload
+                    continue
+                yield _sse(event, payload)
+
+            # Reply is fully delivered — persist it, then queue the title work
+            save_interaction_to_session(
+                user_id=user_id,
+                session_id=session_id,
+                user_input=user_input,
+                gpt_response=result['gpt_response'],
+                text_emotion=result['text_emotion'],
+                tone_emotion=result['tone_emotion']
+            )
+            schedule_post_response_tasks(user_id, session_id, user_input, result)
+            yield _sse("done", {
+                "reply": result['gpt_response'],
+                "emotion": result['text_emotion'],
+                "tone": result['tone_emotion'],
+                "title": result['title']
+            })
+        except Exception:
+            logger.warning("❌ /text/stream error", exc_info=True)
+            yield _sse("error", {"error": "Processing failed"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route('/voice', methods=['POST'])
 @require_auth
 def handle_voice():
     try:
         user_id = request.user_id
-        print(f"🎤 Voice endpoint called - User: {user_id}")
+        logger.debug("🎤 Voice endpoint called - User: %s", user_id)
         
         # Validate session ID
         session_id = request.form.get('session_id')
         if not session_id:
-            print("❌ Missing session_id in form data")
+            logger.warning("❌ Missing session_id in form data")
             return jsonify({"error": "Missing session_id"}), 400
         
         # Validate audio file
         if 'audio' not in request.files:
-            print("❌ No audio file in request")
+            logger.warning("❌ No audio file in request")
             return jsonify({"error": "No audio file"}), 400
             
         file = request.files['audio']
         if file.filename == '':
-            print("❌ Empty filename")
+            logger.warning("❌ Empty filename")
             return jsonify({"error": "Empty filename"}), 400
             
-        # Save audio file
-        filename = f"audio_{uuid.uuid4().hex[:8]}.wav"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        print(f"💾 Saving audio to: {filepath}")
-        file.save(filepath)
-        print("✅ Audio saved successfully")
+        # Decode once, in memory; transcription and tone analysis share the buffer
+        try:
+            audio = decode_upload(file.stream)
+        except AudioDecodeError as e:
+            logger.warning("❌ Audio decode failed: %s", e)
+            return jsonify({"error": "Unsupported audio"}), 400
+        logger.debug("✅ Audio decoded (%.1fs)", audio.duration)
         
         # Transcribe audio
-        print("🔊 Starting audio transcription...")
-        _, user_input = record_audio_from_file(filepath)
-        print(f"📝 Transcription: '{user_input}'")
+        logger.debug("🔊 Starting audio transcription...")
+        user_input = transcribe_audio(audio)
+        logger.debug("📝 Transcription: '%s'", user_input)
         
         # Get bot response
-        print("🤖 Processing AI response...")
-        result = analyze_and_respond(user_id, session_id, user_input, audio_path=filepath)
-        print(f"✅ AI response generated - Emotion: {result['text_emotion']}, Tone: {result['tone_emotion']}")
+        logger.debug("🤖 Processing AI response...")
+        result = analyze_and_respond(user_id, session_id, user_input, audio=audio)
+        logger.debug("✅ AI response generated - Emotion: %s, Tone: %s", result['text_emotion'], result['tone_emotion'])
         
         # Save interaction
-        print("💾 Saving interaction to session...")
+        logger.debug("💾 Saving interaction to session...")
         save_interaction_to_session(
             user_id=user_id,
             session_id=session_id,
@@ -194,7 +320,8 @@ def handle_voice():
             text_emotion=result['text_emotion'],
             tone_emotion=result['tone_emotion']
         )
-        print("✅ Interaction saved")
+        logger.debug("✅ Interaction saved")
+        schedule_post_response_tasks(user_id, session_id, user_input, result)
         
         return jsonify({
             "reply": result['gpt_response'],
@@ -203,67 +330,236 @@ def handle_voice():
             "title": result.get('title', '')
         })
     except KeyError as e:
-        print(f"🔑 Missing key: {e} - Form data: {request.form}")
+        logger.debug("🔑 Missing key: %s - Form data: %s", e, request.form)
         return jsonify({"error": f"Missing data: {e}"}), 400
     except Exception as e:
-        print(f"❌ /voice error: {traceback.format_exc()}")
+        logger.exception("❌ /voice error")
         return jsonify({"error": "Processing failed"}), 500
 
+def _tts_params():
+    data = request.get_json(silent=True) or {}
+    return data, data.get('text', ''), data.get('lang') or None, data.get('voice') or None
+
 @app.route('/tts', methods=['POST'])
 @require_auth
 def generate_tts_route():
+    """
+    Synthesize speech for a reply.
+    POST JSON: text, optional lang / voice / format. (POST only: reply
+    text must not end up in URLs, access logs or browser history.)
+    format=raw (or an Accept header asking for audio) returns the audio
+    bytes with an ETag; otherwise the legacy {"audio_base64": ...} JSON.
+    """
     try:
-        data = request.json
-        text = data.get('text', '')
-        print(f"🔊 TTS request received - Text length: {len(text)} characters")
+        data, text, lang, voice = _tts_params()
+        logger.debug("🔊 TTS request received - Text length: %s characters", len(text))
         
         if not text:
-            print("❌ Empty text in TTS request")
+            logger.warning("❌ Empty text in TTS request")
             return jsonify({"error": "No text provided"}), 400
-            
-        tts = gTTS(text=text, lang='en')
-        mp3_fp = BytesIO()
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
-        audio_base64 = base64.b64encode(mp3_fp.read()).decode('utf-8')
-        print("✅ TTS audio generated successfully")
-        return jsonify({"audio_base64": audio_base64})
+        try:
+            lang, voice = tts_service.resolve(lang, voice)
+        except ValueError as e:
+            logger.warning("❌ TTS rejected request: %s", e)
+            return jsonify({"error": str(e)}), 400
+
+        mimetype = tts_service.mimetype
+        raw = data.get('format') in ('raw', 'mpeg') or (
+            request.accept_mimetypes.best_match(['application/json', mimetype]) == mimetype
+        )
+        if raw:
+            # The ETag is the content key, so a revalidation needs no synthesis at all
+            etag = tts_service.key(text, lang, voice)
+            if etag in request.if_none_match:
+                return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "private, max-age=86400"})
+
+        try:
+            key, audio = tts_service.get_audio(text, lang, voice)
+        except ValueError as e:
+            logger.warning("❌ TTS rejected request: %s", e)
+            return jsonify({"error": str(e)}), 400
+        logger.debug("✅ TTS audio ready")
+
+        if raw:
+            response = Response(audio, mimetype=mimetype)
+            response.set_etag(key)
+            response.headers["Cache-Control"] = "private, max-age=86400"
+            return response
+        return jsonify({"audio_base64": base64.b64encode(audio).decode('utf-8')})
     except Exception as e:
-        print(f"❌ /tts error: {traceback.format_exc()}")
+        logger.exception("❌ /tts error")
         return jsonify({"error": "Failed to generate audio"}), 500
 
+@app.route('/tts/stream', methods=['POST'])
+@require_auth
+def stream_tts_route():
+    """Chunked audio: the reply is synthesized sentence by sentence and streamed in order."""
+    _, text, lang, voice = _tts_params()
+    logger.debug("🔊 Streaming TTS request - Text length: %s characters", len(text))
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+    try:
+        # Checked here: once the 200 and headers are out, an error can only truncate the body
+        chunks = tts_service.stream_audio(text, lang, voice)
+    except ValueError as e:
+        logger.warning("❌ TTS rejected request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            # Headers are already sent; ending the stream early is all we can do
+            logger.warning("❌ /tts/stream error", exc_info=True)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=tts_service.mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+def _page_params(allowed_fields):
+    """Parse limit / start_after / fields query params; raises ValueError on bad input."""
+    limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = set(fields) - set(allowed_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return min(limit, HISTORY_MAX_PAGE_SIZE), request.args.get('start_after') or None, fields or None
+
+def _history_etag(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+def _history_response(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def _not_modified(etag):
+    return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"})
+
 @app.route('/history/<string:requested_user_id>', methods=['GET'])
 @require_auth
 def get_sessions(requested_user_id):
+    """
+    Paged session list, newest first.
+    Query: limit, start_after (cursor from the previous page), fields
+    (e.g. session_id,title,last_updated for the sidebar).
+    """
     if request.user_id != requested_user_id:
-        print(f"⛔ Unauthorized history access attempt: {request.user_id} != {requested_user_id}")
+        logger.warning("⛔ Unauthorized history access attempt: %s != %s", request.user_id, requested_user_id)
         return jsonify({"error": "Unauthorized access to user history"}), 403
     
     try:
-        print(f"📚 Fetching sessions for user: {requested_user_id}")
-        sessions = get_all_sessions(requested_user_id)
-        print(f"✅ Found {len(sessions)} sessions")
-        return jsonify({"sessions": sessions})
+        limit, start_after, fields = _page_params(SESSION_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        logger.debug("📚 Fetching sessions for user: %s", requested_user_id)
+        # Any session change bumps last_updated, so one indexed read tells us if the page changed
+        etag = _history_etag("sessions", get_sessions_version(requested_user_id), limit, start_after, fields)
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+        sessions, next_cursor = list_sessions_page(requested_user_id, limit, start_after, fields)
+        logger.debug("✅ Found %s sessions", len(sessions))
+        return _history_response({"sessions": sessions, "next_cursor": next_cursor}, etag)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"🔥 Session fetch error: {traceback.format_exc()}")
+        logger.exception("🔥 Session fetch error")
         return jsonify({"error": "Failed to fetch sessions"}), 500
 
 @app.route('/history/<string:requested_user_id>/<string:session_id>', methods=['GET'])
 @require_auth
 def get_session_chat(requested_user_id, session_id):
+    """
+    Paged session transcript.
+    Query: limit, start_after, fields, order=asc|desc (desc pages back from
+    the most recent message).
+    """
     if request.user_id != requested_user_id:
-        print(f"⛔ Unauthorized session access: {request.user_id} != {requested_user_id}")
+        logger.warning("⛔ Unauthorized session access: %s != %s", request.user_id, requested_user_id)
         return jsonify({"error": "Unauthorized access to session history"}), 403
     
     try:
-        print(f"💬 Fetching interactions for session: {session_id}")
-        interactions = get_session_interactions(requested_user_id, session_id)
-        print(f"✅ Found {len(interactions)} interactions")
-        return jsonify({"interactions": interactions})
+        limit, start_after, fields = _page_params(INTERACTION_FIELDS)
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        logger.debug("💬 Fetching interactions for session: %s", session_id)
+        # Interactions are append-only, so the newest interaction id versions the transcript
+        etag = _history_etag(
+            "interactions", session_id, get_interactions_version(requested_user_id, session_id),
+            limit, start_after, fields, order,
+        )
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+        interactions, next_cursor = list_interactions_page(
+            requested_user_id, session_id, limit, start_after, fields, descending=order == 'desc'
+        )
+        logger.debug("✅ Found %s interactions", len(interactions))
+        return _history_response({"interactions": interactions, "next_cursor": next_cursor}, etag)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"🔥 Interaction fetch error: {traceback.format_exc()}")
+        logger.exception("🔥 Interaction fetch error")
         return jsonify({"error": "Failed to fetch session messages"}), 500
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness probe — the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe — 503 until this worker's models are warm."""
+    status = models.status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Expose in-process performance counters."""
+    return jsonify({
+        "text_batcher": text_batcher.stats(),
+        "emotion_cache": emotion_cache.stats(),
+        "stage_runner": stage_runner.stats(),
+        "asr": transcriber.stats(),
+        "tts": tts_service.stats(),
+        "models": models.status(),
+        "session_cache": session_cache.stats(),
+        "post_response_jobs": post_response_jobs.stats(),
+        "session_sweeper": session_sweeper.stats(),
+        "session_summarizer": session_summarizer.stats(),
+        "summary_index": summary_index.stats(),
+        "llm": llm_gateway.stats(),
+        "prompt_tokens": token_usage.stats(),
+        "storage": store.stats(),
+        "auth": {
+            "token_cache": token_cache.stats(),
+            "known_users": known_users.stats(),
+            "last_active_writer": last_active_writer.stats(),
+        },
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of spans and request latencies summed across workers, plus per-worker gauges."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
-    print("🚀 Starting Flask server...")
+    logger.info("🚀 Starting Flask server...")
+    if models.mode != "lazy":
+        models.start_background_warmup()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
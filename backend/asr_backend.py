@@ -0,0 +1,176 @@
+# ===========================================================
+# backend/asr_backend.py — Pluggable speech-to-text
+# ===========================================================
+# ASR_BACKEND=google → Google Web Speech API (speech_recognition)
+# ASR_BACKEND=local  → on-box Whisper-style model via transformers,
+#                      dynamically int8-quantized for CPU, long clips
+#                      transcribed in overlapping chunks, and calls
+#                      bounded by a small worker pool so transcription
+#                      can't starve the rest of the process.
+#
+# Both engines take an audio_utils.DecodedAudio, so the buffer
+# decoded for tone analysis is reused as-is.
+# ===========================================================
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+import speech_recognition as sr
+
+from onnx_backend import load_torch_pipeline
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+ASR_BACKENDS = ("google", "local")
+ASR_BACKEND = os.getenv("ASR_BACKEND", "google").strip().lower()
+ASR_MODEL_ID = os.getenv("ASR_MODEL_ID", "openai/whisper-base.en")
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", "4"))
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "2"))
+ASR_TIMEOUT_SECONDS = float(os.getenv("ASR_TIMEOUT_SECONDS", "120"))
+ASR_QUANTIZE = os.getenv("ASR_QUANTIZE", "1") == "1"
+
+
+# ===========================================================
+# Local Model
+# ===========================================================
+
+def load_local_asr():
+    """Load the local ASR pipeline, quantizing its Linear layers to int8 on CPU."""
+    logger.info("🗣️ Initializing local ASR model (%s)...", ASR_MODEL_ID)
+    asr = load_torch_pipeline(
+        "automatic-speech-recognition",
+        ASR_MODEL_ID,
+        chunk_length_s=ASR_CHUNK_SECONDS,
+        device=-1,
+    )
+    if ASR_QUANTIZE:
+        try:
+            import torch
+            asr.model = torch.quantization.quantize_dynamic(asr.model, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info("🗜️ Local ASR quantized to dynamic int8")
+        except Exception:
+            logger.warning("⚠️ ASR quantization failed, using fp32 weights", exc_info=True)
+    return asr
+
+
+def warmup_local_asr(asr, sampling_rate=16000):
+    asr({"raw": np.zeros(sampling_rate, dtype=np.float32), "sampling_rate": sampling_rate})
+
+
+# ===========================================================
+# Engines
+# ===========================================================
+
+class GoogleTranscriber:
+    """Google Web Speech API through speech_recognition."""
+
+    name = "google"
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+
+    def transcribe(self, audio) -> str:
+        self.requests += 1
+        recognizer = sr.Recognizer()
+        try:
+            return recognizer.recognize_google(audio.audio_data())
+        except sr.UnknownValueError:
+            logger.warning("❌ Google Speech Recognition could not understand audio")
+            return ""
+        except sr.RequestError as e:
+            self.failures += 1
+            logger.warning("❌ Google Speech Recognition service error: %s", e)
+            return ""
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "requests": self.requests, "failures": self.failures}
+
+
+class LocalTranscriber:
+    """Local model from a ModelRegistry, run on a bounded, fork-aware pool."""
+
+    name = "local"
+
+    def __init__(self, models, model_name="asr", workers=ASR_WORKERS, timeout=ASR_TIMEOUT_SECONDS):
+        self.models = models
+        self.model_name = model_name
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="asr")
+                    self._pid = pid
+        return self._executor
+
+    def _run(self, audio):
+        started = time.monotonic()
+        # The pipeline splits clips longer than chunk_length_s into
+        # overlapping windows and stitches the text back together
+        result = self.models.get(self.model_name)(audio.pipeline_input(), batch_size=ASR_BATCH_SIZE)
+        with self._lock:
+            self.busy_seconds += time.monotonic() - started
+            self.audio_seconds += audio.duration
+        return (result.get("text") or "").strip()
+
+    def transcribe(self, audio) -> str:
+        with self._lock:
+            self.requests += 1
+        future = self._pool().submit(self._run, audio)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            logger.warning("⏱️ Local ASR timed out after %.0fs", self.timeout)
+            return ""
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            logger.warning("❌ Local ASR error", exc_info=True)
+            return ""
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "model_id": ASR_MODEL_ID,
+                "workers": self.workers,
+                "requests": self.requests,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "audio_seconds": round(self.audio_seconds, 1),
+                # < 1.0 means faster than real time
+                "real_time_factor": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            }
+
+
+def create_transcriber(models, backend=None):
+    """Build the configured engine; registers the local model on `models` when needed."""
+    backend = (backend or ASR_BACKEND).lower()
+    if backend not in ASR_BACKENDS:
+        logger.warning("⚠️ Unknown ASR_BACKEND '%s' — using google", backend)
+        backend = "google"
+    if backend == "local":
+        models.register("asr", load_local_asr, warmup=warmup_local_asr)
+        return LocalTranscriber(models)
+    return GoogleTranscriber()
@@ -0,0 +1,210 @@
+# ===========================================================
+# backend/audio_utils.py — Single-decode voice upload handling
+# ===========================================================
+# A voice upload is decoded exactly once into a mono float32
+# buffer at the tone model's sample rate. Speech recognition
+# and tone classification both read from that buffer, so
+# nothing is decoded or resampled twice and nothing is left
+# behind on disk.
+#
+# Uploads up to AUDIO_SPOOL_THRESHOLD_BYTES are decoded straight
+# from memory; larger ones are spooled to a temporary file for
+# ffmpeg and removed as soon as decoding finishes.
+# ===========================================================
+
+import io
+import os
+import wave
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+import speech_recognition as sr
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_SPOOL_THRESHOLD_BYTES = int(float(os.getenv("AUDIO_SPOOL_THRESHOLD_MB", "8")) * 1024 * 1024)
+AUDIO_SPOOL_DIR = os.getenv("AUDIO_SPOOL_DIR") or None  # None → system temp dir
+
+
+class AudioDecodeError(ValueError):
+    """Raised when an upload cannot be decoded as audio."""
+
+
+class DecodedAudio:
+    """Mono float32 PCM in [-1, 1] at a fixed sample rate."""
+
+    def __init__(self, samples, sampling_rate=AUDIO_SAMPLE_RATE):
+        self.samples = samples
+        self.sampling_rate = sampling_rate
+        self._audio_data = None
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / float(self.sampling_rate)
+
+    def pipeline_input(self) -> dict:
+        """Fresh dict for a transformers audio pipeline (it pops keys); the array is shared, not copied."""
+        return {"raw": self.samples, "sampling_rate": self.sampling_rate}
+
+    def audio_data(self) -> sr.AudioData:
+        """16-bit PCM view for speech_recognition (converted once, then reused)."""
+        if self._audio_data is None:
+            pcm = (np.clip(self.samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+            self._audio_data = sr.AudioData(pcm, self.sampling_rate, 2)
+        return self._audio_data
+
+
+# -----------------------------------------------------------
+# Decoders
+# -----------------------------------------------------------
+
+def _ffmpeg_decode(source, sampling_rate):
+    """Decode bytes (piped) or a file path with ffmpeg into float32 mono."""
+    from_path = isinstance(source, str)
+    command = [
+        "ffmpeg",
+        "-i", source if from_path else "pipe:0",
+        "-ac", "1",
+        "-ar", str(sampling_rate),
+        "-f", "f32le",
+        "-hide_banner",
+        "-loglevel", "quiet",
+        "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(
+            command,
+            input=None if from_path else source,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+    except FileNotFoundError:
+        return None
+    samples = np.frombuffer(proc.stdout, dtype=np.float32)
+    if proc.returncode != 0 or samples.size == 0:
+        raise AudioDecodeError("ffmpeg could not decode the upload")
+    return samples
+
+
+def _wav_decode(fileobj, sampling_rate):
+    """Pure-Python fallback for PCM WAV when ffmpeg is unavailable."""
+    try:
+        with wave.open(fileobj, "rb") as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as exc:
+        raise AudioDecodeError(f"Unsupported audio (install ffmpeg for non-WAV uploads): {exc!r}")
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width} bytes")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != sampling_rate and samples.size:
+        target = int(round(samples.size * sampling_rate / rate))
+        positions = np.linspace(0, samples.size - 1, num=target)
+        samples = np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+    return samples
+
+
+def decode_audio_bytes(data: bytes, sampling_rate=AUDIO_SAMPLE_RATE) -> DecodedAudio:
+    """Decode an in-memory upload."""
+    samples = _ffmpeg_decode(data, sampling_rate)
+    if samples is None:
+        samples = _wav_decode(io.BytesIO(data), sampling_rate)
+    return DecodedAudio(samples, sampling_rate)
+
+
+def decode_audio_file(path: str, sampling_rate=AUDIO_SAMPLE_RATE) -> DecodedAudio:
+    """Decode an audio file on disk."""
+    samples = _ffmpeg_decode(path, sampling_rate)
+    if samples is None:
+        with open(path, "rb") as fh:
+            samples = _wav_decode(fh, sampling_rate)
+    return DecodedAudio(samples, sampling_rate)
+
+
+def decode_upload(stream, sampling_rate=AUDIO_SAMPLE_RATE, spool_threshold=AUDIO_SPOOL_THRESHOLD_BYTES) -> DecodedAudio:
+    """
+    Decode an uploaded file-like object (e.g. a werkzeug FileStorage stream).
+    Small uploads never touch disk; larger ones are spooled to a temp file
+    that is always removed, whether or not decoding succeeds.
+    """
+    head = stream.read(spool_threshold + 1)
+    if len(head) <= spool_threshold:
+        return decode_audio_bytes(head, sampling_rate)
+
+    fd, path = tempfile.mkstemp(prefix="voice-", suffix=".upload", dir=AUDIO_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            spool.write(head)
+            del head
+            shutil.copyfileobj(stream, spool, 1024 * 1024)
+        logger.debug("💾 Spooled large voice upload (%s bytes) for decoding", os.path.getsize(path))
+        return decode_audio_file(path, sampling_rate)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------
+# Voice Activity & Windowing
+# -----------------------------------------------------------
+
+def trim_silence(samples, sampling_rate=AUDIO_SAMPLE_RATE, threshold_db=-35.0, frame_ms=30, pad_ms=150,
+                 floor=1e-4):
+    """
+    Energy-based VAD: keep frames whose RMS is within threshold_db of the
+    loudest frame (and above an absolute floor), padded by pad_ms on each
+    side so word onsets/offsets survive, and splice the voiced regions.
+    Returns an empty array when nothing sounds like speech.
+    """
+    frame = max(1, int(sampling_rate * frame_ms / 1000))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return samples
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    threshold = max(float(rms.max()) * (10.0 ** (threshold_db / 20.0)), floor)
+    voiced = rms >= threshold
+    if not voiced.any():
+        return samples[:0]
+
+    pad = int(np.ceil(pad_ms / frame_ms))
+    if pad:
+        # Dilate the voiced mask by `pad` frames in both directions
+        kernel = np.ones(2 * pad + 1, dtype=np.int32)
+        voiced = np.convolve(voiced.astype(np.int32), kernel, mode="same") > 0
+    if voiced.all():
+        return samples
+    return frames[voiced].reshape(-1)
+
+
+def split_windows(samples, sampling_rate=AUDIO_SAMPLE_RATE, window_seconds=4.0, max_seconds=30.0,
+                  min_window_seconds=1.0):
+    """
+    Cut at most max_seconds of audio into fixed windows. A short tail is
+    folded into the previous window (or kept alone if it is the only one).
+    """
+    samples = samples[: int(max_seconds * sampling_rate)]
+    size = max(1, int(window_seconds * sampling_rate))
+    windows = [samples[i:i + size] for i in range(0, len(samples), size)]
+    if len(windows) > 1 and len(windows[-1]) < min_window_seconds * sampling_rate:
+        tail = windows.pop()
+        windows[-1] = np.concatenate([windows[-1], tail])
+    return windows
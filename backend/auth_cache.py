@@ -0,0 +1,128 @@
+# ===========================================================
+# backend/auth_cache.py — Auth hot-path caching
+# ===========================================================
+# Keeps Firebase round trips off every authenticated request:
+#   • verified ID tokens cached by hash until they expire
+#   • a bounded set of user ids already known to exist
+#   • last_active writes coalesced to once per user per interval
+# ===========================================================
+
+import os
+import time
+import hashlib
+import threading
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_TTL = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "3600"))
+# Stop trusting a cached token this many seconds before it actually expires
+TOKEN_EXPIRY_SKEW = 30.0
+KNOWN_USERS_MAX = int(os.getenv("AUTH_KNOWN_USERS_SIZE", "50000"))
+LAST_ACTIVE_INTERVAL = float(os.getenv("LAST_ACTIVE_FLUSH_SECONDS", "60"))
+
+
+class VerifiedTokenCache:
+    """Decoded ID tokens keyed by SHA-256 of the raw token, bounded by token expiry."""
+
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES, max_ttl=TOKEN_CACHE_MAX_TTL):
+        self.max_ttl = max_ttl
+        self._cache = LRUCache(max_entries=max_entries, name="verified-tokens")
+
+    @staticmethod
+    def _key(id_token):
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    def verify(self, id_token, verify_fn):
+        """Return decoded claims, calling verify_fn(id_token) only on a miss."""
+        key = self._key(id_token)
+        decoded = self._cache.get(key)
+        if decoded is not None:
+            return decoded
+        decoded = verify_fn(id_token)
+        ttl = min(float(decoded.get("exp", 0)) - time.time() - TOKEN_EXPIRY_SKEW, self.max_ttl)
+        if ttl > 0:
+            self._cache.set(key, decoded, ttl_seconds=ttl)
+        return decoded
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+class LastActiveWriter:
+    """Coalesces last_active updates so each user is written at most once per interval."""
+
+    def __init__(self, flush_fn, interval=LAST_ACTIVE_INTERVAL):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self._pending = set()
+        self._last_written = LRUCache(max_entries=KNOWN_USERS_MAX, ttl_seconds=interval, name="last-active")
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.touches = 0
+        self.flushes = 0
+        self.writes = 0
+        self.errors = 0
+
+    def touch(self, user_id):
+        """Record activity; the write happens on the next flush unless one went out recently."""
+        with self._lock:
+            self.touches += 1
+            if user_id in self._last_written:
+                return
+            self._pending.add(user_id)
+        self._ensure_thread()
+
+    def mark_written(self, user_id):
+        """Note that last_active was just written elsewhere (e.g. on user creation)."""
+        self._last_written.set(user_id, True)
+
+    def flush(self):
+        with self._lock:
+            user_ids, self._pending = list(self._pending), set()
+        if not user_ids:
+            return 0
+        try:
+            self.flush_fn(user_ids)
+        except Exception:
+            self.errors += 1
+            logger.exception("🔥 [Auth] last_active flush failed")
+            with self._lock:
+                self._pending.update(user_ids)
+            return 0
+        for user_id in user_ids:
+            self._last_written.set(user_id, True)
+        self.flushes += 1
+        self.writes += len(user_ids)
+        return len(user_ids)
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="last-active-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "pending": len(self._pending),
+            "touches": self.touches,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
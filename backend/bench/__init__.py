@@ -0,0 +1,3 @@
+# ===========================================================
+# backend/bench — Load-test harness (python -m bench --help)
+# ===========================================================
@@ -0,0 +1,70 @@
+# ===========================================================
+# backend/bench/__main__.py — CLI for the load-test harness
+# ===========================================================
+# Run from backend/:
+#   python -m bench run --scenarios text,text_stream,history --concurrency 8 --requests 200
+#   python -m bench compare bench/results/<old>.json bench/results/<new>.json
+# ===========================================================
+
+import os
+import sys
+import json
+import argparse
+
+from bench.harness import SCENARIOS, compare, default_output_path, run
+
+
+def _scenario_list(value):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown scenario(s) {unknown}, expected {SCENARIOS}")
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="MindMate backend load tests")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="boot the app against local stand-ins and load it")
+    run_cmd.add_argument("--scenarios", type=_scenario_list, default=["text", "text_stream", "history"],
+                         help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    run_cmd.add_argument("--concurrency", type=int, default=8)
+    run_cmd.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    run_cmd.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    run_cmd.add_argument("--openai-ttft-ms", type=float, default=300)
+    run_cmd.add_argument("--openai-token-ms", type=float, default=20)
+    run_cmd.add_argument("--openai-tokens", type=int, default=48)
+    run_cmd.add_argument("--gemini-ms", type=float, default=400)
+    run_cmd.add_argument("--tts-ms", type=float, default=300, help="stub TTS delay per clip")
+    run_cmd.add_argument("--storage-ms", type=float, default=0, help="simulated Firestore round trip")
+    run_cmd.add_argument("--voice-seconds", type=float, default=4.0)
+    run_cmd.add_argument("--history-turns", type=int, default=120)
+    run_cmd.add_argument("--out", help="result file (default bench/results/<time>-<commit>.json)")
+
+    compare_cmd = commands.add_parser("compare", help="diff two result files")
+    compare_cmd.add_argument("baseline")
+    compare_cmd.add_argument("candidate")
+    compare_cmd.add_argument("--threshold", type=float, default=0.10,
+                             help="fractional p95/throughput change that counts as a regression")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.candidate, encoding="utf-8") as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+
+    document = run(args)
+    out = args.out or default_output_path(document)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"💾 Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
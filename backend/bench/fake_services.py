@@ -0,0 +1,227 @@
+# ===========================================================
+# backend/bench/fake_services.py — Local stand-ins for paid APIs
+# ===========================================================
+# One threaded HTTP server that answers both:
+#   POST /v1/chat/completions                 OpenAI (plain + SSE stream)
+#   POST /v1beta/models/<model>:generateContent   Gemini REST
+#
+# Latency is configurable so the harness measures our own overhead
+# against a realistic, repeatable upstream: a fixed time to first
+# token, a per-token delay for streams, and a fixed Gemini delay.
+# Point the app at it with OPENAI_BASE_URL and GEMINI_API_ENDPOINT.
+#
+# FakeTTSEngine replaces gTTS in-process (TTS_ENGINE=stub) with
+# the same fixed-delay treatment.
+# ===========================================================
+
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "It sounds like today has been a lot to carry. Thank you for telling me about it. "
+    "Would it help to talk through what felt hardest, or would you rather take a slow breath "
+    "together first? Either way, I'm here and we can go at your pace."
+).split()
+
+
+class FakeLatency:
+    """Upstream timing knobs, in seconds."""
+
+    def __init__(self, openai_ttft=0.3, openai_token_delay=0.02, openai_tokens=48, gemini=0.4, tts=0.3):
+        self.openai_ttft = openai_ttft
+        self.openai_token_delay = openai_token_delay
+        self.openai_tokens = openai_tokens
+        self.gemini = gemini
+        self.tts = tts
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _reply_tokens(count):
+    words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(count)]
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def _gemini_text(prompt: str) -> str:
+    """Canned output shaped like what each GeminiUtils helper parses."""
+    if "session summarization" in prompt:
+        return json.dumps({
+            "summary": "The user talked about a stressful week and ways to rest.",
+            "emotional_trend": "stable",
+            "topics": ["stress", "sleep"],
+            "confidence": 0.8,
+        })
+    if "emotional intelligence" in prompt:
+        return json.dumps({"emotion": "calm", "tone": "reflective", "confidence": 0.7})
+    if "relevance-assessment" in prompt:
+        return "0.5"
+    if "running summary" in prompt:
+        return "The user has been feeling stretched thin at work and is trying to sleep more."
+    return "Finding Calm Again"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # keep bench output readable
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        self.server.counts_inc(self.path.split("?")[0])
+        body = self._read_json()
+        if self.path.startswith("/v1/chat/completions"):
+            return self._openai(body)
+        if ":generateContent" in self.path:
+            return self._gemini(body)
+        self._send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    # -------------------------------------------------------
+    # OpenAI
+    # -------------------------------------------------------
+
+    def _openai(self, body):
+        latency = self.server.latency
+        model = body.get("model", "gpt-4o-mini")
+        tokens = _reply_tokens(latency.openai_tokens)
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": model}
+
+        time.sleep(latency.openai_ttft)
+        if not body.get("stream"):
+            time.sleep(latency.openai_token_delay * len(tokens))
+            return self._send_json({
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload):
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(latency.openai_token_delay)
+            delta = {"content": token, **({"role": "assistant"} if i == 0 else {})}
+            event({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event({**chunk, "choices": [], "usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    # -------------------------------------------------------
+    # Gemini
+    # -------------------------------------------------------
+
+    def _gemini(self, body):
+        time.sleep(self.server.latency.gemini)
+        prompt = " ".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        text = _gemini_text(prompt)
+        self._send_json({
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": (len(prompt) + len(text)) // 4,
+            },
+        })
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Threaded fake OpenAI + Gemini server; start() runs it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency or FakeLatency()
+        self.counts = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def counts_inc(self, path):
+        with self._counts_lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeTTSEngine:
+    """
+    Stand-in for GTTSEngine with the same interface: a fixed delay per
+    clip and deterministic MP3-sized bytes (about 1 KB per word), so the
+    tts scenario measures caching and request handling, not Google.
+    """
+
+    name = "stub"
+    mimetype = "audio/mpeg"
+    suffix = ".mp3"
+    default_voice = "com"
+
+    def __init__(self, latency=None):
+        self.latency = latency or FakeLatency()
+
+    def validate(self, lang, voice):
+        pass
+
+    def synthesize(self, text, lang, voice) -> bytes:
+        time.sleep(self.latency.tts)
+        seed = hashlib.sha256(f"{lang}|{voice}|{text}".encode("utf-8")).digest()
+        return seed * (32 * max(1, len(text.split())))
+
+    def stream(self, clips):
+        return clips
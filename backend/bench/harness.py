@@ -0,0 +1,561 @@
+# ===========================================================
+# backend/bench/harness.py — In-process load test of the Flask app
+# ===========================================================
+# Boots the real app on a local port with every paid dependency
+# replaced: OpenAI, Gemini and gTTS by bench.fake_services, Firestore
+# by the in-memory store (optionally with an artificial round trip).
+# Local models (text/tone classifiers, ASR) are the real ones, so
+# their cost shows up in the numbers.
+#
+# Each scenario is driven by N client threads over keep-alive
+# connections. Client-side latencies give p50/p95/p99 and
+# throughput; /metrics is scraped before and after so the span
+# histograms give a per-stage breakdown for the same window.
+# ===========================================================
+
+import io
+import os
+import re
+import json
+import math
+import time
+import wave
+import random
+import tempfile
+import platform
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from bench.fake_services import FakeLatency, FakeLLMServer, FakeTTSEngine
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SCENARIOS = ("text", "text_stream", "voice", "tts", "history")
+
+MESSAGES = (
+    "I've been feeling really anxious about work lately.",
+    "thanks",
+    "I couldn't sleep again last night and I'm exhausted.",
+    "My friend cancelled on me and I feel kind of lonely.",
+    "idk",
+    "Today was actually a pretty good day, I went for a long walk.",
+    "I keep overthinking everything I said in the meeting.",
+    "I'm fine",
+)
+
+
+# ===========================================================
+# Environment
+# ===========================================================
+
+class _LatentStore:
+    """Delays every storage call to mimic a Firestore round trip."""
+
+    def __init__(self, backend, latency):
+        self._backend = backend
+        self._latency = latency
+
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if attr.startswith("_") or attr == "stats" or not callable(value):
+            return value
+
+        def delayed(*args, **kwargs):
+            time.sleep(self._latency)
+            return value(*args, **kwargs)
+        return delayed
+
+
+def prepare_environment(fake_url, workdir, storage_latency=0.0, latency=None):
+    """Point the app at the stand-ins. Must run before `app` is imported."""
+    overrides = {
+        "STORAGE_BACKEND": "memory",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_API_ENDPOINT": fake_url,
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"),
+        "METRICS_DB": os.path.join(workdir, "metrics.db"),
+        "TTS_DISK_CACHE_DIR": os.path.join(workdir, "tts_cache"),
+        "METRICS_ENABLED": "1",
+    }
+    os.environ.update(overrides)
+    # Caller-provided settings win for knobs worth comparing across runs
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ASR_BACKEND", "local")
+    os.environ.setdefault("TTS_ENGINE", "stub")
+
+    import tts_service
+    real_create_engine = tts_service.create_tts_engine
+    tts_service.create_tts_engine = lambda name=None: (
+        FakeTTSEngine(latency) if (name or tts_service.TTS_ENGINE) == "stub" else real_create_engine(name)
+    )
+
+    if storage_latency > 0:
+        import storage
+        from storage.memory_store import MemoryStore
+        storage.create_store = lambda backend=None: _LatentStore(MemoryStore(), storage_latency)
+
+
+def start_app():
+    """Serve the real Flask app on an ephemeral port; returns (server, base_url)."""
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ===========================================================
+# HTTP client
+# ===========================================================
+
+class Client:
+    """One keep-alive connection per load thread."""
+
+    def __init__(self, base_url, user_id=None, timeout=120):
+        parts = urlsplit(base_url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port, timeout
+        self.user_id = user_id
+        self._conn = None
+
+    def request(self, method, path, body=None, headers=None, stream=False):
+        """Returns (status, body_bytes, seconds_to_first_byte)."""
+        headers = dict(headers or {})
+        if self.user_id:
+            headers.setdefault("X-User-ID", self.user_id)
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self._conn.request(method, path, body=body, headers=headers)
+                response = self._conn.getresponse()
+                first = response.read1(65536) if stream else b""
+                first_byte = time.perf_counter() - started
+                data = first + response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return response.status, data, first_byte
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Stale keep-alive socket: reconnect once
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _multipart(fields, files):
+    boundary = f"bench{random.getrandbits(64):x}"
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def synthetic_voice_wav(seconds=4.0, sampling_rate=16000, seed=0):
+    """Speech-like test clip: modulated harmonics with pauses, as 16-bit WAV bytes."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sampling_rate)) / sampling_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sampling_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = (np.sin(2 * np.pi * 3.0 * t) > -0.3).astype(np.float32)
+    pause = (t % 2.0) < 1.6
+    signal = 0.3 * voiced * syllables * pause + 0.01 * rng.standard_normal(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sampling_rate)
+        wav.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+# ===========================================================
+# Scenarios
+# ===========================================================
+
+class Scenario:
+    """Builds the i-th request for a worker; `stream` measures time to first byte."""
+
+    stream = False
+
+    def __init__(self, name):
+        self.name = name
+        self.user_id = None
+
+    def setup(self, client, worker_index):
+        return {}
+
+    def build(self, state, i):
+        raise NotImplementedError
+
+
+class _SessionScenario(Scenario):
+    def setup(self, client, worker_index):
+        status, body, _ = client.request("POST", "/sessions/new", body={})
+        if status != 201:
+            raise RuntimeError(f"/sessions/new returned {status}: {body[:200]!r}")
+        return {"session_id": json.loads(body)["session_id"]}
+
+
+class TextScenario(_SessionScenario):
+    def build(self, state, i):
+        return "POST", "/text", {"session_id": state["session_id"], "input_text": MESSAGES[i % len(MESSAGES)]}, None
+
+
+class TextStreamScenario(TextScenario):
+    stream = True
+
+    def build(self, state, i):
+        _, _, body, headers = super().build(state, i)
+        return "POST", "/text/stream", body, headers
+
+
+class VoiceScenario(_SessionScenario):
+    def __init__(self, name, clip_seconds=4.0):
+        super().__init__(name)
+        self.clip = synthetic_voice_wav(clip_seconds)
+
+    def build(self, state, i):
+        body, content_type = _multipart(
+            {"session_id": state["session_id"]},
+            {"audio": ("bench.wav", self.clip, "audio/wav")},
+        )
+        return "POST", "/voice", body, {"Content-Type": content_type}
+
+
+class TTSScenario(Scenario):
+    """Cycles a small set of replies, so the first pass misses and later ones hit the cache."""
+
+    def build(self, state, i):
+        return "POST", "/tts", {"text": MESSAGES[i % len(MESSAGES)], "format": "raw"}, None
+
+
+class HistoryScenario(_SessionScenario):
+    """Alternates session list and transcript pages on a pre-seeded session."""
+
+    def __init__(self, name, turns=120):
+        super().__init__(name)
+        self.turns = turns
+
+    def setup(self, client, worker_index):
+        state = super().setup(client, worker_index)
+        from firebase_utils import save_interaction_to_session
+        for n in range(self.turns):
+            save_interaction_to_session(
+                user_id=client.user_id,
+                session_id=state["session_id"],
+                user_input=MESSAGES[n % len(MESSAGES)],
+                gpt_response=" ".join(MESSAGES),
+                text_emotion={"label": "neutral", "score": 0.5},
+                tone_emotion={"label": "Unknown", "score": 0.0},
+            )
+        return state
+
+    def build(self, state, i):
+        if i % 2:
+            return "GET", f"/history/{self.user_id}/{state['session_id']}?limit=50", None, None
+        return "GET", f"/history/{self.user_id}?limit=20", None, None
+
+
+def make_scenario(name, args):
+    if name == "text":
+        return TextScenario(name)
+    if name == "text_stream":
+        return TextStreamScenario(name)
+    if name == "voice":
+        return VoiceScenario(name, clip_seconds=args.voice_seconds)
+    if name == "tts":
+        return TTSScenario(name)
+    if name == "history":
+        return HistoryScenario(name, turns=args.history_turns)
+    raise ValueError(f"Unknown scenario '{name}', expected one of {SCENARIOS}")
+
+
+# ===========================================================
+# Statistics
+# ===========================================================
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100.0 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+    ms = lambda v: round(v * 1000, 2)  # noqa: E731
+    return {
+        "count": len(values),
+        "mean_ms": ms(sum(values) / len(values)),
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]),
+    }
+
+
+_SAMPLE = re.compile(r"^(\w+?)(_bucket|_sum|_count)\{(.*)\} (\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape_histograms(client, family):
+    """Parse one histogram family from /metrics into {series_key: {"sum", "count", "buckets"}}."""
+    status, body, _ = client.request("GET", "/metrics")
+    if status != 200:
+        return {}
+    series = {}
+    for line in body.decode("utf-8").splitlines():
+        match = _SAMPLE.match(line)
+        if not match or match.group(1) != family:
+            continue
+        _, kind, raw_labels, value = match.groups()
+        labels = dict(_LABEL.findall(raw_labels))
+        le = labels.pop("le", None)
+        labels.pop("pid", None)
+        key = labels.get("span") or labels.get("endpoint") or ""
+        entry = series.setdefault(key, {"sum": 0.0, "count": 0.0, "buckets": {}})
+        if kind == "_bucket":
+            bound = float("inf") if le == "+Inf" else float(le)
+            entry["buckets"][bound] = entry["buckets"].get(bound, 0.0) + float(value)
+        else:
+            entry[kind[1:]] += float(value)
+    return series
+
+
+def _bucket_quantile(buckets, q):
+    """Linear interpolation inside cumulative histogram buckets (Prometheus-style)."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if not total:
+        return None
+    target, lower, below = q * total, 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= target:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (target - below) / max(count - below, 1e-9)
+        lower, below = bound, count
+    return lower
+
+
+def histogram_delta(before, after):
+    """Per-series mean/p95 for observations made between two scrapes."""
+    breakdown = {}
+    for key, end in after.items():
+        start = before.get(key, {"sum": 0.0, "count": 0.0, "buckets": {}})
+        count = end["count"] - start["count"]
+        if count <= 0:
+            continue
+        buckets = {b: n - start["buckets"].get(b, 0.0) for b, n in end["buckets"].items()}
+        p95 = _bucket_quantile(buckets, 0.95)
+        breakdown[key] = {
+            "count": int(count),
+            "mean_ms": round((end["sum"] - start["sum"]) / count * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        }
+    return dict(sorted(breakdown.items(), key=lambda kv: -kv[1]["mean_ms"] * kv[1]["count"]))
+
+
+# ===========================================================
+# Driver
+# ===========================================================
+
+def _create_user(base_url):
+    client = Client(base_url)
+    status, body, _ = client.request("POST", "/user", body={"is_new": True})
+    client.close()
+    if status != 201:
+        raise RuntimeError(f"/user returned {status}: {body[:200]!r}")
+    return json.loads(body)["user_id"]
+
+
+def run_scenario(base_url, scenario, concurrency, requests, warmup=5):
+    """Drive one scenario with `concurrency` threads until `requests` responses are in."""
+    user_id = _create_user(base_url)
+    scenario.user_id = user_id
+    clients = [Client(base_url, user_id=user_id) for _ in range(concurrency)]
+    states = [scenario.setup(client, n) for n, client in enumerate(clients)]
+
+    # Warm-up: load lazy models and fill connection pools outside the window
+    for i in range(warmup):
+        method, path, body, headers = scenario.build(states[0], i)
+        clients[0].request(method, path, body, headers, stream=scenario.stream)
+
+    probe = Client(base_url)
+    spans_before = scrape_histograms(probe, "mindmate_span_seconds")
+    http_before = scrape_histograms(probe, "mindmate_http_request_seconds")
+
+    latencies, first_bytes, statuses = [], [], {}
+    errors = []
+    lock = threading.Lock()
+    issued = iter(range(requests))
+
+    def worker(n):
+        client, state = clients[n], states[n]
+        while True:
+            with lock:
+                i = next(issued, None)
+            if i is None:
+                return
+            method, path, body, headers = scenario.build(state, i)
+            started = time.perf_counter()
+            try:
+                status, _, first_byte = client.request(method, path, body, headers, stream=scenario.stream)
+            except Exception as exc:
+                with lock:
+                    errors.append(repr(exc))
+                client.close()
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status < 400:
+                    latencies.append(elapsed)
+                    if scenario.stream:
+                        first_bytes.append(first_byte)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), name=f"bench-{n}") for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    stages = histogram_delta(spans_before, scrape_histograms(probe, "mindmate_span_seconds"))
+    server_side = histogram_delta(http_before, scrape_histograms(probe, "mindmate_http_request_seconds"))
+    for client in clients + [probe]:
+        client.close()
+
+    result = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": len(errors),
+        "latency": summarize(latencies),
+        "server": server_side,
+        "stages": stages,
+    }
+    if scenario.stream:
+        result["first_byte"] = summarize(first_bytes)
+    if errors:
+        result["error_samples"] = errors[:5]
+    return result
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run(args):
+    """Run the selected scenarios and return the result document."""
+    latency = FakeLatency(
+        openai_ttft=args.openai_ttft_ms / 1000.0,
+        openai_token_delay=args.openai_token_ms / 1000.0,
+        openai_tokens=args.openai_tokens,
+        gemini=args.gemini_ms / 1000.0,
+        tts=args.tts_ms / 1000.0,
+    )
+    fake = FakeLLMServer(latency=latency).start()
+    workdir = tempfile.mkdtemp(prefix="mindmate-bench-")
+    prepare_environment(fake.url, workdir, storage_latency=args.storage_ms / 1000.0, latency=latency)
+    server, base_url = start_app()
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            print(f"▶️  {name}: {args.requests} requests at concurrency {args.concurrency}")
+            results[name] = run_scenario(
+                base_url, make_scenario(name, args), args.concurrency, args.requests, warmup=args.warmup
+            )
+            lat = results[name]["latency"]
+            print(f"   p50={lat.get('p50_ms')}ms p95={lat.get('p95_ms')}ms p99={lat.get('p99_ms')}ms "
+                  f"{results[name]['throughput_rps']} req/s, statuses {results[name]['statuses']}")
+    finally:
+        server.shutdown()
+        fake.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "scenarios": list(args.scenarios),
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "storage_ms": args.storage_ms,
+                "tts_engine": os.environ.get("TTS_ENGINE"),
+                "fake_latency": latency.as_dict(),
+            },
+            "upstream_calls": dict(fake.counts),
+        },
+        "scenarios": results,
+    }
+
+
+def default_output_path(document):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = document["meta"].get("commit") or "nogit"
+    return os.path.join(RESULTS_DIR, f"{stamp}-{commit}.json")
+
+
+def compare(old, new, threshold=0.10):
+    """Print per-scenario deltas; returns True if any p95 or throughput regressed past threshold."""
+    regressed = False
+    print(f"{'scenario':<12} {'metric':<15} {'old':>10} {'new':>10} {'change':>8}")
+    for name, new_result in new["scenarios"].items():
+        old_result = old["scenarios"].get(name)
+        if old_result is None:
+            print(f"{name:<12} (not in baseline)")
+            continue
+        rows = [(m, old_result["latency"].get(m), new_result["latency"].get(m)) for m in ("p50_ms", "p95_ms", "p99_ms")]
+        rows.append(("throughput_rps", old_result["throughput_rps"], new_result["throughput_rps"]))
+        for metric, before, after in rows:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change < -threshold if metric == "throughput_rps" else change > threshold
+            if metric in ("p95_ms", "throughput_rps") and worse:
+                regressed = True
+            flag = "  ⚠️" if worse else ""
+            print(f"{name:<12} {metric:<15} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+    return regressed
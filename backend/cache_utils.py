@@ -0,0 +1,155 @@
+# ===========================================================
+# backend/cache_utils.py — In-process LRU cache with TTL
+# ===========================================================
+# Thread-safe LRU bounded by entry count and by an approximate
+# memory budget, with per-entry expiry and hit/miss counters.
+# ===========================================================
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def approx_size(value) -> int:
+    """Rough recursive size estimate in bytes for plain Python data."""
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """LRU cache with TTL, entry-count and byte-budget eviction."""
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl_seconds=None, size_fn=approx_size, name="cache"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_fn = size_fn
+        self.name = name
+
+        self._data = OrderedDict()  # key → (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -------------------------------------------------------
+    # Internal helpers (caller holds the lock)
+    # -------------------------------------------------------
+
+    def _expired(self, expires_at, now):
+        return expires_at is not None and now >= expires_at
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._data and (
+            (self.max_entries is not None and len(self._data) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+
+    # -------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if self._expired(expires_at, time.monotonic()):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and not self._expired(entry[1], time.monotonic())
+
+    def set(self, key, value, ttl_seconds=_MISSING):
+        ttl = self.ttl_seconds if ttl_seconds is _MISSING else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        size = self.size_fn(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Never cache an entry that would evict everything else
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def update(self, key, fn):
+        """Atomically replace a live entry with fn(value); no-op if absent. Returns True if applied."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            value, expires_at, size = entry
+            if self._expired(expires_at, time.monotonic()):
+                self._remove(key)
+                self.expirations += 1
+                return False
+            new_value = fn(value)
+            new_size = self.size_fn(new_value)
+            self._data[key] = (new_value, expires_at, new_size)
+            self._bytes += new_size - size
+            self._data.move_to_end(key)
+            self._evict()
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
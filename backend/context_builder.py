@@ -0,0 +1,209 @@
+# ===========================================================
+# backend/context_builder.py — Token-budgeted GPT context
+# ===========================================================
+# Builds the message list for gpt-4o-mini within a token budget.
+# Older turns of a session are folded into a running summary
+# (stored on the session document and reused across turns) and
+# only the most recent turns are sent verbatim. Per-turn context
+# goes after the history, just before the user's message, so the
+# system prompt + history prefix stays stable across turns.
+#
+# Refreshing the summary costs a Gemini round trip, so it never runs
+# inside a request: the turn that finds compaction due sends what fits
+# of the uncompacted turns and schedules compact_session_context() on
+# the background job queue; later turns reuse the stored summary.
+# ===========================================================
+
+import os
+
+import tiktoken
+
+from cache_utils import LRUCache
+from firebase_utils import get_session_details, save_context_summary
+from GeminiUtils import gemini_compact_conversation
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+CONTEXT_MODEL = "gpt-4o-mini"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "6"))
+# Verbatim turns are allowed to grow this far past CONTEXT_RECENT_TURNS
+# before being compacted, so the summary is regenerated every few turns
+# rather than on every message.
+CONTEXT_COMPACT_EVERY = int(os.getenv("CONTEXT_COMPACT_EVERY", "4"))
+
+# Per-message framing overhead used by OpenAI chat models
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+
+_encoding = None
+
+# (user_id, session_id) → {"summary": str, "turns": int}
+_summary_state = LRUCache(max_entries=2048, ttl_seconds=1800, name="context-summaries")
+
+
+# ===========================================================
+# Token Counting
+# ===========================================================
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(CONTEXT_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode(text or "", disallowed_special=()))
+
+
+def count_message_tokens(messages: list) -> int:
+    """Token count of a chat payload, including per-message overhead."""
+    return sum(count_tokens(m["content"]) + _TOKENS_PER_MESSAGE for m in messages) + _TOKENS_PER_REPLY
+
+
+def _turn_tokens(interaction) -> int:
+    return (
+        count_tokens(interaction.get("user_input", ""))
+        + count_tokens(interaction.get("gpt_response", ""))
+        + 2 * _TOKENS_PER_MESSAGE
+    )
+
+
+def _summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier part of this conversation:\n{summary}"}
+
+
+# ===========================================================
+# Planning
+# ===========================================================
+
+def plan_context(interactions, covered, base_tokens, budget=None, recent_turns=None, compact_every=None):
+    """
+    Decide which turns stay verbatim.
+    Returns (cut, compact): interactions[cut:] are sent verbatim and,
+    if `compact` is True, interactions[covered:cut] must be folded
+    into the running summary first.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    recent_turns = CONTEXT_RECENT_TURNS if recent_turns is None else recent_turns
+    compact_every = CONTEXT_COMPACT_EVERY if compact_every is None else compact_every
+
+    covered = max(0, min(covered, len(interactions)))
+    turn_costs = [_turn_tokens(i) for i in interactions[covered:]]
+    total = base_tokens + sum(turn_costs)
+
+    # Keep everything after the summary while it fits and hasn't grown too long
+    if total <= budget and len(turn_costs) < recent_turns + compact_every:
+        return covered, False
+
+    # Otherwise keep at most `recent_turns`, dropping more if still over budget
+    cut = max(covered, len(interactions) - recent_turns)
+    return _trim_to_budget(turn_costs, covered, cut, base_tokens, budget), cut > covered
+
+
+def _trim_to_budget(turn_costs, covered, cut, base_tokens, budget):
+    """Advance `cut` past the oldest turns until the verbatim tail fits the budget."""
+    end = covered + len(turn_costs)
+    used = base_tokens + sum(turn_costs[cut - covered:])
+    while cut < end and used > budget:
+        used -= turn_costs[cut - covered]
+        cut += 1
+    return cut
+
+
+def _load_state(user_id, session_id, fresh=False):
+    key = (user_id, session_id)
+    state = None if fresh else _summary_state.get(key)
+    if state is None:
+        details = get_session_details(user_id, session_id) or {}
+        state = {
+            "summary": details.get("context_summary") or "",
+            "turns": int(details.get("context_summary_turns") or 0),
+        }
+        _summary_state.set(key, state)
+    return state
+
+
+# ===========================================================
+# Context Assembly
+# ===========================================================
+
+def build_context_messages(user_id, session_id, system_prompt, interactions, user_input, turn_context=None,
+                           schedule_compaction=None):
+    """
+    Return the GPT message list for this turn within CONTEXT_TOKEN_BUDGET.
+    When the running summary is due for a refresh, `schedule_compaction`
+    is called with (user_id, session_id) instead of compacting inline.
+    """
+    system_message = {"role": "system", "content": system_prompt}
+    user_message = {"role": "user", "content": user_input}
+    tail = [{"role": "system", "content": turn_context}] if turn_context else []
+    tail.append(user_message)
+
+    state = {"summary": "", "turns": 0}
+    if len(interactions) > CONTEXT_RECENT_TURNS:
+        # Short sessions can never have been compacted — skip the lookup
+        state = _load_state(user_id, session_id)
+    summary, covered = state["summary"], min(state["turns"], len(interactions))
+
+    def base_tokens(current_summary):
+        base = [system_message, *tail]
+        if current_summary:
+            base.append(_summary_message(current_summary))
+        return count_message_tokens(base)
+
+    base = base_tokens(summary)
+    cut, compact = plan_context(interactions, covered, base)
+    if compact:
+        # Send everything after the current summary that fits; the refresh
+        # happens in the background and the next turn picks it up
+        turn_costs = [_turn_tokens(i) for i in interactions[covered:]]
+        cut = _trim_to_budget(turn_costs, covered, covered, base, CONTEXT_TOKEN_BUDGET)
+        # Another worker may have compacted already: re-read the stored state next turn
+        _summary_state.pop((user_id, session_id))
+        if schedule_compaction is not None:
+            try:
+                schedule_compaction(user_id, session_id)
+            except Exception:
+                logger.exception("🔥 [Context] Could not schedule compaction")
+
+    messages = [system_message]
+    if summary and covered:
+        messages.append(_summary_message(summary))
+    for interaction in interactions[cut:]:
+        messages.append({"role": "user", "content": interaction["user_input"]})
+        messages.append({"role": "assistant", "content": interaction["gpt_response"]})
+    messages.extend(tail)
+
+    logger.debug("🧮 [Context] %s tokens (budget %s, %s verbatim turns, %s summarized)", count_message_tokens(messages), CONTEXT_TOKEN_BUDGET, len(interactions) - cut, covered)
+    return messages
+
+
+def compact_session_context(user_id, session_id, interactions) -> bool:
+    """
+    Fold all but the last CONTEXT_RECENT_TURNS interactions into the
+    session's running summary. Returns False if there was nothing to
+    fold; raises if Gemini or the store fails so the job is retried.
+    """
+    state = _load_state(user_id, session_id, fresh=True)
+    summary, covered = state["summary"], min(state["turns"], len(interactions))
+    cut = len(interactions) - CONTEXT_RECENT_TURNS
+    if cut <= covered:
+        return False
+    new_summary = gemini_compact_conversation(summary, interactions[covered:cut])
+    if not new_summary:
+        raise RuntimeError(f"Compaction unavailable for session {session_id}")
+    if not save_context_summary(user_id, session_id, new_summary, cut):
+        raise RuntimeError(f"Context summary save failed for session {session_id}")
+    _summary_state.set((user_id, session_id), {"summary": new_summary, "turns": cut})
+    logger.debug("🧩 [Context] Folded turns %s–%s of session %s into the running summary", covered, cut, session_id)
+    return True
+
+
+def context_stats() -> dict:
+    return _summary_state.stats()
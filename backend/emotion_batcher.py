@@ -0,0 +1,157 @@
+# ===========================================================
+# backend/emotion_batcher.py — Dynamic micro-batching layer
+# ===========================================================
+# Collects concurrent single-item inference calls for a short
+# window and runs them through the model as one padded batch.
+# Each caller gets back a Future resolving to its own result.
+# ===========================================================
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class MicroBatcher:
+    """Group concurrent requests into batches for a batch-capable callable.
+
+    ``batch_fn`` receives a list of inputs and must return a list of
+    results of the same length, in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10.0, name="batcher"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._occupancy = [0] * (self.max_batch_size + 1)
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._max_queue_depth = 0
+
+    # -------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------
+
+    def submit(self, item) -> Future:
+        """Queue a single input and return a Future for its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit an input and block until its result is ready."""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        """Return batch occupancy and latency counters."""
+        with self._lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "items": items,
+                "errors": self._errors,
+                "avg_batch_size": (items / batches) if batches else 0.0,
+                "avg_occupancy": (items / (batches * self.max_batch_size)) if batches else 0.0,
+                "occupancy_histogram": {
+                    str(size): count for size, count in enumerate(self._occupancy) if count
+                },
+                "avg_queue_wait_ms": (self._wait_seconds / items * 1000.0) if items else 0.0,
+                "avg_batch_run_ms": (self._run_seconds / batches * 1000.0) if batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+            }
+
+    # -------------------------------------------------------
+    # Worker
+    # -------------------------------------------------------
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a batcher created in a
+        # preloading parent process starts its worker on first use.
+        pid = os.getpid()
+        if self._worker is not None and self._pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == pid and self._worker.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._worker = threading.Thread(
+                target=self._run, name=f"{self.name}-worker", daemon=True
+            )
+            self._worker.start()
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or timed out."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop requests whose callers cancelled while queued
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            inputs = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(inputs)
+                if len(results) != len(inputs):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(inputs)} inputs"
+                    )
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+                failed = False
+            except Exception as e:
+                logger.exception("🔥 [%s] Batch inference failed", self.name)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                failed = True
+            finished = time.monotonic()
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._occupancy[len(batch)] += 1
+                self._wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+                self._run_seconds += finished - started
+                if failed:
+                    self._errors += 1
@@ -0,0 +1,169 @@
+# ===========================================================
+# backend/emotion_cache.py — Memoized text-emotion results
+# ===========================================================
+# Short messages repeat a lot ("I'm fine", "thanks", "idk"), so
+# classifier outputs are memoized by a hash of the normalized
+# text. Lookups hit an in-process LRU first and, when a database
+# path is configured, a SQLite table shared by all workers and
+# kept across restarts.
+#
+# Every key is scoped by a model fingerprint (model id, inference
+# backend, library version, ONNX export stamp, ...). When any of
+# these change, old entries simply stop matching, and rows
+# written under other fingerprints are purged at startup.
+# ===========================================================
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """NFKC, case-folded, whitespace-collapsed form used for cache keys."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def model_fingerprint(*parts) -> str:
+    """Short stable hash of everything that can change a model's outputs."""
+    raw = json.dumps([str(p) for p in parts], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class EmotionCache:
+    """Two-tier (memory LRU + optional SQLite) cache of classifier outputs."""
+
+    def __init__(self, fingerprint, max_entries=4096, db_path=None, max_disk_entries=100000,
+                 max_chars=280, name="emotion-cache"):
+        self.fingerprint = fingerprint
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.max_chars = max_chars
+        self.name = name
+        self.memory = LRUCache(max_entries=max_entries, name=name)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.disk_hits = 0
+        self.lookups = 0
+        self.skipped = 0
+
+        if db_path:
+            try:
+                self._init_db()
+            except Exception:
+                logger.warning("⚠️ [%s] Disk tier disabled", self.name, exc_info=True)
+                self.db_path = None
+
+    # -------------------------------------------------------
+    # SQLite tier
+    # -------------------------------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS emotion_cache ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, result TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_emotion_cache_age ON emotion_cache (updated_at)")
+        purged = conn.execute("DELETE FROM emotion_cache WHERE fingerprint != ?", (self.fingerprint,)).rowcount
+        if purged:
+            logger.info("🧹 [%s] Model changed — dropped %s stale cached results", self.name, purged)
+
+    def _disk_get(self, key):
+        row = self._conn().execute(
+            "SELECT result FROM emotion_cache WHERE key = ? AND fingerprint = ?", (key, self.fingerprint)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _disk_set(self, key, result):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO emotion_cache (key, fingerprint, result, updated_at) VALUES (?, ?, ?, ?)",
+            (key, self.fingerprint, json.dumps(result), time.time()),
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 1000 == 0
+        if prune:
+            conn.execute(
+                "DELETE FROM emotion_cache WHERE key IN ("
+                "SELECT key FROM emotion_cache ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    # -------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------
+
+    def key(self, text):
+        """Cache key for a message, or None if it is too long to be worth caching."""
+        normalized = normalize_text(text)
+        if len(normalized) > self.max_chars:
+            return None
+        return hashlib.sha256(f"{self.fingerprint}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            self.lookups += 1
+        result = self.memory.get(key)
+        if result is not None or not self.db_path:
+            return result
+        try:
+            result = self._disk_get(key)
+        except sqlite3.Error:
+            logger.warning("⚠️ [%s] Disk read failed", self.name, exc_info=True)
+            return None
+        if result is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self.memory.set(key, result)
+        return result
+
+    def set(self, key, result):
+        self.memory.set(key, result)
+        if self.db_path:
+            try:
+                self._disk_set(key, result)
+            except sqlite3.Error:
+                logger.warning("⚠️ [%s] Disk write failed", self.name, exc_info=True)
+
+    def skip(self):
+        """Count a message that bypassed the cache (too long)."""
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        with self._lock:
+            hits = memory["hits"] + self.disk_hits
+            return {
+                "fingerprint": self.fingerprint,
+                "lookups": self.lookups,
+                "memory_hits": memory["hits"],
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+                "skipped_long_messages": self.skipped,
+                "entries": memory["entries"],
+                "persistent": bool(self.db_path),
+            }
@@ -2,72 +2,130 @@
 # backend/firebase_utils.py — Finalized Firebase Data Layer
 # ==============================================================
 # Purpose:
-#   Unified Firestore interface for managing users, sessions,
+#   Unified data interface for managing users, sessions,
 #   interactions, summaries, and contextual metadata for the
 #   Mental Health Chatbot project.
+#
+#   Storage is pluggable (see storage/): Firestore by default,
+#   or SQLite / in-memory via STORAGE_BACKEND for offline runs.
 # ==============================================================
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime, timezone
+import os
 import uuid
-import traceback
+import functools
+import itertools
+import threading
 
-import os
-import json
+from cache_utils import LRUCache
+from storage import create_store
+from storage.base import INTERACTION_FIELDS, SESSION_FIELDS, paginate, project, utc_now
+from log_utils import get_logger
+from metrics import span
+
+logger = get_logger(__name__)
 
 
 # ==============================================================
-# 1️⃣ Firebase Initialization
+# 1️⃣ Storage Initialization
 # ==============================================================
 
-try:
-    if not firebase_admin._apps:
-        # Render secret file path
-        render_key_path = "/etc/secrets/firebase_key.json"
-        # Local path
-        local_key_path = r"C:\Users\kazim\Downloads\mindmate-b420b-firebase-adminsdk-fbsvc-b3801a9502.json"
+class _TimedStore:
+    """Proxy that records every backend call as a `storage.<method>` span."""
+
+    _UNTIMED = {"stats", "new_interaction_id"}
 
-        key_path = render_key_path if os.path.exists(render_key_path) else local_key_path
+    def __init__(self, backend):
+        self._backend = backend
 
-        cred = credentials.Certificate(key_path)
-        firebase_admin.initialize_app(cred)
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if attr.startswith("_") or attr in self._UNTIMED or not callable(value):
+            return value
+        name, backend = f"storage.{attr}", self._backend.name
 
-    db = firestore.client()
-    print("✅ [Firebase] Connection established successfully.")
+        @functools.wraps(value)
+        def timed(*args, **kwargs):
+            with span(name, backend=backend):
+                return value(*args, **kwargs)
+        return timed
+
+
+store = _TimedStore(create_store())
+
+# Raw Firestore client, kept for callers that need it (None on other backends)
+db = getattr(store, "db", None)
 
-except Exception as e:
-    print(f"🔥 [Firebase Init Error]: {traceback.format_exc()}")
-    raise SystemExit("Failed to initialize Firebase connection.")
 # ==============================================================
-# 2️⃣ Helper: Timestamp Generator
+# 2️⃣ Session Transcript Cache
 # ==============================================================
+# Write-through LRU of ordered interaction lists keyed by
+# (user_id, session_id). Served to analyze_and_respond and the
+# history endpoints so each turn doesn't re-stream the session.
+
+def _transcript_size(interactions: list) -> int:
+    """Approximate bytes held by a cached transcript."""
+    return sum(
+        len(i.get("user_input", "")) + len(i.get("gpt_response", "")) + 512
+        for i in interactions
+    ) + 64
 
-def utc_now():
-    """Return current UTC datetime with timezone."""
-    return datetime.now(timezone.utc)
+
+session_cache = LRUCache(
+    max_entries=int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "512")),
+    max_bytes=int(float(os.getenv("SESSION_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    ttl_seconds=float(os.getenv("SESSION_CACHE_TTL_SECONDS", "300")),
+    size_fn=_transcript_size,
+    name="session-transcripts",
+)
+
+# A transcript read from the store is only cached if no interaction was
+# saved to that session while it was being read; otherwise the snapshot
+# could miss a turn whose append found nothing cached to append to.
+_transcript_lock = threading.Lock()
+_transcript_writes = LRUCache(max_entries=session_cache.max_entries * 8, name="session-transcript-writes")
+_write_seq = itertools.count(1)
+
+
+def _append_to_cached_transcript(key, payload):
+    interaction_id = payload["interaction_id"]
+    with _transcript_lock:
+        _transcript_writes.set(key, next(_write_seq))
+        # A read that finished after the store write may already hold this turn
+        session_cache.update(key, lambda cached: (
+            cached if any(i["interaction_id"] == interaction_id for i in cached) else cached + [payload]
+        ))
+
+
+def _cache_transcript(key, interactions, seen_write):
+    with _transcript_lock:
+        if _transcript_writes.get(key) == seen_write:
+            session_cache.set(key, interactions)
 
 # ==============================================================
 # 3️⃣ User Management
 # ==============================================================
 
-def ensure_user_exists(user_id: str):
-    """Create user root document if not already present."""
+def ensure_user_exists(user_id: str) -> bool:
+    """Create user root document if not already present. Returns False on failure."""
     try:
-        user_ref = db.collection("conversations").document(user_id)
-        if not user_ref.get().exists:
-            user_ref.set({
-                "user_id": user_id,
-                "created_at": firestore.SERVER_TIMESTAMP,
-                "status": "active",
-                "total_sessions": 0,
-                "last_active": firestore.SERVER_TIMESTAMP,
-            })
-            print(f"👤 [User Created] {user_id}")
-        else:
-            user_ref.update({"last_active": firestore.SERVER_TIMESTAMP})
+        if store.ensure_user_exists(user_id):
+            logger.debug("👤 [User Created] %s", user_id)
+        return True
     except Exception:
-        print(f"🔥 [User Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [User Error]")
+        return False
+
+def user_exists(user_id: str) -> bool:
+    """Check whether a user root document exists."""
+    try:
+        return store.user_exists(user_id)
+    except Exception:
+        logger.exception("🔥 [User Exists Error]")
+        return False
+
+def touch_users_last_active(user_ids: list) -> None:
+    """Bump last_active for many users in batched writes."""
+    store.touch_users_last_active(user_ids)
 
 # ==============================================================
 # 4️⃣ Session Management
@@ -78,41 +136,21 @@ def create_new_session(user_id: str) -> str:
     try:
         ensure_user_exists(user_id)
         session_id = f"session-{uuid.uuid4().hex[:8]}"
-        session_ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-        )
-        session_ref.set({
-            "session_id": session_id,
-            "title": "Untitled Session",
-            "created_at": firestore.SERVER_TIMESTAMP,
-            "last_updated": firestore.SERVER_TIMESTAMP,
-            "summary": None,
-            "emotional_trend": None,
-            "topics": [],
-        })
-        print(f"💬 [Session Created] {session_id}")
+        store.create_session(user_id, session_id)
+        logger.debug("💬 [Session Created] %s", session_id)
         return session_id
     except Exception:
-        print(f"🔥 [Create Session Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Create Session Error]")
         return ""
 
 def update_session_title(user_id: str, session_id: str, title: str) -> bool:
     """Update a session's title."""
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-        )
-        ref.update({"title": title, "last_updated": firestore.SERVER_TIMESTAMP})
-        print(f"🏷️ [Title Updated] {title}")
+        store.update_session_title(user_id, session_id, title)
+        logger.debug("🏷️ [Title Updated] %s", title)
         return True
     except Exception:
-        print(f"🔥 [Update Title Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Update Title Error]")
         return False
 
 # ==============================================================
@@ -127,19 +165,11 @@ def save_interaction_to_session(
     text_emotion: dict,
     tone_emotion: dict,
 ) -> bool:
-    """Save a structured user–assistant exchange to Firestore."""
+    """Save a structured user–assistant exchange to the session."""
     try:
-        session_ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-        )
-        session_ref.update({"last_updated": firestore.SERVER_TIMESTAMP})
-
-        interaction_ref = session_ref.collection("interactions").document()
+        interaction_id = store.new_interaction_id()
         payload = {
-            "interaction_id": interaction_ref.id,
+            "interaction_id": interaction_id,
             "timestamp": utc_now(),
             "user_input": user_input.strip(),
             "gpt_response": gpt_response.strip(),
@@ -154,29 +184,56 @@ def save_interaction_to_session(
                 },
             },
         }
-        interaction_ref.set(payload)
-        print(f"💾 [Interaction Saved] {interaction_ref.id}")
+        store.save_interaction(user_id, session_id, payload)
+        _append_to_cached_transcript((user_id, session_id), payload)
+        logger.debug("💾 [Interaction Saved] %s", interaction_id)
         return True
     except Exception:
-        print(f"🔥 [Save Interaction Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Save Interaction Error]")
         return False
 
 def get_session_interactions(user_id: str, session_id: str) -> list:
     """Return all interactions for a given session."""
+    cached = session_cache.get((user_id, session_id))
+    if cached is not None:
+        return list(cached)
+    seen_write = _transcript_writes.get((user_id, session_id))
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-            .collection("interactions")
-            .order_by("timestamp", direction=firestore.Query.ASCENDING)
-        )
-        return [doc.to_dict() for doc in ref.stream()]
+        interactions = store.get_session_interactions(user_id, session_id)
+        _cache_transcript((user_id, session_id), interactions, seen_write)
+        return list(interactions)
     except Exception:
-        print(f"🔥 [Get Interactions Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Get Interactions Error]")
         return []
 
+def list_interactions_page(user_id: str, session_id: str, limit: int, start_after: str = None,
+                           fields=None, descending: bool = False):
+    """
+    One page of a session's interactions → (interactions, next_cursor).
+    Served from the transcript cache when it is warm. Raises ValueError
+    for a malformed cursor.
+    """
+    cached = session_cache.get((user_id, session_id))
+    if cached is not None:
+        page, cursor = paginate(
+            cached, lambda i: (i.get("timestamp"), i["interaction_id"]), limit, start_after, descending
+        )
+        return [project(i, fields) for i in page], cursor
+    try:
+        return store.list_interactions(user_id, session_id, limit, start_after, fields, descending)
+    except ValueError:
+        raise
+    except Exception:
+        logger.exception("🔥 [List Interactions Error]")
+        raise
+
+def get_interactions_version(user_id: str, session_id: str):
+    """Change token for a session transcript: id of its newest interaction."""
+    cached = session_cache.get((user_id, session_id))
+    if cached is not None:
+        return cached[-1]["interaction_id"] if cached else None
+    return store.interactions_version(user_id, session_id)
+
 # ==============================================================
 # 6️⃣ Session Details Retrieval
 # ==============================================================
@@ -184,49 +241,42 @@ def get_session_interactions(user_id: str, session_id: str) -> list:
 def get_all_sessions(user_id: str) -> list:
     """Fetch metadata for all sessions belonging to a user."""
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .order_by("last_updated", direction=firestore.Query.DESCENDING)
-        )
-        sessions = []
-        for doc in ref.stream():
-            d = doc.to_dict()
-            sessions.append({
-                "session_id": d.get("session_id", doc.id),
-                "title": d.get("title", "Untitled Session"),
-                "created_at": d.get("created_at"),
-                "last_updated": d.get("last_updated"),
-                "summary": d.get("summary"),
-                "emotional_trend": d.get("emotional_trend"),
-                "topics": d.get("topics", []),
-            })
-        return sessions
+        return store.get_all_sessions(user_id)
     except Exception:
-        print(f"🔥 [Get Sessions Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Get Sessions Error]")
         return []
 
+def list_sessions_page(user_id: str, limit: int, start_after: str = None, fields=None):
+    """
+    One page of a user's sessions, newest first → (sessions, next_cursor).
+    `fields` projects each session (e.g. session_id/title/last_updated for
+    the sidebar). Raises ValueError for a malformed cursor.
+    """
+    try:
+        return store.list_sessions(user_id, limit, start_after, fields)
+    except ValueError:
+        raise
+    except Exception:
+        logger.exception("🔥 [List Sessions Error]")
+        raise
+
+def get_sessions_version(user_id: str):
+    """Change token for a user's session list (one indexed read)."""
+    return store.sessions_version(user_id)
+
 def get_session_details(user_id: str, session_id: str) -> dict:
     """Get metadata + summary of a session."""
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-        )
-        doc = ref.get()
-        return doc.to_dict() if doc.exists else None
+        return store.get_session_details(user_id, session_id)
     except Exception:
-        print(f"🔥 [Get Session Details Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Get Session Details Error]")
         return None
 
 # ==============================================================
 # 7️⃣ Summarization Utilities (for Pipeline 3)
 # ==============================================================
 
-def save_session_summary(user_id: str, session_id: str, summary: dict) -> bool:
+def save_session_summary(user_id: str, session_id: str, summary: dict, summarized_through=None) -> bool:
     """
     Attach a Gemini summary to the session document.
     Expected summary structure:
@@ -236,71 +286,59 @@ def save_session_summary(user_id: str, session_id: str, summary: dict) -> bool:
         "topics": list[str],
         "confidence": float
       }
+    `summarized_through` is the timestamp of the last interaction the
+    summary covers; newer messages keep the session flagged for the sweeper.
     """
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-        )
-        data = {
-            "summary": summary.get("summary", ""),
-            "emotional_trend": summary.get("emotional_trend", "unclear"),
-            "topics": summary.get("topics", []),
-            "summary_confidence": float(summary.get("confidence", 0.8)),
-            "summary_generated_at": firestore.SERVER_TIMESTAMP,
-            "last_updated": firestore.SERVER_TIMESTAMP,
-        }
-        ref.update(data)
-        print(f"🧩 [Summary Stored] Session {session_id}")
+        store.save_session_summary(user_id, session_id, summary, summarized_through)
+        logger.debug("🧩 [Summary Stored] Session %s", session_id)
         return True
     except Exception:
-        print(f"🔥 [Save Summary Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Save Summary Error]")
         return False
 
+def save_context_summary(user_id: str, session_id: str, summary: str, covered_turns: int) -> bool:
+    """
+    Store the rolling in-session context summary.
+    `covered_turns` is how many interactions (from the start of the
+    session) the summary replaces in the GPT prompt.
+    """
+    try:
+        store.save_context_summary(user_id, session_id, summary, covered_turns)
+        logger.debug("🧩 [Context Summary Stored] Session %s (%s turns)", session_id, covered_turns)
+        return True
+    except Exception:
+        logger.exception("🔥 [Save Context Summary Error]")
+        return False
+
+def find_idle_sessions(idle_before, limit: int = 50, start_after: str = None):
+    """
+    One page of (user_id, session_id) pairs idle since before `idle_before`
+    that still need a summary, oldest first → (pairs, next_cursor).
+    """
+    try:
+        return store.find_idle_sessions(idle_before, limit, start_after)
+    except Exception:
+        logger.exception("🔥 [Find Idle Sessions Error]")
+        return [], None
+
 def get_user_recent_summaries(user_id: str, limit: int = 3) -> list:
     """Fetch the latest session summaries for contextual memory."""
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .order_by("summary_generated_at", direction=firestore.Query.DESCENDING)
-            .limit(limit)
-        )
-        summaries = []
-        for doc in ref.stream():
-            data = doc.to_dict()
-            if data.get("summary"):
-                summaries.append({
-                    "summary": data.get("summary"),
-                    "emotional_trend": data.get("emotional_trend", "unknown"),
-                    "topics": data.get("topics", []),
-                    "confidence": float(data.get("summary_confidence", 0.8)),
-                })
-        return summaries
+        return store.get_user_recent_summaries(user_id, limit)
     except Exception:
-        print(f"🔥 [Get Recent Summaries Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Get Recent Summaries Error]")
         return []
 
 def get_last_message_time(user_id: str, session_id: str):
     """Return timestamp of the most recent message in session."""
+    cached = session_cache.get((user_id, session_id))
+    if cached is not None:
+        return cached[-1].get("timestamp") if cached else None
     try:
-        ref = (
-            db.collection("conversations")
-            .document(user_id)
-            .collection("sessions")
-            .document(session_id)
-            .collection("interactions")
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .limit(1)
-        )
-        for doc in ref.stream():
-            return doc.to_dict().get("timestamp")
-        return None
+        return store.get_last_message_time(user_id, session_id)
     except Exception:
-        print(f"🔥 [Get Last Message Time Error]: {traceback.format_exc()}")
+        logger.exception("🔥 [Get Last Message Time Error]")
         return None
 
 # ==============================================================
@@ -309,14 +347,26 @@ def get_last_message_time(user_id: str, session_id: str):
 
 __all__ = [
     "ensure_user_exists",
+    "user_exists",
+    "touch_users_last_active",
     "create_new_session",
     "update_session_title",
     "save_interaction_to_session",
     "get_session_interactions",
     "get_all_sessions",
+    "list_sessions_page",
+    "get_sessions_version",
+    "list_interactions_page",
+    "get_interactions_version",
+    "SESSION_FIELDS",
+    "INTERACTION_FIELDS",
     "get_session_details",
     "save_session_summary",
+    "save_context_summary",
+    "find_idle_sessions",
     "get_user_recent_summaries",
     "get_last_message_time",
+    "session_cache",
+    "store",
     "db",
 ]
@@ -0,0 +1,385 @@
+# ===========================================================
+# backend/firestore_writer.py — Batched, write-behind persistence
+# ===========================================================
+# Groups Firestore mutations into WriteBatch commits.
+#
+#   • write-through (default): each call's mutations go out as a
+#     single WriteBatch commit — one round trip instead of several
+#   • write-behind (optional): mutations are appended to a durable
+#     local journal, acknowledged immediately, and flushed in
+#     batches when the buffer reaches a size or age threshold.
+#     Each process journals to its own file (pid + per-boot nonce)
+#     and holds an flock on it while alive, so journals left by a
+#     crashed process are recognized and replayed on startup even
+#     when a new process has reused its pid.
+#   • a flush that fails with a non-transient error is bisected down
+#     to the offending ops, which are dead-lettered to a side file
+#     so one bad write cannot stall everyone else's.
+#
+# A mutation is an op tuple: (kind, path, data) where kind is
+# "set", "merge" (set with merge=True) or "update" and path is the
+# document path as a tuple of alternating collection / document ids.
+# ===========================================================
+
+import os
+import glob
+import uuid
+import fcntl
+import atexit
+import json
+import time
+import threading
+from datetime import datetime
+
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+FIRESTORE_BATCH_LIMIT = 500
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+# Worth retrying the whole buffer; anything else is blamed on the ops themselves
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.Aborted,
+)
+
+
+# ===========================================================
+# Op Encoding (for the journal)
+# ===========================================================
+
+def _encode(value):
+    if value is firestore.SERVER_TIMESTAMP:
+        return {"$server_timestamp": True}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if value.get("$server_timestamp") is True and len(value) == 1:
+            return firestore.SERVER_TIMESTAMP
+        if "$datetime" in value and len(value) == 1:
+            return datetime.fromisoformat(value["$datetime"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _encode_op(op):
+    kind, path, data = op
+    return json.dumps([kind, list(path), _encode(data)]) + "\n"
+
+
+def _read_ops(f):
+    ops = []
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            kind, doc_path, data = json.loads(line)
+        except ValueError:
+            break  # torn final line from the crash
+        ops.append((kind, tuple(doc_path), _decode(data)))
+    return ops
+
+
+def _try_lock(f) -> bool:
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+# ===========================================================
+# Writer
+# ===========================================================
+
+class FirestoreWriter:
+    """Commits mutation groups as Firestore WriteBatches, optionally write-behind."""
+
+    def __init__(self, db, write_behind=False, max_ops=100, max_delay_ms=200.0, journal_dir=None):
+        self.db = db
+        self.write_behind = write_behind
+        self.max_ops = max_ops
+        self.max_delay = max_delay_ms / 1000.0
+        self.journal_dir = journal_dir
+
+        self._buffer = []          # ops awaiting flush
+        self._oldest = None        # monotonic time the oldest buffered op arrived
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self._journal = None       # this process's journal, flock'ed while open
+        self._journal_path = None
+
+        # Metrics
+        self.commits = 0
+        self.ops_committed = 0
+        self.max_batch_ops = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self.errors = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+
+        if self.write_behind:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self.replay_orphaned_journals()
+            atexit.register(self.flush)
+
+    # -------------------------------------------------------
+    # Commit
+    # -------------------------------------------------------
+
+    def _doc(self, path):
+        ref = self.db
+        for i, segment in enumerate(path):
+            ref = ref.collection(segment) if i % 2 == 0 else ref.document(segment)
+        return ref
+
+    def commit_ops(self, ops):
+        """Commit ops in as few WriteBatches as Firestore allows."""
+        for start in range(0, len(ops), FIRESTORE_BATCH_LIMIT):
+            chunk = ops[start:start + FIRESTORE_BATCH_LIMIT]
+            batch = self.db.batch()
+            for kind, path, data in chunk:
+                if kind == "set":
+                    batch.set(self._doc(path), data)
+                elif kind == "merge":
+                    batch.set(self._doc(path), data, merge=True)
+                elif kind == "update":
+                    batch.update(self._doc(path), data)
+                else:
+                    raise ValueError(f"Unknown write op '{kind}'")
+            started = time.monotonic()
+            batch.commit()
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.commits += 1
+                self.ops_committed += len(chunk)
+                self.max_batch_ops = max(self.max_batch_ops, len(chunk))
+                self.commit_seconds += elapsed
+                self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+
+    def write(self, ops):
+        """Persist a group of ops: journaled + buffered in write-behind mode, else committed now."""
+        if not self.write_behind:
+            self.commit_ops(ops)
+            return
+        self._ensure_flusher()
+        with self._lock:
+            self._append_journal(ops)
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(ops)
+            if len(self._buffer) >= self.max_ops:
+                self._wakeup.notify()
+
+    # -------------------------------------------------------
+    # Journal (caller holds self._lock)
+    # -------------------------------------------------------
+
+    def _open_journal(self):
+        # pid alone is not unique across restarts: a new worker often gets a crashed one's pid
+        self._journal_path = os.path.join(self.journal_dir, f"writes-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+        fcntl.flock(self._journal, fcntl.LOCK_EX)  # held until this process exits
+
+    def _append_journal(self, ops):
+        if self._journal is None:
+            self._open_journal()
+        for op in ops:
+            self._journal.write(_encode_op(op))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self):
+        """Replace the journal with only the still-buffered ops."""
+        if self._journal is None:
+            return
+        path = self._journal_path
+        tmp = path + ".tmp"
+        f = open(tmp, "w", encoding="utf-8")
+        for op in self._buffer:
+            f.write(_encode_op(op))
+        f.flush()
+        os.fsync(f.fileno())
+        fcntl.flock(f, fcntl.LOCK_EX)  # locked before it takes the journal's name
+        os.replace(tmp, path)
+        self._journal.close()
+        self._journal = f
+
+    def _dead_letter(self, op, error):
+        with self._lock:
+            self.dead_lettered += 1
+        logger.error("🔥 [Writer] Dropping %s on %s: %s", op[0], "/".join(op[1]), error)
+        if not self.journal_dir:
+            return
+        try:
+            with open(os.path.join(self.journal_dir, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"error": str(error), "op": json.loads(_encode_op(op))}) + "\n")
+        except OSError:
+            logger.exception("🔥 [Writer] Could not record dead-lettered op")
+
+    def replay_orphaned_journals(self):
+        """Commit ops left in journals whose process is no longer running."""
+        for path in glob.glob(os.path.join(self.journal_dir, "writes-*.jsonl")):
+            if path == self._journal_path:
+                continue
+            try:
+                f = open(path, encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with f:
+                # A live owner holds the lock; its release means the owner died
+                if not _try_lock(f):
+                    continue
+                try:
+                    if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                        continue  # replayed and removed (or rewritten) by another process meanwhile
+                except FileNotFoundError:
+                    continue
+                try:
+                    ops = _read_ops(f)
+                    done = self._commit_isolating(ops)
+                    with self._lock:
+                        self.replayed += done
+                    if done < len(ops):
+                        # Firestore unreachable: keep the rest for the next start
+                        tmp = path + ".tmp"
+                        with open(tmp, "w", encoding="utf-8") as rest:
+                            rest.writelines(_encode_op(op) for op in ops[done:])
+                            rest.flush()
+                            os.fsync(rest.fileno())
+                        os.replace(tmp, path)
+                        logger.warning("⚠️ [Writer] Replayed %s of %s journaled writes from %s",
+                                       done, len(ops), os.path.basename(path))
+                        continue
+                    os.remove(path)
+                    if ops:
+                        logger.info("♻️ [Writer] Replayed %s journaled writes from %s", len(ops), os.path.basename(path))
+                except Exception:
+                    logger.exception("🔥 [Writer] Journal replay failed for %s", path)
+
+    # -------------------------------------------------------
+    # Flushing
+    # -------------------------------------------------------
+
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # Forked child: the parent's buffer and journal belong to the parent
+                if self._journal is not None:
+                    self._journal.close()  # the parent's own descriptor keeps its lock
+                self._buffer, self._oldest, self._journal, self._journal_path = [], None, None, None
+                self._wakeup = threading.Condition(self._lock)
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+            self._thread.start()
+
+    def _commit_isolating(self, ops):
+        """
+        Commit ops in order, one WriteBatch per chunk. A chunk that fails
+        with a non-transient error is bisected until the offending ops are
+        found and dead-lettered. Stops at the first transient error.
+        Returns how many leading ops were committed or dead-lettered.
+        """
+        chunks = [ops[i:i + FIRESTORE_BATCH_LIMIT] for i in range(0, len(ops), FIRESTORE_BATCH_LIMIT)]
+        chunks.reverse()
+        done = 0
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                self.commit_ops(chunk)
+            except TRANSIENT_ERRORS:
+                with self._lock:
+                    self.errors += 1
+                logger.warning("⚠️ [Writer] Commit of %s ops failed transiently, will retry", len(chunk), exc_info=True)
+                break
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                if len(chunk) > 1:
+                    mid = len(chunk) // 2
+                    chunks.extend([chunk[mid:], chunk[:mid]])
+                    continue
+                self._dead_letter(chunk[0], e)
+            done += len(chunk)
+        return done
+
+    def flush(self):
+        """Commit everything currently buffered. Returns the number of ops consumed."""
+        with self._flush_lock:
+            with self._lock:
+                ops = list(self._buffer)
+            if not ops:
+                return 0
+            done = self._commit_isolating(ops)
+            if done:
+                with self._lock:
+                    del self._buffer[:done]
+                    self._oldest = time.monotonic() if self._buffer else None
+                    self._rewrite_journal()
+            return done
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while True:
+                    if len(self._buffer) >= self.max_ops:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._wakeup.wait(timeout=remaining)
+                    else:
+                        self._wakeup.wait(timeout=1.0)
+            if self.flush() == 0 and self._buffer:
+                time.sleep(min(max(self.max_delay, 0.05), 1.0))  # back off after a failed flush
+
+    # -------------------------------------------------------
+    # Observability
+    # -------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            commits = self.commits
+            return {
+                "write_behind": self.write_behind,
+                "pending_ops": len(self._buffer),
+                "commits": commits,
+                "ops_committed": self.ops_committed,
+                "avg_batch_ops": (self.ops_committed / commits) if commits else 0.0,
+                "max_batch_ops": self.max_batch_ops,
+                "avg_commit_ms": (self.commit_seconds / commits * 1000.0) if commits else 0.0,
+                "max_commit_ms": self.max_commit_seconds * 1000.0,
+                "errors": self.errors,
+                "dead_lettered": self.dead_lettered,
+                "replayed": self.replayed,
+            }
@@ -0,0 +1,29 @@
+# backend/gunicorn.conf.py
+# Usage: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# With MODEL_LOAD_MODE=preload the app (and its model weights) is imported
+# once in the master; workers inherit the pages copy-on-write after fork.
+preload_app = os.getenv("MODEL_LOAD_MODE", "lazy").strip().lower() == "preload"
+
+
+def on_starting(server):
+    # /metrics sums every worker's totals from a shared file; start this run from zero
+    from metrics import registry
+    registry.clear_shared()
+
+
+def post_fork(server, worker):
+    # The master only loaded weights; each worker runs its own dummy
+    # inference so torch thread pools are created after the fork, and
+    # starts its own background job workers, idle-session sweeper and
+    # metrics flusher.
+    if preload_app:
+        from ai_core import models, start_background_workers
+        models.start_background_warmup()
+        start_background_workers()
@@ -0,0 +1,309 @@
+# ===========================================================
+# backend/job_queue.py — Persistent background job queue
+# ===========================================================
+# SQLite-backed queue with an in-process worker pool. Used for
+# post-response work (session titles, summaries) so HTTP
+# responses don't wait on Gemini round trips.
+#
+#   • dedupe_key  → at most one pending job per key; re-enqueueing
+#                   refreshes its payload instead of adding another
+#   • retries     → exponential backoff with jitter, then "failed"
+#   • leases      → jobs held by a crashed process are re-queued,
+#                   unless a job with the same key is already pending
+# ===========================================================
+
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+import traceback
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    type        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    dedupe_key  TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    run_after   REAL NOT NULL,
+    lease_until REAL,
+    created_at  REAL NOT NULL,
+    finished_at REAL,
+    last_error  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_after);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending_key ON jobs (dedupe_key) WHERE status = 'pending';
+"""
+
+
+class JobQueue:
+    """Durable job queue with a worker pool, per-key dedupe and retries."""
+
+    def __init__(self, db_path, workers=2, max_attempts=3, backoff_seconds=2.0,
+                 lease_seconds=300.0, poll_seconds=1.0, retention_seconds=86400.0, name="jobs"):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.name = name
+
+        self._handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._last_cleanup = 0.0
+
+        # Metrics (per process)
+        self._counts = {"enqueued": 0, "deduplicated": 0, "succeeded": 0, "retried": 0, "failed": 0}
+        self._latency = {}  # type → [count, total queue→done seconds, total run seconds, max queue→done]
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    # -------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # -------------------------------------------------------
+    # Producer API
+    # -------------------------------------------------------
+
+    def register(self, job_type, handler):
+        """Register handler(payload: dict) for a job type."""
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type, payload, dedupe_key=None, delay_seconds=0.0):
+        """Persist a job and wake a worker. Returns the job id."""
+        now = time.time()
+        data = json.dumps(payload, default=str)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = None
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status = 'pending'", (dedupe_key,)
+                ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET payload = ? WHERE id = ?", (data, row["id"]))
+                job_id = row["id"]
+                counter = "deduplicated"
+            else:
+                cur = conn.execute(
+                    "INSERT INTO jobs (type, payload, dedupe_key, run_after, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_type, data, dedupe_key, now + delay_seconds, now),
+                )
+                job_id = cur.lastrowid
+                counter = "enqueued"
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._counts[counter] += 1
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    # -------------------------------------------------------
+    # Workers
+    # -------------------------------------------------------
+
+    def start(self):
+        """Start the worker pool in this process (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._pid == pid and all(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            if self._pid == pid and all(t.is_alive() for t in self._threads):
+                return
+            if self._pid != pid:
+                self._wakeup = threading.Condition()
+                self._threads = []
+            self._pid = pid
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _claim(self):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-queue jobs whose worker died mid-run. OR IGNORE skips any
+            # whose dedupe key already has a pending job; that job supersedes them.
+            conn.execute(
+                "UPDATE OR IGNORE jobs SET status = 'pending', lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ?",
+                (now,),
+            )
+            superseded = conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, "
+                "last_error = 'Lease expired; superseded by a pending job with the same dedupe key' "
+                "WHERE status = 'running' AND lease_until < ?",
+                (now, now),
+            ).rowcount
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' AND run_after <= ? ORDER BY run_after, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (now + self.lease_seconds, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if superseded:
+            logger.warning("⚠️ [%s] %s expired job(s) superseded by pending duplicates", self.name, superseded)
+            with self._lock:
+                self._counts["failed"] += superseded
+        return row
+
+    def _finish(self, job, error=None):
+        now = time.time()
+        attempts = job["attempts"] + 1
+        conn = self._conn()
+        if error is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, lease_until = NULL, last_error = NULL WHERE id = ?",
+                (now, job["id"]),
+            )
+            return "succeeded"
+        if attempts < self.max_attempts:
+            delay = self.backoff_seconds * (2 ** (attempts - 1)) * (0.5 + random.random())
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', run_after = ?, lease_until = NULL, last_error = ? WHERE id = ?",
+                    (now + delay, error, job["id"]),
+                )
+                return "retried"
+            except sqlite3.IntegrityError:
+                # A newer job with the same dedupe key is already pending — it supersedes this one
+                pass
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, last_error = ? WHERE id = ?",
+            (now, error, job["id"]),
+        )
+        return "failed"
+
+    def _cleanup(self):
+        now = time.time()
+        if now - self._last_cleanup < 3600:
+            return
+        self._last_cleanup = now
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (now - self.retention_seconds,),
+        )
+
+    def _run(self):
+        while True:
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("🔥 [%s] Claim failed", self.name)
+                ran = False
+            if not ran:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.poll_seconds)
+                try:
+                    self._cleanup()
+                except Exception:
+                    pass
+
+    def run_once(self) -> bool:
+        """Claim and run one ready job in the calling thread. Returns False if none was ready."""
+        job = self._claim()
+        if job is None:
+            return False
+        self._execute(job)
+        return True
+
+    def _execute(self, job):
+        started = time.time()
+        handler = self._handlers.get(job["type"])
+        error = None
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job type '{job['type']}'")
+            handler(json.loads(job["payload"]))
+        except Exception:
+            error = traceback.format_exc()
+            logger.error("🔥 [%s] Job %s (%s) failed: %s", self.name, job['id'], job['type'], error)
+        finished = time.time()
+
+        try:
+            outcome = self._finish(job, error)
+        except Exception:
+            logger.exception("🔥 [%s] Could not record job %s result", self.name, job['id'])
+            return
+        with self._lock:
+            self._counts[outcome] += 1
+            if outcome == "succeeded":
+                latency = self._latency.setdefault(job["type"], [0, 0.0, 0.0, 0.0])
+                latency[0] += 1
+                latency[1] += finished - job["created_at"]
+                latency[2] += finished - started
+                latency[3] = max(latency[3], finished - job["created_at"])
+
+    # -------------------------------------------------------
+    # Observability
+    # -------------------------------------------------------
+
+    def depth(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            latency = {
+                job_type: {
+                    "completed": count,
+                    "avg_total_ms": total / count * 1000.0,
+                    "avg_run_ms": run / count * 1000.0,
+                    "max_total_ms": worst * 1000.0,
+                }
+                for job_type, (count, total, run, worst) in self._latency.items()
+            }
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "depth": self.depth(),
+            "counts": counts,
+            "latency": latency,
+        }
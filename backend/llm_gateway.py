@@ -0,0 +1,394 @@
+# ===========================================================
+# backend/llm_gateway.py — Shared resilience layer for LLM calls
+# ===========================================================
+# Every OpenAI and Gemini call goes through one gateway that gives
+# each provider:
+#   • a concurrency limit    → at most N calls in flight; callers
+#                              queue for a slot up to their deadline
+#   • a deadline             → one time budget per logical call,
+#                              shared by queueing, attempts and
+#                              backoff; each attempt gets what is left
+#   • retries                → transient errors only, exponential
+#                              backoff with full jitter
+#   • hedging (optional)     → if an attempt is slower than the
+#                              provider's recent p<N> latency, a
+#                              duplicate is sent and the first reply
+#                              wins
+#   • a circuit breaker      → after consecutive failures the provider
+#                              is skipped for a cool-down, then a
+#                              single probe decides whether it is back
+#
+# call_with_failover() routes to a fallback (gpt-4o-mini → Gemini)
+# while the primary is failing or its breaker is open; traffic
+# returns on its own once a probe succeeds.
+# ===========================================================
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from log_utils import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_MS = float(os.getenv("LLM_BACKOFF_BASE_MS", "250"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))  # e.g. 95; 0 disables hedging
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "1") == "1"
+
+LLM_CALLS = registry.counter("llm_calls_total", "Logical LLM calls by provider and outcome")
+LLM_RETRIES = registry.counter("llm_retries_total", "LLM attempts retried after a transient error")
+LLM_HEDGES = registry.counter("llm_hedges_total", "Hedged duplicate requests by provider and winner")
+LLM_QUEUE_WAIT = registry.histogram("llm_queue_wait_seconds", "Time spent waiting for a provider slot")
+LLM_QUEUE_REJECTED = registry.counter("llm_queue_rejected_total", "Calls whose deadline expired while queued")
+LLM_FAILOVERS = registry.counter("llm_failovers_total", "Calls served by a fallback provider")
+LLM_BREAKER_TRANSITIONS = registry.counter("llm_breaker_transitions_total", "Circuit breaker state changes")
+
+
+class LLMUnavailable(RuntimeError):
+    """A provider could not serve a call; `reason` says why (breaker/queue/deadline/error)."""
+
+    def __init__(self, provider, reason, message=""):
+        super().__init__(f"{provider} unavailable ({reason}){': ' + message if message else ''}")
+        self.provider = provider
+        self.reason = reason
+
+
+class Deadline:
+    """Absolute time budget for one logical call."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+
+class CircuitBreaker:
+    """closed → open after `failures` consecutive errors → half-open after `reset_seconds`."""
+
+    def __init__(self, name, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state != self.state:
+            self.state = state
+            LLM_BREAKER_TRANSITIONS.inc(provider=self.name, state=state)
+            logger.warning("⚠️ [LLM] %s circuit %s", self.name, state)
+
+    def allow(self) -> bool:
+        """True if a call may go out now (in half-open, only one probe at a time)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self._transition("half_open")
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probing = False
+            self._transition("closed")
+
+    def abandon(self):
+        """The allowed call never reached the provider (e.g. no slot); free the probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+
+class Provider:
+    """Limits, retry policy and latency history for one upstream API."""
+
+    def __init__(self, name, max_concurrency=8, timeout=30.0, retry_on=(TimeoutError, ConnectionError),
+                 max_attempts=LLM_MAX_ATTEMPTS, backoff_base=LLM_BACKOFF_BASE_MS / 1000.0,
+                 hedge_percentile=LLM_HEDGE_PERCENTILE, hedge_min_samples=LLM_HEDGE_MIN_SAMPLES):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retry_on = tuple(retry_on)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(name)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self.in_flight = 0
+        self.queued = 0
+
+    def acquire(self, deadline):
+        """Wait for a concurrency slot until the deadline; raises LLMUnavailable."""
+        if self._slots.acquire(blocking=False):
+            LLM_QUEUE_WAIT.observe(0.0, provider=self.name)
+        else:
+            started = time.monotonic()
+            with self._lock:
+                self.queued += 1
+            try:
+                acquired = self._slots.acquire(timeout=deadline.remaining())
+            finally:
+                with self._lock:
+                    self.queued -= 1
+            LLM_QUEUE_WAIT.observe(time.monotonic() - started, provider=self.name)
+            if not acquired:
+                LLM_QUEUE_REJECTED.inc(provider=self.name)
+                raise LLMUnavailable(self.name, "queue", f"no slot within {deadline.seconds:.0f}s")
+        with self._lock:
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self, *_):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """Seconds after which a hedge is sent, or None while hedging is off or untrained."""
+        if not self.hedge_percentile:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        rank = min(int(len(ordered) * self.hedge_percentile / 100.0), len(ordered) - 1)
+        return ordered[rank]
+
+    def backoff(self, attempt) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt]
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def stats(self) -> dict:
+        hedge_after = self.hedge_delay()
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "timeout_seconds": self.timeout,
+                "circuit": self.breaker.state,
+                "hedge_after_seconds": hedge_after,
+            }
+
+
+class LLMGateway:
+    """Registry of providers plus the call/stream/failover entry points."""
+
+    def __init__(self, hedge_workers=8, name="llm-gateway"):
+        self.providers = {}
+        self.hedge_workers = hedge_workers
+        self.name = name
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, provider):
+        self.providers[provider.name] = provider
+        return provider
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix=self.name)
+                    self._pid = pid
+        return self._executor
+
+    # -------------------------------------------------------
+    # Attempts
+    # -------------------------------------------------------
+
+    def _retrying(self, provider, deadline, attempt_fn):
+        """Run attempt_fn() under the breaker with jittered retries until the deadline."""
+        for attempt in range(provider.max_attempts):
+            if not provider.breaker.allow():
+                raise LLMUnavailable(provider.name, "breaker")
+            try:
+                result = attempt_fn()
+            except LLMUnavailable:
+                provider.breaker.abandon()
+                raise
+            except provider.retry_on as exc:
+                provider.breaker.record_failure()
+                delay = provider.backoff(attempt)
+                if attempt + 1 >= provider.max_attempts or delay >= deadline.remaining():
+                    reason = "deadline" if deadline.remaining() <= delay else "error"
+                    raise LLMUnavailable(provider.name, reason, str(exc)) from exc
+                LLM_RETRIES.inc(provider=provider.name)
+                logger.warning("⚠️ [LLM] %s attempt %s failed (%s) — retrying in %.2fs",
+                               provider.name, attempt + 1, type(exc).__name__, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Not transient (bad request, auth, ...): the provider answered, so
+                # no retry and the breaker is not charged
+                provider.breaker.record_success()
+                raise
+            provider.breaker.record_success()
+            return result
+        raise LLMUnavailable(provider.name, "error")
+
+    def _attempt(self, provider, fn, deadline, hedge):
+        """One attempt (plus an optional hedge), each holding its own slot."""
+        provider.acquire(deadline)
+        delay = provider.hedge_delay() if hedge else None
+        started = time.monotonic()
+        if delay is None or delay >= deadline.remaining():
+            try:
+                result = fn(deadline.remaining())
+            finally:
+                provider.release()
+            provider.record_latency(time.monotonic() - started)
+            return result
+
+        pool = self._pool()
+        primary = pool.submit(fn, deadline.remaining())
+        primary.add_done_callback(provider.release)
+        done, _ = wait([primary], timeout=delay)
+        if done or not provider.try_acquire():
+            result = primary.result()
+            provider.record_latency(time.monotonic() - started)
+            return result
+
+        backup = pool.submit(fn, deadline.remaining())
+        backup.add_done_callback(provider.release)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    LLM_HEDGES.inc(provider=provider.name, winner="hedge" if future is backup else "primary")
+                    provider.record_latency(time.monotonic() - started)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    # -------------------------------------------------------
+    # Entry points
+    # -------------------------------------------------------
+
+    def call(self, name, fn, timeout=None, hedge=False):
+        """
+        fn(timeout_seconds) performs one request and returns its result.
+        Raises LLMUnavailable if the provider cannot serve the call in
+        time; non-transient errors from fn propagate unchanged.
+        """
+        provider = self.providers[name]
+        deadline = Deadline(timeout or provider.timeout)
+        try:
+            result = self._retrying(provider, deadline, lambda: self._attempt(provider, fn, deadline, hedge))
+        except LLMUnavailable as exc:
+            LLM_CALLS.inc(provider=name, outcome=exc.reason)
+            raise
+        except Exception:
+            LLM_CALLS.inc(provider=name, outcome="error")
+            raise
+        LLM_CALLS.inc(provider=name, outcome="ok")
+        return result
+
+    def stream(self, name, fn, timeout=None):
+        """
+        Generator over a streamed response. fn(timeout_seconds) opens the
+        stream; only opening it is retried, and the slot is held until
+        the stream is exhausted or closed.
+        """
+        provider = self.providers[name]
+        deadline = Deadline(timeout or provider.timeout)
+        try:
+            provider.acquire(deadline)
+        except LLMUnavailable:
+            LLM_CALLS.inc(provider=name, outcome="queue")
+            raise
+        try:
+            try:
+                chunks = self._retrying(provider, deadline, lambda: fn(deadline.remaining()))
+            except LLMUnavailable as exc:
+                LLM_CALLS.inc(provider=name, outcome=exc.reason)
+                raise
+            try:
+                yield from chunks
+            except provider.retry_on:
+                provider.breaker.record_failure()
+                LLM_CALLS.inc(provider=name, outcome="error")
+                raise
+            LLM_CALLS.inc(provider=name, outcome="ok")
+        finally:
+            provider.release()
+
+    def call_with_failover(self, name, fn, fallback_name, fallback, **kwargs):
+        """call(name, fn) or, if that provider fails, fallback() (counted as a failover)."""
+        try:
+            return self.call(name, fn, **kwargs)
+        except Exception as exc:
+            if not LLM_FAILOVER:
+                raise
+            self.record_failover(name, fallback_name, exc)
+            return fallback()
+
+    def record_failover(self, name, fallback_name, exc):
+        reason = exc.reason if isinstance(exc, LLMUnavailable) else "error"
+        LLM_FAILOVERS.inc(provider=name, fallback=fallback_name, reason=reason)
+        logger.warning("⚠️ [LLM] %s failed (%s) — failing over to %s", name, reason, fallback_name)
+
+    def stats(self) -> dict:
+        return {name: provider.stats() for name, provider in self.providers.items()}
+
+
+gateway = LLMGateway()
+
+registry.register_gauge(
+    "llm_in_flight",
+    lambda: [({"provider": name}, p.in_flight) for name, p in gateway.providers.items()],
+    "LLM requests in flight per provider",
+)
+registry.register_gauge(
+    "llm_queued",
+    lambda: [({"provider": name}, p.queued) for name, p in gateway.providers.items()],
+    "Callers waiting for an LLM slot per provider",
+)
+registry.register_gauge(
+    "llm_circuit_open",
+    lambda: [({"provider": name}, int(p.breaker.state != "closed")) for name, p in gateway.providers.items()],
+    "1 while a provider's circuit breaker is open or half-open",
+)
@@ -0,0 +1,101 @@
+# ===========================================================
+# backend/log_utils.py — Leveled, structured, sampled logging
+# ===========================================================
+# Every module logs through get_logger(__name__). Output is
+# configured once from the environment:
+#   LOG_LEVEL        DEBUG | INFO | WARNING | ERROR   (default INFO)
+#   LOG_FORMAT       text | json                     (default text)
+#   LOG_SAMPLE_RATE  0.0–1.0 fraction of DEBUG/INFO records kept;
+#                    warnings and errors are never sampled out
+#
+# Messages use %-style arguments so records below the active
+# level (or sampled out) cost a level check, not a format.
+# ===========================================================
+
+import os
+import sys
+import json
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+ROOT_LOGGER = "mindmate"
+
+# Attributes every LogRecord has; anything else came in via `extra=` and
+# is emitted as a structured field
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_configured = False
+_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, pid, extra fields, exc."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with any extra fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(name)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE):
+    """Install the handler on the project's root logger (idempotent)."""
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        if sample_rate < 1.0:
+            handler.addFilter(SamplingFilter(sample_rate))
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, level, logging.INFO))
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the project root, e.g. get_logger(__name__) → mindmate.ai_core."""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
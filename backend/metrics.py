@@ -0,0 +1,434 @@
+# ===========================================================
+# backend/metrics.py — Timing spans, counters, Prometheus text
+# ===========================================================
+# A small in-process metrics registry:
+#   span("openai.chat")      context manager / decorator that
+#                            records latency into a histogram and
+#                            counts failures
+#   counter(...).inc()       monotonically increasing totals
+#   register_gauge(fn)       values sampled at scrape time (queue
+#                            depths, cache hit rates, ...)
+#   render_prometheus()      text exposition format for /metrics
+#
+# Series are recorded in process. Under gunicorn every worker
+# periodically writes its totals to a shared SQLite file
+# (METRICS_DB), and whichever worker serves /metrics sums
+# counters and histograms across all of them. Gauges are
+# sampled per worker and keep a `pid` label. With METRICS_DB
+# set to an empty string each worker exposes only its own
+# series, all with a `pid` label.
+# ===========================================================
+
+import os
+import json
+import atexit
+import time
+import uuid
+import bisect
+import sqlite3
+import threading
+import functools
+
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_PREFIX = "mindmate"
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_DB = os.getenv("METRICS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.db"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def render(self, base_labels, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        values = self.snapshot() if values is None else values
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(base_labels + key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key → [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    @staticmethod
+    def merge(total, series):
+        if total is None:
+            return list(series)
+        if len(total) != len(series):
+            return total  # bucket layout changed between deploys; keep the first
+        return [a + b for a, b in zip(total, series)]
+
+    def render(self, base_labels, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        values = self.snapshot() if values is None else values
+        for key, series in sorted(values.items()):
+            labels = base_labels + key
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    process    TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    labels     TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (process, name, labels)
+);
+"""
+
+
+class SharedSamples:
+    """
+    Per-process series totals in one SQLite file. Each process replaces
+    its own rows; readers sum counters and histograms across processes.
+    Rows are keyed by a per-process token, not the pid, so a recycled pid
+    never overwrites (and shrinks) a dead worker's totals.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(_SHARED_SCHEMA)
+
+    def _conn(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def write(self, process, rows, gauge_ttl):
+        """Replace this process's rows with [(name, kind, label_key, value), ...]."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Gauges of workers that stopped flushing are dropped; their totals are kept
+            conn.execute("DELETE FROM samples WHERE kind = 'gauge' AND (process = ? OR updated_at < ?)",
+                         (process, now - gauge_ttl))
+            conn.executemany(
+                "INSERT OR REPLACE INTO samples (process, name, labels, kind, value, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(process, name, json.dumps(key), kind, json.dumps(value), now) for name, kind, key, value in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._conn().execute("DELETE FROM samples")
+
+    def read(self):
+        """All stored rows as [(process, name, kind, label_key, value), ...]."""
+        rows = self._conn().execute("SELECT process, name, kind, labels, value FROM samples").fetchall()
+        return [
+            (row["process"], row["name"], row["kind"], tuple(tuple(pair) for pair in json.loads(row["labels"])),
+             json.loads(row["value"]))
+            for row in rows
+        ]
+
+
+class Registry:
+    def __init__(self, db_path=None, flush_seconds=METRICS_FLUSH_SECONDS):
+        self._metrics = {}
+        self._gauges = []
+        self._lock = threading.Lock()
+        self.flush_seconds = flush_seconds
+        self._shared = None
+        if db_path:
+            try:
+                self._shared = SharedSamples(db_path)
+            except Exception:
+                logger.warning("⚠️ Shared metrics disabled; %s is not usable", db_path, exc_info=True)
+        self._process = None
+        self._pid = None
+        self._flusher = None
+        self._exit_hook = False
+        self._reset_process()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset_process(self):
+        self._pid = os.getpid()
+        self._process = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+        self._flusher = None
+
+    def _after_fork(self):
+        # A forked worker starts from zero; the parent's totals stay the parent's
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            if isinstance(metric, Counter):
+                metric._values = {}
+            else:
+                metric._series = {}
+        self._reset_process()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        full_name = f"{METRICS_PREFIX}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def register_gauge(self, name, fn, help_text=""):
+        """fn() returns a number, or a list of (labels_dict, number) pairs."""
+        with self._lock:
+            self._gauges.append((f"{METRICS_PREFIX}_{name}", fn, help_text))
+
+    # -------------------------------------------------------
+    # Cross-process aggregation
+    # -------------------------------------------------------
+
+    def start(self):
+        """Start this process's background flusher (idempotent, fork-aware)."""
+        if self._shared is None or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+        if not self._exit_hook:
+            self._exit_hook = True
+            atexit.register(self._flush_quietly)
+
+    def clear_shared(self):
+        """Drop every process's stored totals (the server is starting fresh)."""
+        if self._shared is not None:
+            self._shared.clear()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.warning("⚠️ Metrics flush failed", exc_info=True)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self._flush_quietly()
+
+    def flush(self):
+        """Write this process's current totals and gauge samples to the shared file."""
+        if self._shared is None:
+            return
+        base = (("pid", str(os.getpid())),)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        rows = []
+        for metric in metrics:
+            for key, value in metric.snapshot().items():
+                rows.append((metric.name, metric.kind, key, value))
+        for name, _, samples in self._sample_gauges():
+            for key, value in samples:
+                rows.append((name, "gauge", base + key, value))
+        self._shared.write(self._process, rows, gauge_ttl=3 * self.flush_seconds)
+
+    def _sample_gauges(self):
+        with self._lock:
+            gauges = list(self._gauges)
+        sampled = []
+        for name, fn, help_text in gauges:
+            try:
+                value = fn()
+            except Exception:
+                logger.warning("Gauge %s failed", name, exc_info=True)
+                continue
+            samples = value if isinstance(value, list) else [({}, value)]
+            sampled.append((name, help_text, [
+                (_label_key(labels), float(sample)) for labels, sample in samples if sample is not None
+            ]))
+        return sampled
+
+    # -------------------------------------------------------
+    # Exposition
+    # -------------------------------------------------------
+
+    def render(self) -> str:
+        if self._shared is not None:
+            try:
+                self.flush()
+                return self._render_shared()
+            except Exception:
+                logger.warning("⚠️ Shared metrics unavailable; serving this worker's series only", exc_info=True)
+        return self._render_local()
+
+    def _render_local(self) -> str:
+        base = (("pid", str(os.getpid())),)
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render(base))
+        for name, help_text, samples in self._sample_gauges():
+            lines.extend(self._render_gauge(name, help_text, [(base + key, value) for key, value in samples]))
+        return "\n".join(lines) + "\n"
+
+    def _render_shared(self) -> str:
+        with self._lock:
+            metrics = dict(self._metrics)
+            gauge_help = {name: help_text for name, _, help_text in self._gauges}
+        totals = {}   # name → {label key → merged value}
+        gauges = {}   # name → [(label key incl. pid, value), ...]
+        for _, name, kind, key, value in self._shared.read():
+            if kind == "gauge":
+                gauges.setdefault(name, []).append((key, value))
+                continue
+            metric = metrics.get(name)
+            if metric is None or metric.kind != kind:
+                continue  # written by another build; no help text or buckets to render it with
+            series = totals.setdefault(name, {})
+            series[key] = metric.merge(series.get(key), value)
+
+        lines = []
+        for name, metric in metrics.items():
+            lines.extend(metric.render((), totals.get(name, {})))
+        for name in sorted(gauges):
+            lines.extend(self._render_gauge(name, gauge_help.get(name, ""), sorted(gauges[name])))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_gauge(name, help_text, samples):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for key, value in samples:
+            lines.append(f"{name}{_format_labels(key)} {float(value):g}")
+        return lines
+
+
+registry = Registry(METRICS_DB if METRICS_ENABLED else None)
+
+SPAN_SECONDS = registry.histogram("span_seconds", "Latency of instrumented pipeline stages")
+SPAN_ERRORS = registry.counter("span_errors_total", "Instrumented stages that raised")
+HTTP_SECONDS = registry.histogram("http_request_seconds", "Flask request latency by endpoint")
+HTTP_REQUESTS = registry.counter("http_requests_total", "Flask requests by endpoint and status")
+
+
+class span:
+    """
+    Time a block or function:
+
+        with span("openai.chat"):
+            ...
+
+        @span("gemini.quick_task")
+        def gemini_quick_task(...): ...
+    """
+
+    __slots__ = ("name", "labels", "_started")
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not METRICS_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self._started
+        SPAN_SECONDS.observe(elapsed, span=self.name, **self.labels)
+        if exc_type is not None:
+            SPAN_ERRORS.inc(span=self.name, **self.labels)
+        logger.debug("span %s took %.1fms", self.name, elapsed * 1000)
+        return False
+
+    def __call__(self, fn):
+        name, labels = self.name, self.labels
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def observe(name, seconds, **labels):
+    """Record a duration measured elsewhere (e.g. time to first token)."""
+    if METRICS_ENABLED:
+        SPAN_SECONDS.observe(seconds, span=name, **labels)
+
+
+def render_prometheus() -> str:
+    return registry.render()
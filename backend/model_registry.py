@@ -0,0 +1,151 @@
+# ===========================================================
+# backend/model_registry.py — Lazy, fork-friendly model loading
+# ===========================================================
+# Models are registered with a loader (and optional warmup) and
+# only materialized when first requested. The registry can also
+# preload everything up front — e.g. in the gunicorn master so
+# forked workers share the weights copy-on-write — and report
+# readiness for health checks.
+# ===========================================================
+
+import gc
+import os
+import time
+import threading
+import traceback
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_LOAD_MODES = ("lazy", "preload", "warmup")
+
+
+class ModelRegistry:
+    """Thread-safe registry of lazily loaded models."""
+
+    def __init__(self, mode="lazy"):
+        if mode not in MODEL_LOAD_MODES:
+            raise ValueError(f"Unknown model load mode '{mode}', expected one of {MODEL_LOAD_MODES}")
+        self.mode = mode
+        self._specs = {}
+        self._models = {}
+        self._locks = {}
+        self._warm = set()
+        self._errors = {}
+        self._load_seconds = {}
+        self._warm_pid = None
+        self._warmup_thread = None
+
+    # -------------------------------------------------------
+    # Registration & Access
+    # -------------------------------------------------------
+
+    def register(self, name, loader, warmup=None):
+        """Register a model loader and an optional warmup function."""
+        self._specs[name] = (loader, warmup)
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Return the model, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._specs:
+            raise KeyError(f"Model '{name}' is not registered")
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                loader, _ = self._specs[name]
+                started = time.monotonic()
+                try:
+                    model = loader()
+                except Exception:
+                    self._errors[name] = traceback.format_exc()
+                    raise
+                self._load_seconds[name] = time.monotonic() - started
+                self._models[name] = model
+                self._errors.pop(name, None)
+                logger.info("✅ [Models] '%s' loaded in %.1fs", name, self._load_seconds[name])
+        return model
+
+    def is_loaded(self, name) -> bool:
+        return name in self._models
+
+    # -------------------------------------------------------
+    # Preload & Warmup
+    # -------------------------------------------------------
+
+    def load_all(self):
+        """Load every registered model (used for gunicorn --preload).
+
+        Only weights are loaded here; no inference is run, so torch's
+        intra-op thread pool is not started before the fork. Objects
+        allocated so far are moved to the permanent GC generation so
+        the collector does not touch (and un-share) their pages in
+        the forked workers.
+        """
+        for name in self._specs:
+            self.get(name)
+        if hasattr(gc, "freeze"):
+            gc.collect()
+            gc.freeze()
+
+    def warmup(self, names=None):
+        """Load the given models (default: all) and run a dummy inference."""
+        pid = os.getpid()
+        if self._warm_pid != pid:
+            # Warm state is per process: a forked worker has its own threads and caches
+            self._warm = set()
+            self._warm_pid = pid
+        for name in names or list(self._specs):
+            try:
+                model = self.get(name)
+                _, warmup_fn = self._specs[name]
+                if warmup_fn is not None:
+                    started = time.monotonic()
+                    warmup_fn(model)
+                    logger.info("✅ [Models] '%s' warmed up in %.2fs", name, time.monotonic() - started)
+                self._warm.add(name)
+            except Exception:
+                self._errors[name] = traceback.format_exc()
+                logger.exception("🔥 [Models] Warmup failed for '%s'", name)
+        return self.is_ready()
+
+    def start_background_warmup(self):
+        """Warm all models in a daemon thread so the process can start serving health checks."""
+        if self._warm_pid == os.getpid():
+            running = self._warmup_thread is not None and self._warmup_thread.is_alive()
+            if running or all(name in self._warm for name in self._specs):
+                return self._warmup_thread
+        self._warm_pid = os.getpid()
+        self._warm = set()
+        self._warmup_thread = threading.Thread(target=self.warmup, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    # -------------------------------------------------------
+    # Readiness
+    # -------------------------------------------------------
+
+    def is_ready(self) -> bool:
+        """Lazy mode is always ready; other modes require every model to be warm."""
+        if self.mode == "lazy":
+            return True
+        return self._warm_pid == os.getpid() and all(name in self._warm for name in self._specs)
+
+    def status(self) -> dict:
+        warm = self._warm if self._warm_pid == os.getpid() else set()
+        return {
+            "mode": self.mode,
+            "ready": self.is_ready(),
+            "pid": os.getpid(),
+            "models": {
+                name: {
+                    "loaded": name in self._models,
+                    "warm": name in warm,
+                    "load_seconds": round(self._load_seconds[name], 3) if name in self._load_seconds else None,
+                    "error": self._errors.get(name, "").strip().splitlines()[-1] if self._errors.get(name) else None,
+                }
+                for name in self._specs
+            },
+        }
@@ -0,0 +1,257 @@
+# ===========================================================
+# backend/onnx_backend.py — Quantized ONNX Runtime inference
+# ===========================================================
+# Exports the HuggingFace classifiers to ONNX with dynamic int8
+# quantization, caches the artifacts on disk, and builds drop-in
+# `transformers.pipeline` objects on top of ONNX Runtime (CPU).
+# When an export is missing the torch pipeline is used instead.
+#
+# CLI:
+#   python onnx_backend.py export <task> <model_id> [--force]
+#   python onnx_backend.py parity <task> <model_id>
+# ===========================================================
+
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").strip().lower()
+ONNX_CACHE_DIR = os.getenv(
+    "ONNX_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models")
+)
+ONNX_AUTO_EXPORT = os.getenv("ONNX_AUTO_EXPORT", "0") == "1"
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+MANIFEST_FILE_NAME = "manifest.json"
+
+# task → (optimum ORTModel class, preprocessor kwarg for pipeline())
+_TASKS = {
+    "text-classification": ("ORTModelForSequenceClassification", "tokenizer"),
+    "audio-classification": ("ORTModelForAudioClassification", "feature_extractor"),
+    "feature-extraction": ("ORTModelForFeatureExtraction", "tokenizer"),
+}
+
+
+# ===========================================================
+# Artifact Cache
+# ===========================================================
+
+def artifact_dir(model_id: str) -> str:
+    """Directory holding the quantized export for a model."""
+    return os.path.join(ONNX_CACHE_DIR, model_id.replace("/", "--"), "int8")
+
+
+def has_export(model_id: str) -> bool:
+    path = artifact_dir(model_id)
+    return os.path.exists(os.path.join(path, QUANTIZED_FILE_NAME)) and os.path.exists(
+        os.path.join(path, MANIFEST_FILE_NAME)
+    )
+
+
+def _ort_model_class(task):
+    if task not in _TASKS:
+        raise ValueError(f"Unsupported task for ONNX backend: {task}")
+    import optimum.onnxruntime as ort
+    return getattr(ort, _TASKS[task][0])
+
+
+def _load_preprocessor(task, source):
+    from transformers import AutoTokenizer, AutoFeatureExtractor
+    if _TASKS[task][1] == "tokenizer":
+        return AutoTokenizer.from_pretrained(source)
+    return AutoFeatureExtractor.from_pretrained(source)
+
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    if os.getenv("ONNX_QUANT_TARGET", "avx2").lower() == "avx512_vnni":
+        return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def export_quantized(task: str, model_id: str, force: bool = False) -> str:
+    """Export a model to ONNX, apply dynamic int8 quantization and cache it."""
+    from optimum.onnxruntime import ORTQuantizer
+
+    target = artifact_dir(model_id)
+    if has_export(model_id) and not force:
+        logger.info("✅ [ONNX] Using cached export for %s", model_id)
+        return target
+
+    logger.info("📦 [ONNX] Exporting %s (%s)...", model_id, task)
+    model_cls = _ort_model_class(task)
+    with tempfile.TemporaryDirectory(prefix="onnx-export-") as fp32_dir:
+        model = model_cls.from_pretrained(model_id, export=True)
+        model.save_pretrained(fp32_dir)
+
+        logger.info("🗜️ [ONNX] Quantizing %s to dynamic int8...", model_id)
+        staging = target + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+        quantizer.quantize(save_dir=staging, quantization_config=_quantization_config())
+
+    _load_preprocessor(task, model_id).save_pretrained(staging)
+    with open(os.path.join(staging, MANIFEST_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_id": model_id,
+            "task": task,
+            "quantization": "dynamic-int8",
+            "file_name": QUANTIZED_FILE_NAME,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+        }, f, indent=2)
+
+    # Swap in atomically so concurrent loaders never see a half-written export
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    logger.info("✅ [ONNX] Export cached at %s", target)
+    return target
+
+
+# ===========================================================
+# Pipeline Construction
+# ===========================================================
+
+def _session_options():
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    return options
+
+
+def load_onnx_pipeline(task: str, model_id: str, **pipeline_kwargs):
+    """Build a pipeline backed by the cached int8 export, or return None if unavailable."""
+    if not has_export(model_id):
+        if not ONNX_AUTO_EXPORT:
+            return None
+        export_quantized(task, model_id)
+
+    from transformers import pipeline
+    path = artifact_dir(model_id)
+    model = _ort_model_class(task).from_pretrained(
+        path,
+        file_name=QUANTIZED_FILE_NAME,
+        provider="CPUExecutionProvider",
+        session_options=_session_options(),
+    )
+    preprocessor = {_TASKS[task][1]: _load_preprocessor(task, path)}
+    return pipeline(task, model=model, **preprocessor, **pipeline_kwargs)
+
+
+def load_torch_pipeline(task: str, model_id: str, **pipeline_kwargs):
+    from transformers import pipeline
+    return pipeline(task, model=model_id, **pipeline_kwargs)
+
+
+def load_pipeline(task: str, model_id: str, backend: str = None, **pipeline_kwargs):
+    """Load a classifier on the configured backend, falling back to torch."""
+    backend = (backend or INFERENCE_BACKEND).lower()
+    if backend == "onnx":
+        try:
+            onnx_pipeline = load_onnx_pipeline(task, model_id, **pipeline_kwargs)
+            if onnx_pipeline is not None:
+                logger.info("⚡ [ONNX] %s running on ONNX Runtime (int8)", model_id)
+                return onnx_pipeline
+            logger.warning("⚠️ [ONNX] No export for %s — falling back to torch", model_id)
+        except Exception:
+            logger.exception("🔥 [ONNX] Failed to load %s, falling back to torch", model_id)
+    elif backend != "torch":
+        logger.warning("⚠️ [ONNX] Unknown INFERENCE_BACKEND '%s' — using torch", backend)
+    return load_torch_pipeline(task, model_id, **pipeline_kwargs)
+
+
+# ===========================================================
+# Parity Check
+# ===========================================================
+
+DEFAULT_TEXT_SAMPLES = [
+    "I feel really anxious about my exams tomorrow.",
+    "Thanks, that actually helped a lot!",
+    "I'm fine.",
+    "Nobody ever listens to me and I'm so tired of it.",
+    "I don't know what to do anymore.",
+]
+
+
+def _default_audio_samples(sampling_rate=16000):
+    t = np.linspace(0, 2.0, 2 * sampling_rate, endpoint=False, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    return [
+        {"raw": 0.3 * np.sin(2 * np.pi * 220 * t).astype(np.float32), "sampling_rate": sampling_rate},
+        {"raw": (0.05 * rng.standard_normal(t.shape)).astype(np.float32), "sampling_rate": sampling_rate},
+    ]
+
+
+def _scores_by_label(output):
+    # Pipelines return either [{label, score}, ...] or [[{...}], ...] per input
+    if output and isinstance(output[0], list):
+        output = output[0]
+    return {entry["label"]: float(entry["score"]) for entry in output}
+
+
+def parity_check(task: str, model_id: str, samples=None, atol: float = 0.05, **pipeline_kwargs) -> dict:
+    """Compare top labels and scores between the torch and ONNX pipelines."""
+    if samples is None:
+        samples = DEFAULT_TEXT_SAMPLES if task == "text-classification" else _default_audio_samples()
+    if task == "text-classification":
+        pipeline_kwargs.setdefault("top_k", None)
+
+    torch_pipe = load_torch_pipeline(task, model_id, **pipeline_kwargs)
+    onnx_pipe = load_onnx_pipeline(task, model_id, **pipeline_kwargs)
+    if onnx_pipe is None:
+        raise FileNotFoundError(f"No ONNX export for {model_id}; run `python onnx_backend.py export {task} {model_id}`")
+
+    results = []
+    for sample in samples:
+        expected = _scores_by_label(torch_pipe(sample))
+        actual = _scores_by_label(onnx_pipe(sample))
+        expected_top = max(expected, key=expected.get)
+        actual_top = max(actual, key=actual.get)
+        shared = set(expected) & set(actual)
+        max_diff = max((abs(expected[label] - actual[label]) for label in shared), default=1.0)
+        results.append({
+            "sample": sample if isinstance(sample, str) else f"<audio {len(sample['raw'])} samples>",
+            "torch_label": expected_top,
+            "onnx_label": actual_top,
+            "label_match": expected_top == actual_top,
+            "max_score_diff": round(max_diff, 5),
+        })
+
+    passed = all(r["label_match"] and r["max_score_diff"] <= atol for r in results)
+    return {
+        "model_id": model_id,
+        "task": task,
+        "atol": atol,
+        "label_agreement": sum(r["label_match"] for r in results) / len(results),
+        "max_score_diff": max(r["max_score_diff"] for r in results),
+        "passed": passed,
+        "samples": results,
+    }
+
+
+if __name__ == "__main__":
+    usage = "usage: python onnx_backend.py {export|parity} <task> <model_id> [--force]"
+    if len(sys.argv) < 4 or sys.argv[1] not in ("export", "parity"):
+        print(usage)
+        sys.exit(2)
+    command, task_arg, model_arg = sys.argv[1:4]
+    if command == "export":
+        export_quantized(task_arg, model_arg, force="--force" in sys.argv[4:])
+    else:
+        report = parity_check(task_arg, model_arg)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["passed"] else 1)
@@ -0,0 +1,170 @@
+# ===========================================================
+# backend/prompt_builder.py — Cache-friendly GPT prompt assembly
+# ===========================================================
+# OpenAI reuses the computed prefix of a prompt it has seen recently
+# (prompt caching), so a turn is cheaper and faster to start when its
+# payload begins with exactly the bytes the previous turn sent. The
+# message list is therefore ordered from most to least stable:
+#
+#   1. SYSTEM_PROMPT          byte-identical for every user and turn
+#   2. running summary        changes only when the session is compacted
+#   3. verbatim turns         append-only between compactions
+#   4. turn context           retrieved summaries + detected emotions
+#   5. the user's message
+#
+# Everything that varies per message sits in (4) and (5), after the
+# cacheable prefix. The turn-context template is parsed once at import.
+#
+# Every OpenAI response's usage (prompt, completion and cached prompt
+# tokens) is recorded here, so the cache hit ratio is measurable.
+# ===========================================================
+
+import hashlib
+import threading
+from string import Formatter
+
+from context_builder import count_tokens
+from log_utils import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+
+class PromptTemplate:
+    """A str.format-style template parsed once; render() only joins the pieces."""
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if conversion:
+                raise ValueError(f"Conversions are not supported in prompt templates: !{conversion}")
+            self._parts.append((literal, field, spec or ""))
+        self.fields = {field for _, field, _ in self._parts if field is not None}
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field, spec in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(format(values[field], spec))
+        return "".join(out)
+
+
+# -------------------------------------------------------
+# Static prefix — do not interpolate anything per turn here
+# -------------------------------------------------------
+SYSTEM_PROMPT = """
+You are an emotionally intelligent AI companion specializing in mental health and wellbeing conversations.
+You are *not* a medical professional. You never diagnose, prescribe, or make clinical claims.
+Your role is to provide **empathetic understanding, gentle guidance, and positive coping support**.
+
+Communication Guidelines:
+- Respond with warmth, active listening, and encouragement.
+- Use clear, natural, and emotionally safe language.
+- Avoid judgment, over-assurance, or toxic positivity.
+- Reflect understanding before offering suggestions.
+- If user shows distress or crisis cues, gently encourage reaching out to a professional or trusted person.
+
+Context Awareness:
+The user's latest message is preceded by a "Turn context" note with summaries of earlier sessions
+relevant to it and the emotions detected in it. Use it for continuity and tone; do not quote it.
+
+Now craft your response with empathy, calm tone, and helpful insights.
+Keep paragraphs short (2–4 lines) and conversational.
+If the user seeks advice, frame it as perspective, not instruction.
+""".strip()
+
+SYSTEM_PROMPT_FINGERPRINT = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+TURN_CONTEXT = PromptTemplate("""Turn context
+Relevant summaries from earlier sessions (for continuity):
+{summaries}
+
+User's detected emotions this message:
+- Text Emotion → {text_label} (confidence: {text_score:.2f})
+- Voice Tone → {tone_label} (confidence: {tone_score:.2f})""")
+
+
+def render_turn_context(past_summaries, text_emotion, tone_emotion) -> str:
+    """The per-turn dynamic fields, sent just before the user's message."""
+    summaries = "\n".join(f"- {s['summary']}" for s in past_summaries if s and s.get("summary"))
+    return TURN_CONTEXT.render(
+        summaries=summaries or "- None available",
+        text_label=text_emotion["label"],
+        text_score=text_emotion["score"],
+        tone_label=tone_emotion.get("label", "N/A"),
+        tone_score=tone_emotion.get("score", 0),
+    )
+
+
+# ===========================================================
+# Token Accounting
+# ===========================================================
+
+PROMPT_TOKENS = registry.counter("llm_prompt_tokens_total", "OpenAI prompt tokens by model and mode")
+CACHED_PROMPT_TOKENS = registry.counter(
+    "llm_cached_prompt_tokens_total", "OpenAI prompt tokens served from the provider's prefix cache"
+)
+COMPLETION_TOKENS = registry.counter("llm_completion_tokens_total", "OpenAI completion tokens by model and mode")
+
+
+class TokenUsage:
+    """Running totals of the usage block OpenAI returns with each response."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.missing_usage = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self._prefix_tokens = None
+
+    def record(self, usage, model, mode):
+        """Record one response's usage (None if the response carried none)."""
+        if usage is None:
+            with self._lock:
+                self.missing_usage += 1
+            return
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+        PROMPT_TOKENS.inc(prompt, model=model, mode=mode)
+        CACHED_PROMPT_TOKENS.inc(cached, model=model, mode=mode)
+        COMPLETION_TOKENS.inc(completion, model=model, mode=mode)
+        with self._lock:
+            self.responses += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+            self.completion_tokens += completion
+        logger.debug("🧮 [Tokens] prompt=%s (cached %s) completion=%s", prompt, cached, completion)
+
+    def cached_ratio(self) -> float:
+        with self._lock:
+            return round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0
+
+    def stats(self) -> dict:
+        if self._prefix_tokens is None:
+            self._prefix_tokens = count_tokens(SYSTEM_PROMPT)
+        ratio = self.cached_ratio()
+        with self._lock:
+            return {
+                "system_prompt_fingerprint": SYSTEM_PROMPT_FINGERPRINT,
+                "system_prompt_tokens": self._prefix_tokens,
+                "responses": self.responses,
+                "missing_usage": self.missing_usage,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": ratio,
+            }
+
+
+token_usage = TokenUsage()
+
+registry.register_gauge(
+    "llm_cached_prompt_ratio", token_usage.cached_ratio, "Share of OpenAI prompt tokens served from cache"
+)
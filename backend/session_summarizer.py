@@ -0,0 +1,185 @@
+# ===========================================================
+# backend/session_summarizer.py — Incremental session summaries
+# ===========================================================
+# A session's long-term summary is kept as a running summary plus a
+# high-water mark (id + timestamp of the last interaction folded in).
+# Each run sends Gemini only the previous summary and the turns after
+# the mark, slimmed to {"role", "text"}, instead of the full raw
+# transcript (ids, timestamps and emotion scores included).
+#
+# A full re-summarization of the slimmed transcript is the fallback:
+# for sessions with no usable mark, when the update reply cannot be
+# parsed, and every SUMMARY_FULL_EVERY incremental runs so drift
+# from repeated folding does not accumulate. If that fails too
+# (Gemini's zero-confidence placeholder), the run raises so the job
+# is retried and the stored summary and needs_summary are untouched.
+#
+# Tokens saved per run are estimated against what the old path sent:
+# the JSON of every interaction in the session.
+# ===========================================================
+
+import os
+import json
+import threading
+
+from firebase_utils import get_session_interactions, list_interactions_page
+from GeminiUtils import gemini_summarize_session, gemini_update_session_summary
+from context_builder import count_tokens
+from storage.base import iso_cursor
+from log_utils import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+SUMMARY_FULL_EVERY = int(os.getenv("SUMMARY_FULL_EVERY", "10"))  # 0 = never force a full run
+SUMMARY_PAGE_SIZE = int(os.getenv("SUMMARY_PAGE_SIZE", "100"))
+
+_TURN_FIELDS = ("interaction_id", "timestamp", "user_input", "gpt_response")
+
+SUMMARY_RUNS = registry.counter("session_summary_runs_total", "Session summaries by mode (incremental/full)")
+SUMMARY_TOKENS_SENT = registry.counter("session_summary_tokens_sent_total", "Transcript tokens sent to Gemini")
+SUMMARY_TOKENS_SAVED = registry.counter(
+    "session_summary_tokens_saved_total", "Transcript tokens saved vs. resending the full raw session"
+)
+
+
+def slim_turns(interactions) -> list:
+    """Interactions → alternating {"role", "text"} turns, nothing else."""
+    turns = []
+    for interaction in interactions:
+        turns.append({"role": "user", "text": interaction.get("user_input", "")})
+        turns.append({"role": "assistant", "text": interaction.get("gpt_response", "")})
+    return turns
+
+
+def _raw_tokens(interactions) -> int:
+    """Tokens the old path spent on these interactions (their full JSON)."""
+    return sum(count_tokens(json.dumps(i, ensure_ascii=False, default=str)) for i in interactions)
+
+
+def _payload_tokens(*parts) -> int:
+    return sum(count_tokens(json.dumps(part, ensure_ascii=False)) for part in parts)
+
+
+class SessionSummarizer:
+    """Builds session summaries from the previous summary plus new turns."""
+
+    def __init__(self, full_every=SUMMARY_FULL_EVERY, page_size=SUMMARY_PAGE_SIZE):
+        self.full_every = full_every
+        self.page_size = page_size
+        self._lock = threading.Lock()
+
+        self.runs = {"incremental": 0, "full": 0}
+        self.fallbacks = 0
+        self.failures = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+        self.last_run = None
+
+    def _turns_after(self, user_id, session_id, through_at, through_id):
+        """Interactions strictly after the high-water mark, oldest first."""
+        cursor = iso_cursor(through_at, through_id)
+        interactions = []
+        while True:
+            page, cursor = list_interactions_page(
+                user_id, session_id, self.page_size, start_after=cursor, fields=_TURN_FIELDS
+            )
+            interactions.extend(page)
+            if not cursor:
+                return interactions
+
+    def _incremental(self, user_id, session_id, session):
+        """Fold new turns into the stored summary → (summary, delta) or None to fall back."""
+        runs = int(session.get("summary_incremental_runs") or 0)
+        if not (session.get("summary") and session.get("summary_through_id") and session.get("summary_through_at")):
+            return None
+        if session.get("summary_source_tokens") is None:
+            return None
+        if self.full_every and runs >= self.full_every:
+            return None
+
+        previous = {
+            "summary": session["summary"],
+            "emotional_trend": session.get("emotional_trend", "unclear"),
+            "topics": session.get("topics", []),
+        }
+        delta = self._turns_after(user_id, session_id, session["summary_through_at"], session["summary_through_id"])
+        if not delta:
+            # Nothing new: re-save the stored summary as-is to clear needs_summary
+            unchanged = {
+                **previous,
+                "confidence": session.get("summary_confidence", 0.8),
+                "through_id": session["summary_through_id"],
+                "through_at": session["summary_through_at"],
+            }
+            return unchanged, delta
+        turns = slim_turns(delta)
+        summary = gemini_update_session_summary(previous, turns)
+        if summary is None or not summary.get("confidence"):
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        summary["source_tokens"] = int(session["summary_source_tokens"]) + _raw_tokens(delta)
+        summary["incremental_runs"] = runs + 1
+        summary["_sent"] = _payload_tokens(previous, turns)
+        return summary, delta
+
+    def summarize(self, user_id: str, session_id: str, session: dict):
+        """
+        Summary dict for the session (with its new high-water mark), or
+        None if it has no interactions. `session` is the stored session
+        document. Raises RuntimeError when Gemini returns no usable summary.
+        """
+        mode = "incremental"
+        result = self._incremental(user_id, session_id, session)
+        if result is not None:
+            summary, covered = result
+            if not covered:
+                return summary
+        else:
+            mode = "full"
+            covered = get_session_interactions(user_id, session_id)
+            if not covered:
+                return None
+            turns = slim_turns(covered)
+            summary = gemini_summarize_session(turns)
+            if not summary.get("confidence"):
+                # Gemini's placeholder on failure; saving it would replace a good summary
+                with self._lock:
+                    self.failures += 1
+                raise RuntimeError(f"Gemini returned no usable summary for session {session_id}")
+            summary["source_tokens"] = _raw_tokens(covered)
+            summary["incremental_runs"] = 0
+            summary["_sent"] = _payload_tokens(turns)
+
+        sent = summary.pop("_sent")
+        saved = max(summary["source_tokens"] - sent, 0)
+        last = covered[-1]
+        summary["through_id"] = last["interaction_id"]
+        summary["through_at"] = last["timestamp"]
+
+        SUMMARY_RUNS.inc(mode=mode)
+        SUMMARY_TOKENS_SENT.inc(sent, mode=mode)
+        SUMMARY_TOKENS_SAVED.inc(saved, mode=mode)
+        with self._lock:
+            self.runs[mode] += 1
+            self.tokens_sent += sent
+            self.tokens_saved += saved
+            self.last_run = {"mode": mode, "interactions": len(covered), "tokens_sent": sent, "tokens_saved": saved}
+        logger.debug(
+            "🧩 [Summary] %s run for session %s: sent %s transcript tokens, saved ~%s",
+            mode, session_id, sent, saved,
+        )
+        return summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "full_every": self.full_every,
+                "runs": dict(self.runs),
+                "fallbacks": self.fallbacks,
+                "failures": self.failures,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_saved,
+                "last_run": self.last_run,
+            }
@@ -0,0 +1,123 @@
+# ===========================================================
+# backend/session_sweeper.py — Background summarization of idle sessions
+# ===========================================================
+# Every session write sets needs_summary and last_message_at, so
+# idle, unsummarized sessions are one indexed query away. A daemon
+# thread per process runs that query on an interval and hands each
+# hit to the post-response job queue, whose bounded worker pool
+# (with retries and backoff) does the actual Gemini summarization.
+#
+# Sessions handed off recently are remembered for one idle period,
+# so a slow or failing summary is not re-enqueued on every sweep.
+# Each sweep resumes from a keyset cursor where the previous page
+# ended (wrapping to the oldest after the last page), so a batch of
+# such sessions at the head of the index cannot starve newer ones.
+# ===========================================================
+
+import os
+import time
+import random
+import threading
+from datetime import timedelta
+
+from cache_utils import LRUCache
+from storage.base import utc_now
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+SESSION_SWEEPER_ENABLED = os.getenv("SESSION_SWEEPER", "1") == "1"
+SESSION_IDLE_MINUTES = float(os.getenv("SESSION_IDLE_MINUTES", "10"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "50"))
+
+
+class SessionSweeper:
+    """Finds idle sessions that still need a summary and enqueues one job per session."""
+
+    def __init__(self, find_fn, enqueue_fn, idle_minutes=SESSION_IDLE_MINUTES,
+                 interval=SESSION_SWEEP_INTERVAL_SECONDS, batch_size=SESSION_SWEEP_BATCH_SIZE,
+                 name="session-sweeper"):
+        self.find_fn = find_fn
+        self.enqueue_fn = enqueue_fn
+        self.idle = timedelta(minutes=idle_minutes)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.name = name
+        self._recent = LRUCache(
+            max_entries=max(batch_size * 20, 1000), ttl_seconds=max(idle_minutes * 60, interval), name=name,
+        )
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._cursor = None
+
+        self.sweeps = 0
+        self.found = 0
+        self.enqueued = 0
+        self.errors = 0
+        self.last_sweep_ms = None
+
+    def sweep_once(self) -> int:
+        """Run one sweep; returns how many sessions were handed to the job queue."""
+        started = time.monotonic()
+        idle, self._cursor = self.find_fn(utc_now() - self.idle, self.batch_size, self._cursor)
+        enqueued = 0
+        for user_id, session_id in idle:
+            key = (user_id, session_id)
+            if key in self._recent:
+                continue
+            try:
+                self.enqueue_fn(user_id, session_id)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception("🔥 [%s] Enqueue failed for session %s", self.name, session_id)
+                continue
+            self._recent.set(key, True)
+            enqueued += 1
+        with self._lock:
+            self.sweeps += 1
+            self.found += len(idle)
+            self.enqueued += enqueued
+            self.last_sweep_ms = (time.monotonic() - started) * 1000.0
+        if enqueued:
+            logger.info("🧹 [%s] Queued %s idle session(s) for summarization", self.name, enqueued)
+        return enqueued
+
+    def start(self):
+        """Start the sweep thread in this process (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Jitter keeps gunicorn workers from sweeping in lockstep
+            time.sleep(self.interval * random.uniform(0.8, 1.2))
+            try:
+                self.sweep_once()
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception("🔥 [%s] Sweep failed", self.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self._thread is not None and self._pid == os.getpid(),
+                "idle_minutes": self.idle.total_seconds() / 60,
+                "interval_seconds": self.interval,
+                "batch_size": self.batch_size,
+                "sweeps": self.sweeps,
+                "found": self.found,
+                "enqueued": self.enqueued,
+                "errors": self.errors,
+                "last_sweep_ms": self.last_sweep_ms,
+            }
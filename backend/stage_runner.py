@@ -0,0 +1,120 @@
+# ===========================================================
+# backend/stage_runner.py — Concurrent fan-out of pipeline stages
+# ===========================================================
+# Runs independent stages of a request on a shared thread pool
+# and joins them with per-stage timeouts. A stage that times out
+# or fails is cancelled (if it hasn't started) and replaced by its
+# default value, so the critical path is bounded by the slowest
+# stage rather than the sum of all of them.
+# ===========================================================
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from log_utils import get_logger
+from metrics import observe
+
+logger = get_logger(__name__)
+
+
+def _failed(exc) -> Future:
+    future = Future()
+    future.set_exception(exc)
+    return future
+
+
+class Stage:
+    """A unit of work: fn(*args) with a timeout (seconds) and a fallback value.
+
+    With returns_future=True, fn is called on the caller's thread and must
+    return a Future (e.g. MicroBatcher.submit); cancelling it on timeout
+    then drops the work from that component's queue instead of leaving a
+    pool thread blocked on it.
+    """
+
+    def __init__(self, name, fn, *args, timeout=10.0, default=None, returns_future=False):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.timeout = timeout
+        self.default = default
+        self.returns_future = returns_future
+        self.elapsed = None
+
+
+class StageRunner:
+    """Fork-aware thread pool that runs a set of stages concurrently."""
+
+    def __init__(self, max_workers=8, name="stages"):
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.timeouts = {}
+        self.failures = {}
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                    self._pid = pid
+        return self._executor
+
+    def _timed(self, stage):
+        started = time.monotonic()
+        try:
+            return stage.fn(*stage.args)
+        finally:
+            stage.elapsed = time.monotonic() - started
+
+    def run(self, stages):
+        """Run stages concurrently. Returns ({name: result}, {name: elapsed_seconds})."""
+        started = time.monotonic()
+        pool = self._pool()
+        futures = {}
+        for stage in stages:
+            if stage.returns_future:
+                try:
+                    futures[stage.name] = (stage, stage.fn(*stage.args))
+                except Exception:
+                    futures[stage.name] = (stage, _failed(sys.exc_info()[1]))
+            else:
+                futures[stage.name] = (stage, pool.submit(self._timed, stage))
+
+        results, timings = {}, {}
+        for name, (stage, future) in futures.items():
+            # Each stage's deadline is measured from the start of the fan-out
+            remaining = max(stage.timeout - (time.monotonic() - started), 0.0)
+            try:
+                results[name] = future.result(timeout=remaining)
+                timings[name] = stage.elapsed if stage.elapsed is not None else time.monotonic() - started
+            except FutureTimeout:
+                future.cancel()
+                with self._lock:
+                    self.timeouts[name] = self.timeouts.get(name, 0) + 1
+                logger.warning("⏱️ [%s] Stage '%s' timed out after %.1fs — using default", self.name, name, stage.timeout)
+                results[name] = stage.default
+                timings[name] = time.monotonic() - started
+            except Exception:
+                with self._lock:
+                    self.failures[name] = self.failures.get(name, 0) + 1
+                logger.exception("🔥 [%s] Stage '%s' failed — using default", self.name, name)
+                results[name] = stage.default
+                timings[name] = stage.elapsed if stage.elapsed is not None else time.monotonic() - started
+        for name, seconds in timings.items():
+            observe(f"stage.{name}", seconds, runner=self.name)
+        return results, timings
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "timeouts": dict(self.timeouts),
+                "failures": dict(self.failures),
+            }
@@ -0,0 +1,31 @@
+# ==============================================================
+# backend/storage — Pluggable persistence backends
+# ==============================================================
+# STORAGE_BACKEND selects the implementation behind firebase_utils:
+#   firestore (default) · sqlite · memory
+# ==============================================================
+
+import os
+
+from storage.base import StorageBackend
+
+STORAGE_BACKENDS = ("firestore", "sqlite", "memory")
+
+
+def create_store(backend: str = None) -> StorageBackend:
+    """Instantiate the configured storage backend."""
+    backend = (backend or os.getenv("STORAGE_BACKEND", "firestore")).strip().lower()
+    if backend == "firestore":
+        from storage.firestore_store import FirestoreStore
+        return FirestoreStore()
+    if backend == "sqlite":
+        from storage.sqlite_store import SQLiteStore
+        default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mindmate.db")
+        return SQLiteStore(os.getenv("SQLITE_PATH", default_path))
+    if backend == "memory":
+        from storage.memory_store import MemoryStore
+        return MemoryStore()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of {STORAGE_BACKENDS}")
+
+
+__all__ = ["StorageBackend", "STORAGE_BACKENDS", "create_store"]
@@ -0,0 +1,264 @@
+# ==============================================================
+# backend/storage/base.py — Storage backend interface
+# ==============================================================
+# Every persistence operation firebase_utils exposes, expressed as
+# backend methods. Implementations raise on failure; the
+# firebase_utils facade handles logging and fallback values.
+# ==============================================================
+
+import json
+import uuid
+import base64
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+SESSION_FIELDS = ("session_id", "title", "created_at", "last_updated", "summary", "emotional_trend", "topics")
+INTERACTION_FIELDS = ("interaction_id", "timestamp", "user_input", "gpt_response", "emotions")
+
+
+def utc_now():
+    """Return current UTC datetime with timezone."""
+    return datetime.now(timezone.utc)
+
+
+def session_summary_view(session_id: str, data: dict) -> dict:
+    """Session metadata as returned by the history endpoints."""
+    return {
+        "session_id": data.get("session_id", session_id),
+        "title": data.get("title", "Untitled Session"),
+        "created_at": data.get("created_at"),
+        "last_updated": data.get("last_updated"),
+        "summary": data.get("summary"),
+        "emotional_trend": data.get("emotional_trend"),
+        "topics": data.get("topics", []),
+    }
+
+
+def recent_summary_view(data: dict) -> dict:
+    """Cross-session memory entry built from a summarized session."""
+    return {
+        "summary": data.get("summary"),
+        "emotional_trend": data.get("emotional_trend", "unknown"),
+        "topics": data.get("topics", []),
+        "confidence": float(data.get("summary_confidence", 0.8)),
+    }
+
+
+# Incremental-summary bookkeeping stored next to the summary itself:
+# the last interaction folded in (high-water mark), the cumulative token
+# size of the raw transcript it covers, and incremental runs since the
+# last full re-summarization.
+SUMMARY_STATE_FIELDS = (
+    "summary_through_id", "summary_through_at", "summary_source_tokens", "summary_incremental_runs",
+)
+
+
+def summary_fields(summary: dict) -> dict:
+    """Session fields written when a Gemini summary is stored (timestamps excluded)."""
+    fields = {
+        "summary": summary.get("summary", ""),
+        "emotional_trend": summary.get("emotional_trend", "unclear"),
+        "topics": summary.get("topics", []),
+        "summary_confidence": float(summary.get("confidence", 0.8)),
+    }
+    for field in SUMMARY_STATE_FIELDS:
+        key = field[len("summary_"):]
+        if key in summary:
+            fields[field] = summary[key]
+    return fields
+
+
+def still_needs_summary(last_message_at, summarized_through) -> bool:
+    """True if a message arrived after the transcript a summary was built from."""
+    return bool(last_message_at and summarized_through and last_message_at > summarized_through)
+
+
+def project(data: dict, fields) -> dict:
+    """Keep only the requested fields (all of them when fields is falsy)."""
+    return {f: data.get(f) for f in fields} if fields else data
+
+
+# --------------------------------------------------------------
+# Cursors
+# --------------------------------------------------------------
+# Page cursors are opaque to clients: URL-safe base64 of the JSON
+# [timestamp ISO string, document id] of the last row returned.
+# The same cursor works against the store and the transcript cache.
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of encode_cursor; raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def iso_cursor(timestamp, doc_id) -> str:
+    """Cursor for (datetime, id) ordered rows."""
+    return encode_cursor([timestamp.isoformat() if timestamp else None, doc_id])
+
+
+def parse_iso_cursor(cursor: str):
+    ts, doc_id = decode_cursor(cursor)
+    try:
+        return (datetime.fromisoformat(ts) if ts else None), str(doc_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def idle_cursor(timestamp, user_id, session_id) -> str:
+    """Cursor for the cross-user idle-session sweep, ordered by (last_message_at, user, session)."""
+    return encode_cursor([timestamp.isoformat() if timestamp else None, [user_id, session_id]])
+
+
+def parse_idle_cursor(cursor: str):
+    ts, key = decode_cursor(cursor)
+    try:
+        user_id, session_id = key
+        return (datetime.fromisoformat(ts) if ts else None), str(user_id), str(session_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def paginate(rows, sort_key, limit, start_after=None, descending=False):
+    """
+    Page through already-materialized rows ordered by sort_key = (datetime, id).
+    Returns (page, next_cursor); next_cursor is None on the last page.
+    """
+    _epoch = datetime.min.replace(tzinfo=timezone.utc)
+    key = lambda row: (sort_key(row)[0] or _epoch, sort_key(row)[1])
+    rows = sorted(rows, key=key, reverse=descending)
+    if start_after:
+        ts, doc_id = parse_iso_cursor(start_after)
+        marker = (ts or _epoch, doc_id)
+        rows = [r for r in rows if (key(r) < marker if descending else key(r) > marker)]
+    page = rows[:limit]
+    next_cursor = iso_cursor(*sort_key(page[-1])) if len(rows) > limit else None
+    return page, next_cursor
+
+
+class StorageBackend(ABC):
+    """
+    Interface implemented by the Firestore, SQLite and in-memory stores.
+    Abstract methods must be implemented; the others have portable
+    defaults a backend may override with an indexed query.
+    """
+
+    name = "base"
+
+    # --- Users ---
+    @abstractmethod
+    def ensure_user_exists(self, user_id: str) -> bool:
+        """Create the user if missing (returns True if created), else bump last_active."""
+
+    @abstractmethod
+    def user_exists(self, user_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def touch_users_last_active(self, user_ids: list) -> None:
+        ...
+
+    # --- Sessions ---
+    @abstractmethod
+    def create_session(self, user_id: str, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def update_session_title(self, user_id: str, session_id: str, title: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_all_sessions(self, user_id: str) -> list:
+        ...
+
+    @abstractmethod
+    def get_session_details(self, user_id: str, session_id: str):
+        ...
+
+    def list_sessions(self, user_id: str, limit: int, start_after: str = None, fields=None):
+        """One page of sessions, most recently updated first → (sessions, next_cursor)."""
+        page, cursor = paginate(
+            self.get_all_sessions(user_id),
+            lambda s: (s.get("last_updated"), s["session_id"]),
+            limit, start_after, descending=True,
+        )
+        return [project(s, fields) for s in page], cursor
+
+    def sessions_version(self, user_id: str):
+        """Cheap change token for a user's session list (newest last_updated)."""
+        sessions = self.get_all_sessions(user_id)
+        newest = max((s["last_updated"] for s in sessions if s.get("last_updated")), default=None)
+        return newest.isoformat() if newest else None
+
+    # --- Interactions ---
+    def new_interaction_id(self) -> str:
+        return uuid.uuid4().hex[:20]
+
+    @abstractmethod
+    def save_interaction(self, user_id: str, session_id: str, payload: dict) -> None:
+        """
+        Store an interaction (payload carries interaction_id and timestamp) and
+        touch the session: last_message_at = payload timestamp, needs_summary = True.
+        """
+
+    @abstractmethod
+    def get_session_interactions(self, user_id: str, session_id: str) -> list:
+        ...
+
+    @abstractmethod
+    def get_last_message_time(self, user_id: str, session_id: str):
+        ...
+
+    def list_interactions(self, user_id: str, session_id: str, limit: int, start_after: str = None,
+                          fields=None, descending: bool = False):
+        """One page of a session's interactions in time order → (interactions, next_cursor)."""
+        page, cursor = paginate(
+            self.get_session_interactions(user_id, session_id),
+            lambda i: (i.get("timestamp"), i["interaction_id"]),
+            limit, start_after, descending=descending,
+        )
+        return [project(i, fields) for i in page], cursor
+
+    def interactions_version(self, user_id: str, session_id: str):
+        """Cheap change token for a session transcript (interactions are append-only)."""
+        interactions = self.get_session_interactions(user_id, session_id)
+        return interactions[-1]["interaction_id"] if interactions else None
+
+    # --- Summaries ---
+    @abstractmethod
+    def save_session_summary(self, user_id: str, session_id: str, summary: dict, summarized_through=None) -> None:
+        """
+        Store a Gemini summary and clear needs_summary, unless a message newer
+        than `summarized_through` (last timestamp the summary covers) arrived.
+        """
+
+    @abstractmethod
+    def find_idle_sessions(self, idle_before, limit: int, start_after: str = None):
+        """
+        One page of (user_id, session_id) pairs across all users whose last
+        message is older than `idle_before` and that still need a summary,
+        oldest first → (pairs, next_cursor). Served from an index on
+        (needs_summary, last_message_at).
+        """
+
+    @abstractmethod
+    def save_context_summary(self, user_id: str, session_id: str, summary: str, covered_turns: int) -> None:
+        ...
+
+    @abstractmethod
+    def get_user_recent_summaries(self, user_id: str, limit: int = 3) -> list:
+        ...
+
+    # --- Observability ---
+    def stats(self) -> dict:
+        return {"backend": self.name}
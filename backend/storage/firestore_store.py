@@ -0,0 +1,322 @@
+# ==============================================================
+# backend/storage/firestore_store.py — Firestore backend
+# ==============================================================
+# Layout:
+#   conversations/{user_id}
+#     └── sessions/{session_id}
+#           └── interactions/{interaction_id}
+#
+# The idle-session sweep is a collection-group query over
+# `sessions` and needs a composite index:
+#   sessions (collection group): needs_summary ASC, last_message_at ASC
+# ==============================================================
+
+import os
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from firestore_writer import FirestoreWriter
+from storage.base import (
+    INTERACTION_FIELDS,
+    SESSION_FIELDS,
+    StorageBackend,
+    idle_cursor,
+    iso_cursor,
+    parse_idle_cursor,
+    parse_iso_cursor,
+    project,
+    recent_summary_view,
+    session_summary_view,
+    still_needs_summary,
+    summary_fields,
+)
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+_DOC_ID = "__name__"
+
+
+def init_firestore():
+    """Initialize the Firebase app (once) and return a Firestore client."""
+    try:
+        if not firebase_admin._apps:
+            # Render secret file path
+            render_key_path = "/etc/secrets/firebase_key.json"
+            # Local path
+            local_key_path = r"C:\Users\kazim\Downloads\mindmate-b420b-firebase-adminsdk-fbsvc-b3801a9502.json"
+
+            key_path = render_key_path if os.path.exists(render_key_path) else local_key_path
+
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+        logger.info("✅ [Firebase] Connection established successfully.")
+        return db
+
+    except Exception:
+        logger.exception("🔥 [Firebase Init Error]")
+        raise SystemExit("Failed to initialize Firebase connection.")
+
+
+class FirestoreStore(StorageBackend):
+    name = "firestore"
+
+    def __init__(self):
+        self.db = init_firestore()
+        # Session/interaction writes go out as WriteBatch commits; with
+        # FIRESTORE_WRITE_BEHIND=1 they are journaled locally and flushed
+        # in the background by size (ops) or age (ms).
+        self.writer = FirestoreWriter(
+            self.db,
+            write_behind=os.getenv("FIRESTORE_WRITE_BEHIND", "0") == "1",
+            max_ops=int(os.getenv("FIRESTORE_WRITE_BEHIND_MAX_OPS", "100")),
+            max_delay_ms=float(os.getenv("FIRESTORE_WRITE_BEHIND_MAX_DELAY_MS", "200")),
+            journal_dir=os.getenv(
+                "FIRESTORE_JOURNAL_DIR",
+                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "write_journal"),
+            ),
+        )
+
+    # ----------------------------------------------------------
+    # References
+    # ----------------------------------------------------------
+
+    def _user_ref(self, user_id):
+        return self.db.collection("conversations").document(user_id)
+
+    def _session_ref(self, user_id, session_id):
+        return self._user_ref(user_id).collection("sessions").document(session_id)
+
+    @staticmethod
+    def _session_path(user_id, session_id):
+        return ("conversations", user_id, "sessions", session_id)
+
+    # ----------------------------------------------------------
+    # Users
+    # ----------------------------------------------------------
+
+    def ensure_user_exists(self, user_id):
+        user_ref = self._user_ref(user_id)
+        if not user_ref.get().exists:
+            user_ref.set({
+                "user_id": user_id,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "status": "active",
+                "total_sessions": 0,
+                "last_active": firestore.SERVER_TIMESTAMP,
+            })
+            return True
+        user_ref.update({"last_active": firestore.SERVER_TIMESTAMP})
+        return False
+
+    def user_exists(self, user_id):
+        return self._user_ref(user_id).get().exists
+
+    def touch_users_last_active(self, user_ids):
+        # merge, not update: one missing user doc must not fail everyone's batch
+        self.writer.commit_ops([
+            ("merge", ("conversations", user_id), {"last_active": firestore.SERVER_TIMESTAMP})
+            for user_id in user_ids
+        ])
+
+    # ----------------------------------------------------------
+    # Sessions
+    # ----------------------------------------------------------
+
+    def create_session(self, user_id, session_id):
+        self._session_ref(user_id, session_id).set({
+            "session_id": session_id,
+            "title": "Untitled Session",
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "last_updated": firestore.SERVER_TIMESTAMP,
+            "summary": None,
+            "emotional_trend": None,
+            "topics": [],
+        })
+
+    def update_session_title(self, user_id, session_id, title):
+        self.writer.write([
+            ("update", self._session_path(user_id, session_id),
+             {"title": title, "last_updated": firestore.SERVER_TIMESTAMP}),
+        ])
+
+    def get_all_sessions(self, user_id):
+        ref = (
+            self._user_ref(user_id)
+            .collection("sessions")
+            .order_by("last_updated", direction=firestore.Query.DESCENDING)
+        )
+        return [session_summary_view(doc.id, doc.to_dict()) for doc in ref.stream()]
+
+    @staticmethod
+    def _page(query, time_field, limit, start_after, ref_for, fields, descending):
+        """Keyset page ordered by (time_field, document id), optionally projected."""
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = query.order_by(time_field, direction=direction).order_by(_DOC_ID, direction=direction)
+        if fields:
+            # Projection trims payload; read cost is still one per document
+            query = query.select(sorted(set(fields) | {time_field}))
+        if start_after:
+            ts, doc_id = parse_iso_cursor(start_after)
+            query = query.start_after({time_field: ts, _DOC_ID: ref_for(doc_id)})
+        docs = list(query.limit(limit + 1).stream())
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = iso_cursor(docs[-1].get(time_field), docs[-1].id)
+        return docs, next_cursor
+
+    def list_sessions(self, user_id, limit, start_after=None, fields=None):
+        wanted = [f for f in (fields or SESSION_FIELDS) if f in SESSION_FIELDS]
+        docs, next_cursor = self._page(
+            self._user_ref(user_id).collection("sessions"), "last_updated", limit, start_after,
+            lambda doc_id: self._session_ref(user_id, doc_id), fields and wanted, descending=True,
+        )
+        return [project(session_summary_view(doc.id, doc.to_dict()), wanted) for doc in docs], next_cursor
+
+    def sessions_version(self, user_id):
+        ref = (
+            self._user_ref(user_id)
+            .collection("sessions")
+            .order_by("last_updated", direction=firestore.Query.DESCENDING)
+            .select(["last_updated"])
+            .limit(1)
+        )
+        for doc in ref.stream():
+            newest = doc.get("last_updated")
+            return newest.isoformat() if newest else None
+        return None
+
+    def get_session_details(self, user_id, session_id):
+        doc = self._session_ref(user_id, session_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    # ----------------------------------------------------------
+    # Interactions
+    # ----------------------------------------------------------
+
+    def new_interaction_id(self):
+        # Auto-ids are generated client-side, so no round trip here
+        return self.db.collection("conversations").document().id
+
+    def save_interaction(self, user_id, session_id, payload):
+        session_path = self._session_path(user_id, session_id)
+        # Session touch + interaction in one WriteBatch
+        self.writer.write([
+            ("update", session_path, {
+                "last_updated": firestore.SERVER_TIMESTAMP,
+                "last_message_at": payload["timestamp"],
+                "needs_summary": True,
+            }),
+            ("set", session_path + ("interactions", payload["interaction_id"]), payload),
+        ])
+
+    def get_session_interactions(self, user_id, session_id):
+        ref = (
+            self._session_ref(user_id, session_id)
+            .collection("interactions")
+            .order_by("timestamp", direction=firestore.Query.ASCENDING)
+        )
+        return [doc.to_dict() for doc in ref.stream()]
+
+    def list_interactions(self, user_id, session_id, limit, start_after=None, fields=None, descending=False):
+        wanted = [f for f in (fields or INTERACTION_FIELDS) if f in INTERACTION_FIELDS]
+        collection = self._session_ref(user_id, session_id).collection("interactions")
+        docs, next_cursor = self._page(
+            collection, "timestamp", limit, start_after,
+            lambda doc_id: collection.document(doc_id), fields and wanted, descending=descending,
+        )
+        return [project(doc.to_dict(), wanted) for doc in docs], next_cursor
+
+    def interactions_version(self, user_id, session_id):
+        ref = (
+            self._session_ref(user_id, session_id)
+            .collection("interactions")
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .select(["timestamp"])
+            .limit(1)
+        )
+        for doc in ref.stream():
+            return doc.id
+        return None
+
+    def get_last_message_time(self, user_id, session_id):
+        ref = (
+            self._session_ref(user_id, session_id)
+            .collection("interactions")
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(1)
+        )
+        for doc in ref.stream():
+            return doc.to_dict().get("timestamp")
+        return None
+
+    # ----------------------------------------------------------
+    # Summaries
+    # ----------------------------------------------------------
+
+    def save_session_summary(self, user_id, session_id, summary, summarized_through=None):
+        data = summary_fields(summary)
+        data["summary_generated_at"] = firestore.SERVER_TIMESTAMP
+        data["last_updated"] = firestore.SERVER_TIMESTAMP
+        ref = self._session_ref(user_id, session_id)
+
+        # Read-check-write in a transaction so a message that lands while
+        # Gemini was summarizing keeps the session flagged for the next sweep
+        @firestore.transactional
+        def _apply(transaction):
+            snapshot = ref.get(field_paths=["last_message_at"], transaction=transaction)
+            last_message_at = (snapshot.to_dict() or {}).get("last_message_at")
+            transaction.update(ref, {**data, "needs_summary": still_needs_summary(last_message_at, summarized_through)})
+
+        _apply(self.db.transaction())
+
+    def find_idle_sessions(self, idle_before, limit, start_after=None):
+        query = (
+            self.db.collection_group("sessions")
+            .where(filter=FieldFilter("needs_summary", "==", True))
+            .where(filter=FieldFilter("last_message_at", "<=", idle_before))
+            .order_by("last_message_at")
+            .order_by(_DOC_ID)
+            .select(["last_message_at"])
+        )
+        if start_after:
+            # Collection-group cursors need the full document reference, not just the id
+            ts, user_id, session_id = parse_idle_cursor(start_after)
+            query = query.start_after({"last_message_at": ts, _DOC_ID: self._session_ref(user_id, session_id)})
+        docs = list(query.limit(limit + 1).stream())
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = idle_cursor(last.get("last_message_at"), last.reference.parent.parent.id, last.id)
+        return [(doc.reference.parent.parent.id, doc.id) for doc in docs], next_cursor
+
+    def save_context_summary(self, user_id, session_id, summary, covered_turns):
+        self.writer.write([
+            ("update", self._session_path(user_id, session_id), {
+                "context_summary": summary,
+                "context_summary_turns": int(covered_turns),
+                "context_summary_updated_at": firestore.SERVER_TIMESTAMP,
+            }),
+        ])
+
+    def get_user_recent_summaries(self, user_id, limit=3):
+        ref = (
+            self._user_ref(user_id)
+            .collection("sessions")
+            .order_by("summary_generated_at", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        return [
+            recent_summary_view(data)
+            for data in (doc.to_dict() for doc in ref.stream())
+            if data.get("summary")
+        ]
+
+    def stats(self):
+        return {"backend": self.name, "writer": self.writer.stats()}
@@ -0,0 +1,179 @@
+# ==============================================================
+# backend/storage/memory_store.py — In-memory backend
+# ==============================================================
+# Process-local dictionaries with the same semantics as the
+# Firestore layout. Nothing is persisted; intended for tests,
+# load testing and offline development.
+# ==============================================================
+
+import copy
+import threading
+
+from storage.base import (
+    StorageBackend,
+    idle_cursor,
+    parse_idle_cursor,
+    recent_summary_view,
+    session_summary_view,
+    still_needs_summary,
+    summary_fields,
+    utc_now,
+)
+
+
+class MemoryStore(StorageBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = {}          # user_id → user doc
+        self._sessions = {}       # user_id → {session_id → session doc}
+        self._interactions = {}   # (user_id, session_id) → [interaction, ...] (time-ordered)
+
+    def _session(self, user_id, session_id):
+        session = self._sessions.get(user_id, {}).get(session_id)
+        if session is None:
+            raise KeyError(f"No session {session_id} for user {user_id}")
+        return session
+
+    # ----------------------------------------------------------
+    # Users
+    # ----------------------------------------------------------
+
+    def ensure_user_exists(self, user_id):
+        with self._lock:
+            now = utc_now()
+            if user_id not in self._users:
+                self._users[user_id] = {
+                    "user_id": user_id,
+                    "created_at": now,
+                    "status": "active",
+                    "total_sessions": 0,
+                    "last_active": now,
+                }
+                return True
+            self._users[user_id]["last_active"] = now
+            return False
+
+    def user_exists(self, user_id):
+        with self._lock:
+            return user_id in self._users
+
+    def touch_users_last_active(self, user_ids):
+        with self._lock:
+            now = utc_now()
+            for user_id in user_ids:
+                if user_id in self._users:
+                    self._users[user_id]["last_active"] = now
+
+    # ----------------------------------------------------------
+    # Sessions
+    # ----------------------------------------------------------
+
+    def create_session(self, user_id, session_id):
+        with self._lock:
+            now = utc_now()
+            self._sessions.setdefault(user_id, {})[session_id] = {
+                "session_id": session_id,
+                "title": "Untitled Session",
+                "created_at": now,
+                "last_updated": now,
+                "summary": None,
+                "emotional_trend": None,
+                "topics": [],
+            }
+            self._interactions[(user_id, session_id)] = []
+
+    def update_session_title(self, user_id, session_id, title):
+        with self._lock:
+            session = self._session(user_id, session_id)
+            session["title"] = title
+            session["last_updated"] = utc_now()
+
+    def get_all_sessions(self, user_id):
+        with self._lock:
+            sessions = list(self._sessions.get(user_id, {}).items())
+        sessions.sort(key=lambda item: item[1]["last_updated"], reverse=True)
+        return [session_summary_view(session_id, data) for session_id, data in sessions]
+
+    def get_session_details(self, user_id, session_id):
+        with self._lock:
+            session = self._sessions.get(user_id, {}).get(session_id)
+            return copy.deepcopy(session) if session is not None else None
+
+    # ----------------------------------------------------------
+    # Interactions
+    # ----------------------------------------------------------
+
+    def save_interaction(self, user_id, session_id, payload):
+        with self._lock:
+            session = self._session(user_id, session_id)
+            session["last_updated"] = utc_now()
+            session["last_message_at"] = payload["timestamp"]
+            session["needs_summary"] = True
+            self._interactions.setdefault((user_id, session_id), []).append(copy.deepcopy(payload))
+
+    def get_session_interactions(self, user_id, session_id):
+        with self._lock:
+            return copy.deepcopy(self._interactions.get((user_id, session_id), []))
+
+    def get_last_message_time(self, user_id, session_id):
+        with self._lock:
+            interactions = self._interactions.get((user_id, session_id))
+            return interactions[-1]["timestamp"] if interactions else None
+
+    # ----------------------------------------------------------
+    # Summaries
+    # ----------------------------------------------------------
+
+    def save_session_summary(self, user_id, session_id, summary, summarized_through=None):
+        with self._lock:
+            session = self._session(user_id, session_id)
+            now = utc_now()
+            session.update(summary_fields(summary))
+            session["summary_generated_at"] = now
+            session["last_updated"] = now
+            session["needs_summary"] = still_needs_summary(session.get("last_message_at"), summarized_through)
+
+    def find_idle_sessions(self, idle_before, limit, start_after=None):
+        with self._lock:
+            idle = [
+                (session["last_message_at"], user_id, session_id)
+                for user_id, sessions in self._sessions.items()
+                for session_id, session in sessions.items()
+                if session.get("needs_summary") and session["last_message_at"] <= idle_before
+            ]
+        idle.sort()
+        if start_after:
+            marker = parse_idle_cursor(start_after)
+            idle = [row for row in idle if row > marker]
+        next_cursor = None
+        if len(idle) > limit:
+            idle = idle[:limit]
+            ts, user_id, session_id = idle[-1]
+            next_cursor = idle_cursor(ts, user_id, session_id)
+        return [(user_id, session_id) for _, user_id, session_id in idle], next_cursor
+
+    def save_context_summary(self, user_id, session_id, summary, covered_turns):
+        with self._lock:
+            session = self._session(user_id, session_id)
+            session["context_summary"] = summary
+            session["context_summary_turns"] = int(covered_turns)
+            session["context_summary_updated_at"] = utc_now()
+
+    def get_user_recent_summaries(self, user_id, limit=3):
+        with self._lock:
+            sessions = [
+                dict(s) for s in self._sessions.get(user_id, {}).values() if s.get("summary_generated_at")
+            ]
+        sessions.sort(key=lambda s: s["summary_generated_at"], reverse=True)
+        return [recent_summary_view(s) for s in sessions[:limit] if s.get("summary")]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.name,
+                "users": len(self._users),
+                "sessions": sum(len(s) for s in self._sessions.values()),
+                "interactions": sum(len(i) for i in self._interactions.values()),
+            }
@@ -0,0 +1,403 @@
+# ==============================================================
+# backend/storage/sqlite_store.py — SQLite (WAL) backend
+# ==============================================================
+# Indexed single-file store for small deployments, offline
+# development and load testing. Timestamps are stored as UTC
+# epoch seconds and returned as timezone-aware datetimes.
+# ==============================================================
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from storage.base import (
+    INTERACTION_FIELDS,
+    SESSION_FIELDS,
+    StorageBackend,
+    idle_cursor,
+    iso_cursor,
+    parse_idle_cursor,
+    parse_iso_cursor,
+    project,
+    recent_summary_view,
+    session_summary_view,
+    summary_fields,
+    utc_now,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id        TEXT PRIMARY KEY,
+    created_at     REAL NOT NULL,
+    status         TEXT NOT NULL DEFAULT 'active',
+    total_sessions INTEGER NOT NULL DEFAULT 0,
+    last_active    REAL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id                    TEXT NOT NULL,
+    session_id                 TEXT NOT NULL,
+    title                      TEXT NOT NULL DEFAULT 'Untitled Session',
+    created_at                 REAL NOT NULL,
+    last_updated               REAL NOT NULL,
+    summary                    TEXT,
+    emotional_trend            TEXT,
+    topics                     TEXT NOT NULL DEFAULT '[]',
+    summary_confidence         REAL,
+    summary_generated_at       REAL,
+    context_summary            TEXT,
+    context_summary_turns      INTEGER,
+    context_summary_updated_at REAL,
+    last_message_at            REAL,
+    needs_summary              INTEGER NOT NULL DEFAULT 0,
+    summary_through_id         TEXT,
+    summary_through_at         REAL,
+    summary_source_tokens      INTEGER,
+    summary_incremental_runs   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, session_id)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_recent ON sessions (user_id, last_updated DESC);
+CREATE INDEX IF NOT EXISTS idx_sessions_summaries ON sessions (user_id, summary_generated_at DESC);
+CREATE TABLE IF NOT EXISTS interactions (
+    seq            INTEGER PRIMARY KEY AUTOINCREMENT,
+    interaction_id TEXT NOT NULL UNIQUE,
+    user_id        TEXT NOT NULL,
+    session_id     TEXT NOT NULL,
+    timestamp      REAL NOT NULL,
+    user_input     TEXT NOT NULL,
+    gpt_response   TEXT NOT NULL,
+    emotions       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions (user_id, session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_sessions_page ON sessions (user_id, last_updated DESC, session_id DESC);
+CREATE INDEX IF NOT EXISTS idx_interactions_page ON interactions (user_id, session_id, timestamp, interaction_id);
+"""
+
+# Columns added after the first release: (table, column, DDL, backfill SQL or None)
+_MIGRATIONS = (
+    ("sessions", "last_message_at", "ALTER TABLE sessions ADD COLUMN last_message_at REAL",
+     "UPDATE sessions SET last_message_at = (SELECT MAX(timestamp) FROM interactions i "
+     "WHERE i.user_id = sessions.user_id AND i.session_id = sessions.session_id)"),
+    ("sessions", "needs_summary", "ALTER TABLE sessions ADD COLUMN needs_summary INTEGER NOT NULL DEFAULT 0",
+     "UPDATE sessions SET needs_summary = 1 WHERE last_message_at IS NOT NULL "
+     "AND (summary_generated_at IS NULL OR summary_generated_at < last_message_at)"),
+    ("sessions", "summary_through_id", "ALTER TABLE sessions ADD COLUMN summary_through_id TEXT", None),
+    ("sessions", "summary_through_at", "ALTER TABLE sessions ADD COLUMN summary_through_at REAL", None),
+    ("sessions", "summary_source_tokens", "ALTER TABLE sessions ADD COLUMN summary_source_tokens INTEGER", None),
+    ("sessions", "summary_incremental_runs",
+     "ALTER TABLE sessions ADD COLUMN summary_incremental_runs INTEGER NOT NULL DEFAULT 0", None),
+)
+
+# Partial index: the sweeper only ever scans sessions still awaiting a summary
+_POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_sessions_idle ON sessions (last_message_at) WHERE needs_summary = 1;
+"""
+
+_SESSION_TIME_FIELDS = (
+    "created_at", "last_updated", "summary_generated_at", "context_summary_updated_at", "last_message_at",
+    "summary_through_at",
+)
+
+
+def _to_epoch(value: datetime) -> float:
+    return value.timestamp()
+
+
+def _from_epoch(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+
+class SQLiteStore(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._migrate(conn)
+        conn.executescript(_POST_MIGRATION_SCHEMA)
+
+    def _conn(self):
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        for table, column, ddl, backfill in _MIGRATIONS:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(ddl)
+                if backfill:
+                    conn.execute(backfill)
+
+    @staticmethod
+    def _page_marker(start_after):
+        # Epochs are written from microsecond datetimes, so this round-trips exactly
+        ts, doc_id = parse_iso_cursor(start_after)
+        return (_to_epoch(ts) if ts else 0.0), doc_id
+
+    def _require_update(self, cursor, user_id, session_id):
+        if cursor.rowcount == 0:
+            raise KeyError(f"No session {session_id} for user {user_id}")
+
+    @staticmethod
+    def _session_row(row) -> dict:
+        data = dict(row)
+        data.pop("user_id", None)
+        data["topics"] = json.loads(data.get("topics") or "[]")
+        data["needs_summary"] = bool(data.get("needs_summary"))
+        for field in _SESSION_TIME_FIELDS:
+            data[field] = _from_epoch(data.get(field))
+        return data
+
+    @staticmethod
+    def _interaction_row(row) -> dict:
+        return {
+            "interaction_id": row["interaction_id"],
+            "timestamp": _from_epoch(row["timestamp"]),
+            "user_input": row["user_input"],
+            "gpt_response": row["gpt_response"],
+            "emotions": json.loads(row["emotions"]),
+        }
+
+    # ----------------------------------------------------------
+    # Users
+    # ----------------------------------------------------------
+
+    def ensure_user_exists(self, user_id):
+        now = _to_epoch(utc_now())
+        cur = self._conn().execute(
+            "INSERT INTO users (user_id, created_at, last_active) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO NOTHING",
+            (user_id, now, now),
+        )
+        if cur.rowcount:
+            return True
+        self._conn().execute("UPDATE users SET last_active = ? WHERE user_id = ?", (now, user_id))
+        return False
+
+    def user_exists(self, user_id):
+        return self._conn().execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def touch_users_last_active(self, user_ids):
+        now = _to_epoch(utc_now())
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany("UPDATE users SET last_active = ? WHERE user_id = ?", [(now, u) for u in user_ids])
+        conn.execute("COMMIT")
+
+    # ----------------------------------------------------------
+    # Sessions
+    # ----------------------------------------------------------
+
+    def create_session(self, user_id, session_id):
+        now = _to_epoch(utc_now())
+        self._conn().execute(
+            "INSERT INTO sessions (user_id, session_id, created_at, last_updated) VALUES (?, ?, ?, ?)",
+            (user_id, session_id, now, now),
+        )
+
+    def update_session_title(self, user_id, session_id, title):
+        cur = self._conn().execute(
+            "UPDATE sessions SET title = ?, last_updated = ? WHERE user_id = ? AND session_id = ?",
+            (title, _to_epoch(utc_now()), user_id, session_id),
+        )
+        self._require_update(cur, user_id, session_id)
+
+    def get_all_sessions(self, user_id):
+        rows = self._conn().execute(
+            "SELECT * FROM sessions WHERE user_id = ? ORDER BY last_updated DESC", (user_id,)
+        ).fetchall()
+        return [session_summary_view(row["session_id"], self._session_row(row)) for row in rows]
+
+    def list_sessions(self, user_id, limit, start_after=None, fields=None):
+        wanted = [f for f in (fields or SESSION_FIELDS) if f in SESSION_FIELDS]
+        columns = sorted(set(wanted) | {"session_id", "last_updated"})
+        sql = f"SELECT {', '.join(columns)} FROM sessions WHERE user_id = ?"
+        params = [user_id]
+        if start_after:
+            ts, session_id = self._page_marker(start_after)
+            sql += " AND (last_updated < ? OR (last_updated = ? AND session_id < ?))"
+            params += [ts, ts, session_id]
+        sql += " ORDER BY last_updated DESC, session_id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._conn().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = iso_cursor(_from_epoch(rows[-1]["last_updated"]), rows[-1]["session_id"])
+        sessions = []
+        for row in rows:
+            data = dict(row)
+            if "topics" in data:
+                data["topics"] = json.loads(data["topics"] or "[]")
+            for field in _SESSION_TIME_FIELDS:
+                if field in data:
+                    data[field] = _from_epoch(data[field])
+            sessions.append(project(session_summary_view(row["session_id"], data), wanted))
+        return sessions, next_cursor
+
+    def sessions_version(self, user_id):
+        row = self._conn().execute(
+            "SELECT MAX(last_updated) AS ts FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return repr(row["ts"]) if row["ts"] is not None else None
+
+    def get_session_details(self, user_id, session_id):
+        row = self._conn().execute(
+            "SELECT * FROM sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ).fetchone()
+        return self._session_row(row) if row is not None else None
+
+    # ----------------------------------------------------------
+    # Interactions
+    # ----------------------------------------------------------
+
+    def save_interaction(self, user_id, session_id, payload):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            cur = conn.execute(
+                "UPDATE sessions SET last_updated = ?, last_message_at = ?, needs_summary = 1 "
+                "WHERE user_id = ? AND session_id = ?",
+                (_to_epoch(utc_now()), _to_epoch(payload["timestamp"]), user_id, session_id),
+            )
+            self._require_update(cur, user_id, session_id)
+            conn.execute(
+                "INSERT INTO interactions "
+                "(interaction_id, user_id, session_id, timestamp, user_input, gpt_response, emotions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    payload["interaction_id"],
+                    user_id,
+                    session_id,
+                    _to_epoch(payload["timestamp"]),
+                    payload["user_input"],
+                    payload["gpt_response"],
+                    json.dumps(payload.get("emotions", {})),
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_session_interactions(self, user_id, session_id):
+        rows = self._conn().execute(
+            "SELECT * FROM interactions WHERE user_id = ? AND session_id = ? ORDER BY timestamp, seq",
+            (user_id, session_id),
+        ).fetchall()
+        return [self._interaction_row(row) for row in rows]
+
+    def list_interactions(self, user_id, session_id, limit, start_after=None, fields=None, descending=False):
+        order = "DESC" if descending else "ASC"
+        sql = "SELECT * FROM interactions WHERE user_id = ? AND session_id = ?"
+        params = [user_id, session_id]
+        if start_after:
+            ts, interaction_id = self._page_marker(start_after)
+            op = "<" if descending else ">"
+            sql += f" AND (timestamp {op} ? OR (timestamp = ? AND interaction_id {op} ?))"
+            params += [ts, ts, interaction_id]
+        sql += f" ORDER BY timestamp {order}, interaction_id {order} LIMIT ?"
+        params.append(limit + 1)
+        rows = self._conn().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = iso_cursor(_from_epoch(rows[-1]["timestamp"]), rows[-1]["interaction_id"])
+        wanted = [f for f in (fields or INTERACTION_FIELDS) if f in INTERACTION_FIELDS]
+        return [project(self._interaction_row(row), wanted) for row in rows], next_cursor
+
+    def interactions_version(self, user_id, session_id):
+        row = self._conn().execute(
+            "SELECT interaction_id FROM interactions WHERE user_id = ? AND session_id = ? "
+            "ORDER BY timestamp DESC, seq DESC LIMIT 1",
+            (user_id, session_id),
+        ).fetchone()
+        return row["interaction_id"] if row else None
+
+    def get_last_message_time(self, user_id, session_id):
+        row = self._conn().execute(
+            "SELECT MAX(timestamp) AS ts FROM interactions WHERE user_id = ? AND session_id = ?",
+            (user_id, session_id),
+        ).fetchone()
+        return _from_epoch(row["ts"]) if row is not None else None
+
+    # ----------------------------------------------------------
+    # Summaries
+    # ----------------------------------------------------------
+
+    def save_session_summary(self, user_id, session_id, summary, summarized_through=None):
+        fields = summary_fields(summary)
+        fields["topics"] = json.dumps(fields["topics"])
+        if fields.get("summary_through_at") is not None:
+            fields["summary_through_at"] = _to_epoch(fields["summary_through_at"])
+        now = _to_epoch(utc_now())
+        fields["summary_generated_at"] = now
+        fields["last_updated"] = now
+        through = _to_epoch(summarized_through) if summarized_through else None
+        # Column names come from summary_fields(), never from the caller
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        cur = self._conn().execute(
+            f"UPDATE sessions SET {assignments}, "
+            "needs_summary = CASE WHEN ? IS NOT NULL AND last_message_at > ? THEN 1 ELSE 0 END "
+            "WHERE user_id = ? AND session_id = ?",
+            (*fields.values(), through, through, user_id, session_id),
+        )
+        self._require_update(cur, user_id, session_id)
+
+    def find_idle_sessions(self, idle_before, limit, start_after=None):
+        sql = "SELECT user_id, session_id, last_message_at FROM sessions WHERE needs_summary = 1 AND last_message_at <= ?"
+        params = [_to_epoch(idle_before)]
+        if start_after:
+            ts, user_id, session_id = parse_idle_cursor(start_after)
+            sql += " AND (last_message_at, user_id, session_id) > (?, ?, ?)"
+            params += [_to_epoch(ts) if ts else 0.0, user_id, session_id]
+        sql += " ORDER BY last_message_at, user_id, session_id LIMIT ?"
+        params.append(limit + 1)
+        rows = self._conn().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = idle_cursor(_from_epoch(last["last_message_at"]), last["user_id"], last["session_id"])
+        return [(row["user_id"], row["session_id"]) for row in rows], next_cursor
+
+    def save_context_summary(self, user_id, session_id, summary, covered_turns):
+        cur = self._conn().execute(
+            "UPDATE sessions SET context_summary = ?, context_summary_turns = ?, context_summary_updated_at = ? "
+            "WHERE user_id = ? AND session_id = ?",
+            (summary, int(covered_turns), _to_epoch(utc_now()), user_id, session_id),
+        )
+        self._require_update(cur, user_id, session_id)
+
+    def get_user_recent_summaries(self, user_id, limit=3):
+        rows = self._conn().execute(
+            "SELECT * FROM sessions WHERE user_id = ? AND summary_generated_at IS NOT NULL "
+            "ORDER BY summary_generated_at DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [recent_summary_view(self._session_row(row)) for row in rows if row["summary"]]
+
+    def stats(self):
+        conn = self._conn()
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "sessions", "interactions")
+        }
+        return {"backend": self.name, "path": self.path, **counts}
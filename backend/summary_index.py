@@ -0,0 +1,237 @@
+# ===========================================================
+# backend/summary_index.py — Per-user embedding index of session summaries
+# ===========================================================
+# Cross-session memory: every stored session summary is embedded once
+# with a small CPU sentence-embedding model, and each turn injects the
+# top-k summaries by cosine similarity to the user's message, rather
+# than the N most recent ones regardless of topic.
+#
+# One index per user: an L2-normalized float32 matrix (one row per
+# session) plus the summary metadata, saved as an .npz file. Indexes
+# are loaded lazily into an LRU and reloaded when another worker
+# rewrites the file (mtime check), and writers serialize on a
+# per-user flock so concurrent summary jobs do not lose rows.
+# Switching MEMORY_EMBED_MODEL_ID starts a fresh set of indexes,
+# rebuilt by the same backfill that indexes users on first use.
+# ===========================================================
+
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+from metrics import span
+
+logger = get_logger(__name__)
+
+MEMORY_RETRIEVAL = os.getenv("MEMORY_RETRIEVAL", "1") == "1"
+MEMORY_EMBED_MODEL_ID = os.getenv("MEMORY_EMBED_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")
+MEMORY_INDEX_DIR = os.getenv(
+    "MEMORY_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_index")
+)
+MEMORY_INDEX_CACHE_USERS = int(os.getenv("MEMORY_INDEX_CACHE_USERS", "1000"))
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.0"))
+
+
+def embed_texts(extractor, texts) -> np.ndarray:
+    """Mean-pooled, L2-normalized sentence embeddings from a feature-extraction pipeline."""
+    # One text per forward pass, so no padding tokens leak into the mean
+    outputs = extractor(list(texts), truncation=True)
+    vectors = np.stack([np.asarray(out, dtype=np.float32)[0].mean(axis=0) for out in outputs])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _entry(session_id, summary: dict) -> dict:
+    return {
+        "session_id": session_id,
+        "summary": summary.get("summary", ""),
+        "emotional_trend": summary.get("emotional_trend", "unknown"),
+        "topics": summary.get("topics", []),
+        "confidence": float(summary.get("confidence", 0.8)),
+    }
+
+
+class _UserIndex:
+    """Immutable snapshot of one user's index; writers build a new one."""
+
+    def __init__(self, entries, vectors, mtime=None):
+        self.entries = entries
+        self.vectors = vectors
+        self.mtime = mtime
+        self.positions = {entry["session_id"]: i for i, entry in enumerate(entries)}
+
+
+class SummaryIndex:
+    """Lazily loaded, file-backed per-user cosine-similarity index."""
+
+    def __init__(self, embed_fn, model_id=MEMORY_EMBED_MODEL_ID, directory=MEMORY_INDEX_DIR,
+                 max_users=MEMORY_INDEX_CACHE_USERS, name="summary-index"):
+        self.embed_fn = embed_fn
+        # Vectors from different models are not comparable: one subdirectory per model
+        self.directory = os.path.join(directory, model_id.replace("/", "--"))
+        self.name = name
+        self._cache = LRUCache(max_entries=max_users, name=name)
+        self._lock = threading.Lock()
+
+        self.searches = 0
+        self.no_index = 0
+        self.loads = 0
+        self.embedded = 0
+        self.unchanged = 0
+
+    # -------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------
+
+    def _path(self, user_id):
+        # User ids are not guaranteed to be filename-safe
+        digest = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, digest + ".npz")
+
+    @contextmanager
+    def _file_lock(self, user_id):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(user_id) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, user_id):
+        """The user's current index, or None if none has been built yet."""
+        path = self._path(user_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(user_id)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        with np.load(path) as data:
+            index = _UserIndex(json.loads(str(data["entries"])), data["vectors"], mtime)
+        self._cache.set(user_id, index)
+        with self._lock:
+            self.loads += 1
+        return index
+
+    def _save(self, user_id, index):
+        # Write-then-rename so readers in other workers never see partial files
+        path = self._path(user_id)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, vectors=index.vectors, entries=np.array(json.dumps(index.entries)))
+        os.replace(tmp, path)
+        index.mtime = os.stat(path).st_mtime_ns
+        self._cache.set(user_id, index)
+
+    # -------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------
+
+    def has_index(self, user_id) -> bool:
+        return os.path.exists(self._path(user_id))
+
+    def add(self, user_id, session_id, summary: dict) -> int:
+        """Embed and upsert one session summary; returns how many were embedded."""
+        return self.add_many(user_id, [(session_id, summary)])
+
+    def add_many(self, user_id, summaries) -> int:
+        """
+        Upsert (session_id, summary) pairs, embedding only summaries whose
+        text changed. Always leaves an index file behind, even if empty.
+        """
+        with self._file_lock(user_id):
+            current = self._load(user_id)
+            entries = list(current.entries) if current else []
+            vectors = current.vectors if current else None
+            positions = dict(current.positions) if current else {}
+
+            pending = []
+            for session_id, summary in summaries:
+                entry = _entry(session_id, summary)
+                if not entry["summary"].strip():
+                    continue
+                pos = positions.get(session_id)
+                if pos is not None and entries[pos]["summary"] == entry["summary"]:
+                    entries[pos] = entry
+                    with self._lock:
+                        self.unchanged += 1
+                    continue
+                pending.append(entry)
+
+            if pending:
+                with span("memory.embed"):
+                    new_vectors = np.asarray(self.embed_fn([e["summary"] for e in pending]), dtype=np.float32)
+                vectors = new_vectors[:0] if vectors is None or not len(vectors) else vectors.copy()
+                appended = []
+                for entry, vector in zip(pending, new_vectors):
+                    pos = positions.get(entry["session_id"])
+                    if pos is None:
+                        positions[entry["session_id"]] = len(entries)
+                        entries.append(entry)
+                        appended.append(vector)
+                    else:
+                        entries[pos] = entry
+                        vectors[pos] = vector
+                if appended:
+                    vectors = np.vstack([vectors, np.stack(appended)])
+            elif current is not None and entries == current.entries:
+                return 0
+
+            if vectors is None:
+                vectors = np.zeros((0, 0), dtype=np.float32)
+            self._save(user_id, _UserIndex(entries, vectors))
+        with self._lock:
+            self.embedded += len(pending)
+        return len(pending)
+
+    def search(self, user_id, query, k=MEMORY_TOP_K, exclude=None, min_similarity=MEMORY_MIN_SIMILARITY):
+        """
+        Top-k summaries most similar to `query`, best first, each with a
+        "similarity" score. Returns None if the user has no index yet.
+        """
+        with self._lock:
+            self.searches += 1
+        index = self._load(user_id)
+        if index is None:
+            with self._lock:
+                self.no_index += 1
+            return None
+        if not index.entries:
+            return []
+        with span("memory.search"):
+            query_vector = np.asarray(self.embed_fn([query]), dtype=np.float32)[0]
+            scores = index.vectors @ query_vector
+            if exclude in index.positions:
+                scores[index.positions[exclude]] = -np.inf
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        return [
+            {**index.entries[i], "similarity": float(scores[i])}
+            for i in top
+            if np.isfinite(scores[i]) and scores[i] >= min_similarity
+        ]
+
+    def stats(self) -> dict:
+        cache = self._cache.stats()
+        with self._lock:
+            return {
+                "enabled": MEMORY_RETRIEVAL,
+                "users_cached": cache["entries"],
+                "searches": self.searches,
+                "no_index": self.no_index,
+                "loads": self.loads,
+                "embedded": self.embedded,
+                "unchanged": self.unchanged,
+            }
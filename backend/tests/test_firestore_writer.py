@@ -0,0 +1,208 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+
+from firestore_writer import DEAD_LETTER_FILE, FirestoreWriter  # noqa: E402
+
+
+class FakeRef:
+    def __init__(self, path=()):
+        self.path = path
+
+    def collection(self, name):
+        return FakeRef(self.path + (name,))
+
+    def document(self, name):
+        return FakeRef(self.path + (name,))
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(("merge" if merge else "set", ref.path, data))
+
+    def update(self, ref, data):
+        self.ops.append(("update", ref.path, data))
+
+    def commit(self):
+        self.db.commit_calls += 1
+        if self.db.unavailable:
+            raise google_exceptions.ServiceUnavailable("firestore down")
+        for kind, path, _ in self.ops:
+            if kind == "update" and path not in self.db.docs:
+                raise google_exceptions.NotFound(f"No document to update: {'/'.join(path)}")
+        for kind, path, data in self.ops:  # all or nothing, like a WriteBatch
+            if kind == "set":
+                self.db.docs[path] = dict(data)
+            else:
+                self.db.docs.setdefault(path, {}).update(data)
+
+
+class FakeDB(FakeRef):
+    def __init__(self):
+        super().__init__()
+        self.docs = {}
+        self.unavailable = False
+        self.commit_calls = 0
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def _writer(db, journal_dir):
+    # Thresholds high enough that only explicit flush() calls commit
+    return FirestoreWriter(db, write_behind=True, max_ops=10 ** 6, max_delay_ms=10 ** 9,
+                           journal_dir=str(journal_dir))
+
+
+def _crash(writer):
+    """Simulate the process dying: its buffer is gone and its journal lock released."""
+    writer._buffer = []
+    writer._journal.close()
+
+
+def _journals(journal_dir):
+    return sorted(name for name in os.listdir(journal_dir) if name.startswith("writes-"))
+
+
+def _set(doc_id, **data):
+    return ("set", ("conversations", doc_id), data)
+
+
+def _update(doc_id, **data):
+    return ("update", ("conversations", doc_id), data)
+
+
+def test_write_through_commits_immediately():
+    db = FakeDB()
+    writer = FirestoreWriter(db)
+    writer.write([_set("u1", n=1), _set("u2", n=2)])
+    assert db.docs == {("conversations", "u1"): {"n": 1}, ("conversations", "u2"): {"n": 2}}
+    assert writer.stats()["commits"] == 1
+
+
+def test_write_behind_buffers_until_flush(tmp_path):
+    db = FakeDB()
+    writer = _writer(db, tmp_path)
+    writer.write([_set("u1", n=1)])
+    writer.write([_update("u1", n=2)])
+    assert db.docs == {}
+
+    assert writer.flush() == 2
+    assert db.docs == {("conversations", "u1"): {"n": 2}}
+    assert writer.stats()["pending_ops"] == 0
+    assert os.path.getsize(writer._journal_path) == 0
+
+
+def test_bad_op_is_dead_lettered_without_blocking_others(tmp_path):
+    db = FakeDB()
+    writer = _writer(db, tmp_path)
+    writer.write([_set(f"u{i}", n=i) for i in range(6)])
+    writer.write([_update("missing", n=99)])  # e.g. a made-up session id
+    writer.write([_set("u6", n=6)])
+
+    assert writer.flush() == 8
+    assert len(db.docs) == 7
+    assert ("conversations", "missing") not in db.docs
+    stats = writer.stats()
+    assert stats["dead_lettered"] == 1
+    assert stats["pending_ops"] == 0
+    with open(tmp_path / DEAD_LETTER_FILE) as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["op"] == ["update", ["conversations", "missing"], {"n": 99}]
+    assert "No document to update" in record["error"]
+
+
+def test_transient_failure_keeps_buffer_and_journal(tmp_path):
+    db = FakeDB()
+    writer = _writer(db, tmp_path)
+    writer.write([_set("u1", n=1)])
+    db.unavailable = True
+
+    assert writer.flush() == 0
+    assert writer.stats()["pending_ops"] == 1
+    assert writer.stats()["dead_lettered"] == 0
+    assert db.commit_calls == 1  # no bisection on transient errors
+
+    db.unavailable = False
+    assert writer.flush() == 1
+    assert db.docs == {("conversations", "u1"): {"n": 1}}
+
+
+def test_crashed_journal_is_replayed_even_when_pid_is_reused(tmp_path):
+    crashed = _writer(FakeDB(), tmp_path)
+    crashed.write([_set("u1", n=1), _update("u1", n=2)])
+    _crash(crashed)
+
+    # Same process, hence same pid, as the crashed writer
+    db = FakeDB()
+    restarted = _writer(db, tmp_path)
+
+    assert db.docs == {("conversations", "u1"): {"n": 2}}
+    assert restarted.stats()["replayed"] == 2
+    assert _journals(tmp_path) == []
+
+
+def test_live_writers_journal_is_not_replayed(tmp_path):
+    live = _writer(FakeDB(), tmp_path)
+    live.write([_set("u1", n=1)])
+
+    db = FakeDB()
+    _writer(db, tmp_path)
+
+    assert db.docs == {}
+    assert _journals(tmp_path) == [os.path.basename(live._journal_path)]
+    assert live.flush() == 1
+
+
+def test_replay_dead_letters_bad_ops(tmp_path):
+    crashed = _writer(FakeDB(), tmp_path)
+    crashed.write([_update("missing", n=1), _set("u1", n=1)])
+    _crash(crashed)
+
+    db = FakeDB()
+    restarted = _writer(db, tmp_path)
+
+    assert db.docs == {("conversations", "u1"): {"n": 1}}
+    assert restarted.stats()["dead_lettered"] == 1
+    assert _journals(tmp_path) == []
+
+
+def test_replay_keeps_unsent_ops_when_firestore_is_down(tmp_path):
+    crashed = _writer(FakeDB(), tmp_path)
+    crashed.write([_set("u1", n=1)])
+    _crash(crashed)
+
+    down = FakeDB()
+    down.unavailable = True
+    _writer(down, tmp_path)
+    assert len(_journals(tmp_path)) == 1
+
+    db = FakeDB()
+    _writer(db, tmp_path)
+    assert db.docs == {("conversations", "u1"): {"n": 1}}
+    assert _journals(tmp_path) == []
+
+
+def test_journal_stays_owned_across_rewrites(tmp_path):
+    db = FakeDB()
+    writer = _writer(db, tmp_path)
+    for i in range(3):
+        writer.write([_set(f"u{i}", n=i)])
+        writer.flush()
+    writer.write([_set("u3", n=3)])
+
+    _writer(FakeDB(), tmp_path)  # must not steal the live journal
+    assert _journals(tmp_path) == [os.path.basename(writer._journal_path)]
+
+    _crash(writer)
+    replay_db = FakeDB()
+    _writer(replay_db, tmp_path)
+    assert replay_db.docs == {("conversations", "u3"): {"n": 3}}
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # workers=0: jobs only run when a test calls run_once()
+    return JobQueue(str(tmp_path / "jobs.db"), workers=0, max_attempts=3, backoff_seconds=0.0)
+
+
+def _rows(queue):
+    return [dict(row) for row in queue._conn().execute("SELECT * FROM jobs ORDER BY id")]
+
+
+def _expire_leases(queue):
+    queue._conn().execute("UPDATE jobs SET lease_until = ? WHERE status = 'running'", (time.time() - 1,))
+
+
+def test_enqueue_dedupes_pending_jobs_and_refreshes_payload(queue):
+    seen = []
+    queue.register("title", seen.append)
+
+    first = queue.enqueue("title", {"text": "old"}, dedupe_key="title:u:s")
+    second = queue.enqueue("title", {"text": "new"}, dedupe_key="title:u:s")
+
+    assert first == second
+    assert queue.stats()["counts"]["deduplicated"] == 1
+    assert queue.run_once()
+    assert not queue.run_once()
+    assert seen == [{"text": "new"}]
+
+
+def test_enqueue_while_running_adds_a_second_job(queue):
+    queue.register("title", lambda payload: None)
+    queue.enqueue("title", {"n": 1}, dedupe_key="k")
+    running = queue._claim()
+
+    queue.enqueue("title", {"n": 2}, dedupe_key="k")
+
+    assert [row["status"] for row in _rows(queue)] == ["running", "pending"]
+    queue._execute(running)
+    assert queue.run_once()
+    assert queue.depth() == {"done": 2}
+
+
+def test_failed_job_is_retried_then_marked_failed(queue):
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("gemini down")
+
+    queue.register("summary", flaky)
+    queue.enqueue("summary", {"session": "s"})
+
+    while queue.run_once():
+        pass
+
+    assert len(calls) == 3
+    row = _rows(queue)[0]
+    assert row["status"] == "failed"
+    assert row["attempts"] == 3
+    assert "gemini down" in row["last_error"]
+    assert queue.stats()["counts"]["retried"] == 2
+
+
+def test_retry_backoff_delays_the_next_attempt(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), workers=0, backoff_seconds=60.0)
+    queue.register("summary", lambda payload: 1 / 0)
+    queue.enqueue("summary", {})
+
+    assert queue.run_once()
+    assert not queue.run_once()  # next attempt is 30-90s away
+    row = _rows(queue)[0]
+    assert row["status"] == "pending"
+    assert row["run_after"] > time.time() + 25
+
+
+def test_job_without_handler_fails(queue):
+    queue.enqueue("unknown", {})
+    while queue.run_once():
+        pass
+    row = _rows(queue)[0]
+    assert row["status"] == "failed"
+    assert "No handler registered" in row["last_error"]
+
+
+def test_expired_lease_is_requeued(queue):
+    seen = []
+    queue.register("title", seen.append)
+    queue.enqueue("title", {"n": 1}, dedupe_key="k")
+    assert queue._claim() is not None  # its worker dies without finishing
+
+    _expire_leases(queue)
+
+    assert queue.run_once()
+    assert seen == [{"n": 1}]
+    assert _rows(queue)[0]["status"] == "done"
+
+
+def test_expired_lease_with_pending_twin_does_not_wedge_the_queue(queue):
+    seen = []
+    queue.register("title", seen.append)
+    queue.enqueue("title", {"n": 1}, dedupe_key="k")
+    assert queue._claim() is not None  # its worker dies without finishing
+    queue.enqueue("title", {"n": 2}, dedupe_key="k")
+
+    _expire_leases(queue)
+
+    assert queue.run_once()
+    assert not queue.run_once()
+    assert seen == [{"n": 2}]
+    first, second = _rows(queue)
+    assert first["status"] == "failed"
+    assert "superseded" in first["last_error"]
+    assert second["status"] == "done"
+
+
+def test_two_expired_twins_requeue_only_one(queue):
+    seen = []
+    queue.register("title", seen.append)
+    queue.enqueue("title", {"n": 1}, dedupe_key="k")
+    queue._claim()
+    queue.enqueue("title", {"n": 2}, dedupe_key="k")
+    queue._claim()
+
+    _expire_leases(queue)
+
+    while queue.run_once():
+        pass
+    assert len(seen) == 1
+    assert sorted(row["status"] for row in _rows(queue)) == ["done", "failed"]
@@ -0,0 +1,97 @@
+import os
+import re
+
+import pytest
+
+from metrics import Registry
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "metrics.db")
+
+
+def _worker(db_path, token):
+    # Two Registry instances on one file stand in for two gunicorn workers
+    registry = Registry(db_path)
+    registry._process = token
+    return registry
+
+
+def _samples(text, name):
+    return {
+        line.split(" ")[0]: float(line.split(" ")[1])
+        for line in text.splitlines()
+        if line.startswith(name) and not line.startswith("#")
+    }
+
+
+def test_counters_and_histograms_are_summed_across_workers(db_path):
+    a, b = _worker(db_path, "a"), _worker(db_path, "b")
+    for registry, amount in ((a, 2), (b, 3)):
+        registry.counter("requests_total", "Requests").inc(amount, route="/text")
+        registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.05 * amount)
+
+    a.flush()
+    text = b.render()
+
+    assert _samples(text, "mindmate_requests_total") == {'mindmate_requests_total{route="/text"}': 5.0}
+    latency = _samples(text, "mindmate_latency_seconds")
+    assert latency["mindmate_latency_seconds_count"] == 2
+    assert latency['mindmate_latency_seconds_bucket{le="0.1"}'] == 1
+    assert latency['mindmate_latency_seconds_bucket{le="1"}'] == 2
+    assert latency["mindmate_latency_seconds_sum"] == pytest.approx(0.25)
+    assert "pid=" not in text.split("# TYPE mindmate_latency_seconds")[1]
+
+
+def test_flush_replaces_rather_than_adds(db_path):
+    a, b = _worker(db_path, "a"), _worker(db_path, "b")
+    counter = a.counter("requests_total")
+    b.counter("requests_total")
+    counter.inc()
+    a.flush()
+    counter.inc()
+    a.flush()
+
+    assert _samples(b.render(), "mindmate_requests_total") == {"mindmate_requests_total": 2.0}
+
+
+def test_gauges_stay_per_worker(db_path):
+    a, b = _worker(db_path, "a"), _worker(db_path, "b")
+    a.register_gauge("models_ready", lambda: 1, "ready")
+    b.register_gauge("models_ready", lambda: 0, "ready")
+    a.flush()
+
+    text = b.render()
+
+    assert len(re.findall(r"^mindmate_models_ready\{pid=", text, re.M)) == 2
+    assert text.count("# TYPE mindmate_models_ready gauge") == 1
+
+
+def test_stale_gauges_are_dropped(db_path):
+    a, b = _worker(db_path, "a"), _worker(db_path, "b")
+    a.register_gauge("queue_depth", lambda: 7)
+    a.flush()
+    b.flush_seconds = -1  # everything written before now counts as stale
+
+    assert "mindmate_queue_depth" not in b.render()
+
+
+def test_without_shared_db_renders_local_series_with_pid():
+    registry = Registry(None)
+    registry.counter("requests_total").inc()
+
+    text = registry.render()
+
+    assert f'mindmate_requests_total{{pid="{os.getpid()}"}} 1' in text
+
+
+def test_clear_shared_drops_previous_run(db_path):
+    a, b = _worker(db_path, "a"), _worker(db_path, "b")
+    a.counter("requests_total").inc(4)
+    b.counter("requests_total")
+    a.flush()
+
+    b.clear_shared()
+
+    assert _samples(b.render(), "mindmate_requests_total") == {}
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage import memory_store, sqlite_store
+from storage.base import decode_cursor
+from storage.memory_store import MemoryStore
+from storage.sqlite_store import SQLiteStore
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    # Pin the clock so session last_updated values are known (and some tie)
+    clock = {"now": T0}
+    for module in (memory_store, sqlite_store):
+        monkeypatch.setattr(module, "utc_now", lambda: clock["now"])
+    backend = MemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "store.db"))
+    backend.clock = clock
+    return backend
+
+
+def _make_sessions(store, user_id="u1"):
+    # s0..s5: pairs share a timestamp so the session_id tiebreak is exercised
+    store.ensure_user_exists(user_id)
+    for i in range(6):
+        store.clock["now"] = T0 + timedelta(minutes=i // 2)
+        store.create_session(user_id, f"s{i}")
+    return ["s5", "s4", "s3", "s2", "s1", "s0"]
+
+
+def _make_interactions(store, user_id="u1", session_id="s"):
+    store.ensure_user_exists(user_id)
+    store.create_session(user_id, session_id)
+    ids = []
+    for i in range(7):
+        interaction_id = f"i{i}"
+        store.save_interaction(user_id, session_id, {
+            "interaction_id": interaction_id,
+            "timestamp": T0 + timedelta(seconds=i // 2),
+            "user_input": f"q{i}",
+            "gpt_response": f"a{i}",
+            "emotions": {},
+        })
+        ids.append(interaction_id)
+    return ids
+
+
+def _walk(fetch, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = fetch(limit, cursor)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def test_list_sessions_walks_every_session_newest_first(store):
+    expected = _make_sessions(store)
+
+    pages = _walk(lambda limit, cursor: store.list_sessions("u1", limit, cursor), limit=4)
+
+    assert [len(p) for p in pages] == [4, 2]
+    assert [s["session_id"] for page in pages for s in page] == expected
+
+
+def test_list_sessions_exact_multiple_has_no_trailing_cursor(store):
+    _make_sessions(store)
+
+    page, cursor = store.list_sessions("u1", 3)
+    page, cursor = store.list_sessions("u1", 3, cursor)
+
+    assert [s["session_id"] for s in page] == ["s2", "s1", "s0"]
+    assert cursor is None
+
+
+def test_list_sessions_projects_fields(store):
+    _make_sessions(store)
+
+    page, _ = store.list_sessions("u1", 2, fields=["session_id", "title", "last_updated"])
+
+    assert set(page[0]) == {"session_id", "title", "last_updated"}
+    assert page[0]["last_updated"] == T0 + timedelta(minutes=2)
+
+
+def test_list_sessions_cursor_is_keyset_not_offset(store):
+    _make_sessions(store)
+    page, cursor = store.list_sessions("u1", 2)
+
+    # A session touched after the first page was read must not shift the next page
+    store.clock["now"] = T0 + timedelta(hours=1)
+    store.create_session("u1", "s-new")
+    page, _ = store.list_sessions("u1", 2, cursor)
+
+    assert [s["session_id"] for s in page] == ["s3", "s2"]
+    ts, session_id = decode_cursor(cursor)
+    assert (ts, session_id) == ((T0 + timedelta(minutes=2)).isoformat(), "s4")
+
+
+def test_list_interactions_ascending_and_descending(store):
+    ids = _make_interactions(store)
+
+    ascending = _walk(lambda limit, cursor: store.list_interactions("u1", "s", limit, cursor), limit=3)
+    descending = _walk(
+        lambda limit, cursor: store.list_interactions("u1", "s", limit, cursor, descending=True), limit=3
+    )
+
+    assert [len(p) for p in ascending] == [3, 3, 1]
+    assert [i["interaction_id"] for page in ascending for i in page] == ids
+    assert [i["interaction_id"] for page in descending for i in page] == ids[::-1]
+
+
+def test_list_interactions_projects_fields(store):
+    _make_interactions(store)
+
+    page, cursor = store.list_interactions("u1", "s", 2, fields=["interaction_id", "timestamp"])
+
+    assert page == [
+        {"interaction_id": "i0", "timestamp": T0},
+        {"interaction_id": "i1", "timestamp": T0},
+    ]
+    assert cursor is not None
+
+
+def test_empty_and_malformed_cursors(store):
+    store.ensure_user_exists("u1")
+
+    assert store.list_sessions("u1", 10) == ([], None)
+    with pytest.raises(ValueError):
+        store.list_sessions("u1", 10, "not-a-cursor")
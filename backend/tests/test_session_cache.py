@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    import firebase_utils
+    from storage.memory_store import MemoryStore
+    monkeypatch.setattr(firebase_utils, "store", firebase_utils._TimedStore(MemoryStore()))
+    firebase_utils.session_cache.clear()
+    firebase_utils.store.ensure_user_exists("u")
+    firebase_utils.store.create_session("u", "s")
+    return firebase_utils
+
+
+def _say(db, n):
+    assert db.save_interaction_to_session("u", "s", f"question {n}", f"answer {n}", {}, {})
+
+
+def _texts(interactions):
+    return [i["user_input"] for i in interactions]
+
+
+def test_save_during_a_cold_read_does_not_cache_a_stale_transcript(db, monkeypatch):
+    _say(db, 1)
+    backend = db.store._backend
+    real_read = backend.get_session_interactions
+
+    def read_then_interleave(user_id, session_id):
+        snapshot = real_read(user_id, session_id)
+        _say(db, 2)  # another request thread saves before the reader caches its snapshot
+        return snapshot
+
+    monkeypatch.setattr(backend, "get_session_interactions", read_then_interleave)
+    assert _texts(db.get_session_interactions("u", "s")) == ["question 1"]
+    monkeypatch.setattr(backend, "get_session_interactions", real_read)
+
+    _say(db, 3)
+    assert _texts(db.get_session_interactions("u", "s")) == ["question 1", "question 2", "question 3"]
+
+
+def test_save_appends_to_a_warm_transcript_once(db, monkeypatch):
+    _say(db, 1)
+    db.get_session_interactions("u", "s")
+    _say(db, 2)
+
+    # Served from the cache: the store is not read again
+    monkeypatch.setattr(db.store._backend, "get_session_interactions", lambda *a: pytest.fail("cache miss"))
+    assert _texts(db.get_session_interactions("u", "s")) == ["question 1", "question 2"]
+
+
+def test_append_skips_a_turn_the_cached_read_already_holds(db):
+    _say(db, 1)
+    payload = db.store.get_session_interactions("u", "s")[0]
+    db.get_session_interactions("u", "s")
+
+    db._append_to_cached_transcript(("u", "s"), payload)
+
+    assert _texts(db.get_session_interactions("u", "s")) == ["question 1"]
@@ -0,0 +1,181 @@
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("tiktoken")
+
+PLACEHOLDER = {"summary": "No summary available.", "emotional_trend": "unclear", "topics": [], "confidence": 0.0}
+
+
+class FakeGemini:
+    """Records what each summary call was sent and replies from a queue."""
+
+    def __init__(self):
+        self.full_calls, self.update_calls = [], []
+        self.full_replies, self.update_replies = [], []
+
+    def summarize_session(self, turns):
+        self.full_calls.append(turns)
+        return dict(self.full_replies.pop(0))
+
+    def update_session_summary(self, previous, turns):
+        self.update_calls.append((previous, turns))
+        reply = self.update_replies.pop(0)
+        return dict(reply) if reply is not None else None
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    gemini = FakeGemini()
+    fake_module = types.ModuleType("GeminiUtils")
+    fake_module.gemini_summarize_session = gemini.summarize_session
+    fake_module.gemini_update_session_summary = gemini.update_session_summary
+    fake_module.gemini_compact_conversation = lambda previous, turns: None
+    monkeypatch.setitem(sys.modules, "GeminiUtils", fake_module)
+    for name in ("session_summarizer", "context_builder"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    import firebase_utils
+    from storage.memory_store import MemoryStore
+    monkeypatch.setattr(firebase_utils, "store", firebase_utils._TimedStore(MemoryStore()))
+    firebase_utils.session_cache.clear()
+    import session_summarizer
+
+    firebase_utils.ensure_user_exists("u")
+    firebase_utils.store.create_session("u", "s")
+    yield types.SimpleNamespace(
+        db=firebase_utils, gemini=gemini, summarizer=session_summarizer.SessionSummarizer(full_every=10),
+    )
+    # Both were imported against the fake GeminiUtils; later imports get the real one
+    for name in ("session_summarizer", "context_builder"):
+        sys.modules.pop(name, None)
+
+
+def _say(env, n):
+    env.db.save_interaction_to_session("u", "s", f"question {n}", f"answer {n}", {}, {})
+
+
+def _run(env):
+    """What the session_summary job does: summarize, then save with the high-water mark."""
+    session = env.db.get_session_details("u", "s")
+    summary = env.summarizer.summarize("u", "s", session)
+    assert env.db.save_session_summary("u", "s", summary, summarized_through=summary["through_at"])
+    return summary
+
+
+def _reply(text):
+    return {"summary": text, "emotional_trend": "stable", "topics": ["t"], "confidence": 0.9}
+
+
+def test_first_run_is_full_and_records_the_high_water_mark(env):
+    _say(env, 1)
+    _say(env, 2)
+    env.gemini.full_replies.append(_reply("first"))
+
+    summary = _run(env)
+    session = env.db.get_session_details("u", "s")
+
+    last = env.db.get_session_interactions("u", "s")[-1]
+    assert len(env.gemini.full_calls[0]) == 4
+    assert (summary["through_id"], summary["through_at"]) == (last["interaction_id"], last["timestamp"])
+    assert session["summary"] == "first"
+    assert session["summary_through_id"] == last["interaction_id"]
+    assert session["needs_summary"] is False
+
+
+def test_incremental_run_sends_only_turns_after_the_mark(env):
+    _say(env, 1)
+    env.gemini.full_replies.append(_reply("first"))
+    _run(env)
+    _say(env, 2)
+    _say(env, 3)
+    env.gemini.update_replies.append(_reply("second"))
+
+    _run(env)
+
+    previous, turns = env.gemini.update_calls[0]
+    assert previous["summary"] == "first"
+    assert [t["text"] for t in turns] == ["question 2", "answer 2", "question 3", "answer 3"]
+    session = env.db.get_session_details("u", "s")
+    assert session["summary"] == "second"
+    assert session["summary_incremental_runs"] == 1
+    assert env.summarizer.stats()["runs"] == {"incremental": 1, "full": 1}
+
+
+def test_nothing_new_resaves_without_calling_gemini(env):
+    _say(env, 1)
+    env.gemini.full_replies.append(_reply("first"))
+    _run(env)
+    env.db.store._backend._sessions["u"]["s"]["needs_summary"] = True
+
+    summary = _run(env)
+
+    assert summary["summary"] == "first"
+    assert len(env.gemini.full_calls) == 1 and not env.gemini.update_calls
+    assert env.db.get_session_details("u", "s")["needs_summary"] is False
+
+
+def test_message_after_the_mark_keeps_the_session_flagged(env):
+    _say(env, 1)
+    env.gemini.full_replies.append(_reply("first"))
+    session = env.db.get_session_details("u", "s")
+    summary = env.summarizer.summarize("u", "s", session)
+    _say(env, 2)  # arrives while Gemini was working
+
+    env.db.save_session_summary("u", "s", summary, summarized_through=summary["through_at"])
+
+    assert env.db.get_session_details("u", "s")["needs_summary"] is True
+
+
+def test_failed_update_falls_back_to_a_full_run(env):
+    _say(env, 1)
+    env.gemini.full_replies.append(_reply("first"))
+    _run(env)
+    _say(env, 2)
+    env.gemini.update_replies.append(None)
+    env.gemini.full_replies.append(_reply("full again"))
+
+    _run(env)
+
+    assert len(env.gemini.full_calls[1]) == 4
+    assert env.db.get_session_details("u", "s")["summary"] == "full again"
+    assert env.summarizer.stats()["fallbacks"] == 1
+
+
+@pytest.mark.parametrize("update_reply", [None, dict(PLACEHOLDER, summary="Unsure.")])
+def test_gemini_failure_raises_and_leaves_the_stored_summary(env, update_reply):
+    _say(env, 1)
+    env.gemini.full_replies.append(_reply("good"))
+    _run(env)
+    before = env.db.get_session_details("u", "s")
+    _say(env, 2)
+    env.gemini.update_replies.append(update_reply)
+    env.gemini.full_replies.append(PLACEHOLDER)
+
+    with pytest.raises(RuntimeError):
+        env.summarizer.summarize("u", "s", env.db.get_session_details("u", "s"))
+
+    after = env.db.get_session_details("u", "s")
+    assert after["summary"] == "good"
+    assert after["summary_through_id"] == before["summary_through_id"]
+    assert after["needs_summary"] is True
+    assert env.summarizer.stats()["failures"] == 1
+
+
+def test_failure_on_first_run_saves_nothing(env):
+    _say(env, 1)
+    env.gemini.full_replies.append(PLACEHOLDER)
+
+    with pytest.raises(RuntimeError):
+        env.summarizer.summarize("u", "s", env.db.get_session_details("u", "s"))
+
+    session = env.db.get_session_details("u", "s")
+    assert session["summary"] is None
+    assert session["needs_summary"] is True
+
+
+def test_session_without_interactions_returns_none(env):
+    assert env.summarizer.summarize("u", "s", env.db.get_session_details("u", "s")) is None
+    assert not env.gemini.full_calls
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from session_sweeper import SessionSweeper
+from storage.memory_store import MemoryStore
+from storage.sqlite_store import SQLiteStore
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "store.db"))
+
+
+def _idle_session(store, user_id, session_id, minutes):
+    store.ensure_user_exists(user_id)
+    store.create_session(user_id, session_id)
+    store.save_interaction(user_id, session_id, {
+        "interaction_id": f"{session_id}-1",
+        "timestamp": T0 + timedelta(minutes=minutes),
+        "user_input": "hi",
+        "gpt_response": "hello",
+        "emotions": {},
+    })
+
+
+def test_find_idle_sessions_pages_oldest_first(store):
+    # Two sessions share a timestamp across users, so the (user, session) tiebreak matters
+    _idle_session(store, "u2", "a", 0)
+    _idle_session(store, "u1", "b", 0)
+    _idle_session(store, "u1", "c", 1)
+    _idle_session(store, "u1", "recent", 60)
+    cutoff = T0 + timedelta(minutes=30)
+
+    first, cursor = store.find_idle_sessions(cutoff, 2)
+    second, end = store.find_idle_sessions(cutoff, 2, cursor)
+
+    assert first == [("u1", "b"), ("u2", "a")]
+    assert second == [("u1", "c")]
+    assert end is None
+
+
+def test_sweep_reaches_sessions_behind_a_stuck_batch(store):
+    # Three old sessions whose summaries keep failing sit at the head of the index
+    for i in range(3):
+        _idle_session(store, "u", f"stuck{i}", i)
+    _idle_session(store, "u", "newer", 10)
+    enqueued = []
+    sweeper = SessionSweeper(
+        lambda idle_before, limit, start_after: store.find_idle_sessions(T0 + timedelta(hours=1), limit, start_after),
+        lambda user_id, session_id: enqueued.append(session_id),
+        batch_size=2,
+    )
+
+    sweeper.sweep_once()
+    sweeper.sweep_once()
+    sweeper.sweep_once()
+
+    assert enqueued == ["stuck0", "stuck1", "stuck2", "newer"]
+
+
+def test_sweep_wraps_to_the_oldest_after_the_last_page(store):
+    for i in range(3):
+        _idle_session(store, "u", f"s{i}", i)
+    pages = []
+
+    def find(idle_before, limit, start_after):
+        page, cursor = store.find_idle_sessions(T0 + timedelta(hours=1), limit, start_after)
+        pages.append([session_id for _, session_id in page])
+        return page, cursor
+
+    sweeper = SessionSweeper(find, lambda user_id, session_id: None, batch_size=2)
+    for _ in range(3):
+        sweeper.sweep_once()
+
+    assert pages == [["s0", "s1"], ["s2"], ["s0", "s1"]]
@@ -0,0 +1,461 @@
+# ===========================================================
+# backend/tts_service.py — Pluggable, cached, streaming TTS
+# ===========================================================
+# Engines (TTS_ENGINE):
+#   gtts    → Google Translate TTS, MP3 (default)
+#   pyttsx3 → offline system synthesizer (eSpeak on Linux), WAV
+#
+# Client-supplied lang / voice are checked against what the engine
+# supports before any cache key is computed or request is made
+# (gTTS puts the voice into the Google hostname it calls).
+#
+# Synthesized clips are keyed by sha256(engine, language, voice,
+# text) and kept in two tiers:
+#   memory → LRUCache bounded by entries and bytes
+#   disk   → one file per key, capped by total size (oldest
+#            files evicted first; hits refresh the mtime)
+# Concurrent misses for the same key share one synthesis.
+#
+# Streaming splits a reply into sentences, synthesizes them on
+# a bounded pool (each sentence is cached on its own) and yields
+# the audio in order as soon as each piece is ready.
+# ===========================================================
+
+import io
+import os
+import re
+import json
+import wave
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+from metrics import span
+
+logger = get_logger(__name__)
+
+TTS_DEFAULT_LANG = "en"
+TTS_ENGINES = ("gtts", "pyttsx3")
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts").strip().lower()
+TTS_STREAM_CONCURRENCY = int(os.getenv("TTS_STREAM_CONCURRENCY", "3"))
+TTS_SENTENCE_MAX_CHARS = int(os.getenv("TTS_SENTENCE_MAX_CHARS", "300"))
+
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "256"))
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "32"))
+TTS_DISK_CACHE_DIR = os.getenv(
+    "TTS_DISK_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+)
+TTS_DISK_CACHE_MAX_MB = float(os.getenv("TTS_DISK_CACHE_MAX_MB", "512"))
+
+
+def tts_key(text: str, lang: str, voice: str, engine: str) -> str:
+    """Stable content hash identifying one synthesized clip."""
+    raw = json.dumps([engine, lang, voice, text], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ===========================================================
+# Sentence Splitting
+# ===========================================================
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"')\]]))\s+|\n{2,}")
+_MIN_SENTENCE_CHARS = 24
+
+
+def split_sentences(text: str, max_chars: int = TTS_SENTENCE_MAX_CHARS) -> list:
+    """
+    Split text into speakable sentences. Very short fragments are merged
+    into their neighbour (fewer, more natural-sounding clips) and very
+    long sentences are cut at the last space before max_chars.
+    """
+    pieces = []
+    for part in _SENTENCE_END.split(text.strip()):
+        part = " ".join(part.split())
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(part[:cut])
+            part = part[cut:].strip()
+        if part:
+            pieces.append(part)
+
+    sentences = []
+    for piece in pieces:
+        if sentences and len(sentences[-1]) < _MIN_SENTENCE_CHARS and len(sentences[-1]) + len(piece) < max_chars:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+# ===========================================================
+# Engines
+# ===========================================================
+
+class GTTSEngine:
+    """Google Translate TTS. Voices are accents, selected by host tld."""
+
+    name = "gtts"
+    mimetype = "audio/mpeg"
+    suffix = ".mp3"
+    default_voice = "com"
+    # gTTS requests https://translate.google.<tld>/, so only known Google tlds are allowed
+    voices = (
+        "com", "us", "co.uk", "com.au", "ca", "co.in", "ie", "co.za", "com.ng",
+        "com.mx", "es", "fr", "com.br", "pt",
+    )
+
+    _langs = None
+
+    def validate(self, lang, voice):
+        if voice not in self.voices:
+            raise ValueError(f"Unsupported voice '{voice}'")
+        if self._langs is None:
+            from gtts.lang import tts_langs
+            GTTSEngine._langs = frozenset(tts_langs())
+        if lang not in self._langs:
+            raise ValueError(f"Unsupported language '{lang}'")
+
+    def synthesize(self, text, lang, voice) -> bytes:
+        from gtts import gTTS
+        mp3_fp = io.BytesIO()
+        gTTS(text=text, lang=lang, tld=voice).write_to_fp(mp3_fp)
+        return mp3_fp.getvalue()
+
+    def stream(self, clips):
+        # MP3 is a sequence of self-contained frames, so clips concatenate as-is
+        return clips
+
+
+class Pyttsx3Engine:
+    """Offline synthesis through pyttsx3 (eSpeak/NSSpeech/SAPI5), rendered to WAV."""
+
+    name = "pyttsx3"
+    mimetype = "audio/wav"
+    suffix = ".wav"
+    default_voice = "default"
+
+    def __init__(self):
+        # pyttsx3 drivers are not thread-safe; one engine, one caller at a time
+        self._lock = threading.Lock()
+        self._engine = None
+        self._pid = None
+        self._system_voice = None
+        self._voice_ids = frozenset()
+
+    def _get_engine(self):
+        # Caller holds self._lock
+        if self._engine is None or self._pid != os.getpid():
+            import pyttsx3
+            self._engine = pyttsx3.init()
+            self._pid = os.getpid()
+            self._system_voice = self._engine.getProperty("voice")
+            self._voice_ids = frozenset(v.id for v in self._engine.getProperty("voices"))
+        return self._engine
+
+    def validate(self, lang, voice):
+        if voice == self.default_voice:
+            return
+        with self._lock:
+            self._get_engine()
+            known = voice in self._voice_ids
+        if not known:
+            raise ValueError(f"Unsupported voice '{voice}'")
+
+    def synthesize(self, text, lang, voice) -> bytes:
+        fd, path = tempfile.mkstemp(prefix="tts-", suffix=self.suffix)
+        os.close(fd)
+        try:
+            with self._lock:
+                engine = self._get_engine()
+                # The engine is shared: set the voice on every call so none leaks into the next
+                engine.setProperty("voice", self._system_voice if voice == self.default_voice else voice)
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stream(self, clips):
+        """
+        Re-frame a series of WAV clips as one open-ended WAV stream: a single
+        header with unknown (0xFFFFFFFF) lengths, then each clip's PCM frames.
+        """
+        first = True
+        for clip in clips:
+            with wave.open(io.BytesIO(clip), "rb") as wav:
+                if first:
+                    yield _streaming_wav_header(wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+                    first = False
+                yield wav.readframes(wav.getnframes())
+
+
+def _streaming_wav_header(channels, sample_width, sample_rate) -> bytes:
+    unknown = 0xFFFFFFFF
+    block_align = channels * sample_width
+    return (
+        b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                sample_rate * block_align, block_align, sample_width * 8)
+        + b"data" + struct.pack("<I", unknown)
+    )
+
+
+def create_tts_engine(name=None):
+    name = (name or TTS_ENGINE).lower()
+    if name == "pyttsx3":
+        return Pyttsx3Engine()
+    if name != "gtts":
+        logger.warning("⚠️ Unknown TTS_ENGINE '%s' — using gtts", name)
+    return GTTSEngine()
+
+
+# ===========================================================
+# Cache Tiers
+# ===========================================================
+
+class DiskAudioCache:
+    """Size-capped directory of <key><suffix> audio files."""
+
+    def __init__(self, directory, max_bytes, suffix=".mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # recency for eviction
+        except OSError:
+            pass
+        return data
+
+    def set(self, key, data: bytes):
+        # Write-then-rename so readers (and other workers) never see partial files
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Rescan: other workers share the directory, so the running total is approximate
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+        self._bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+# ===========================================================
+# Service
+# ===========================================================
+
+class TTSService:
+    """Memory → disk → synthesize lookup for TTS audio, plus sentence streaming."""
+
+    def __init__(self, engine=None, memory=None, disk=None, stream_concurrency=TTS_STREAM_CONCURRENCY):
+        self.engine = engine or create_tts_engine()
+        self.memory = memory or LRUCache(
+            max_entries=TTS_CACHE_MAX_ENTRIES,
+            max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024),
+            size_fn=len,
+            name="tts-memory",
+        )
+        self.disk = disk
+        self.stream_concurrency = max(1, stream_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        self.disk_hits = 0
+        self.syntheses = 0
+        self.streams = 0
+
+    @property
+    def mimetype(self):
+        return self.engine.mimetype
+
+    def resolve(self, lang=None, voice=None):
+        """Apply defaults and check (lang, voice) against the engine; raises ValueError."""
+        lang = lang or TTS_DEFAULT_LANG
+        voice = voice or self.engine.default_voice
+        if not isinstance(lang, str) or not isinstance(voice, str):
+            raise ValueError("lang and voice must be strings")
+        self.engine.validate(lang, voice)
+        return lang, voice
+
+    def key(self, text, lang=None, voice=None):
+        lang, voice = self.resolve(lang, voice)
+        return tts_key(text, lang, voice, self.engine.name)
+
+    def get_audio(self, text, lang=None, voice=None):
+        """Return (key, audio_bytes), synthesizing only on a miss in both tiers. Raises ValueError on bad lang/voice."""
+        lang, voice = self.resolve(lang, voice)
+        key = tts_key(text, lang, voice, self.engine.name)
+        data = self.memory.get(key)
+        if data is not None:
+            return key, data
+
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.memory.set(key, data)
+                return key, data
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return key, future.result()
+
+        try:
+            with span("tts.synthesize", engine=self.engine.name):
+                data = self.engine.synthesize(text, lang, voice)
+            with self._lock:
+                self.syntheses += 1
+            self.memory.set(key, data)
+            if self.disk is not None:
+                try:
+                    self.disk.set(key, data)
+                except OSError:
+                    logger.warning("⚠️ [TTS Cache] Disk write failed", exc_info=True)
+            future.set_result(data)
+            return key, data
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # -------------------------------------------------------
+    # Streaming
+    # -------------------------------------------------------
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.stream_concurrency * 4, thread_name_prefix="tts"
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def _clips_in_order(self, sentences, lang, voice):
+        # Keep at most stream_concurrency sentences in flight per stream
+        pool = self._pool()
+        pending = deque()
+        remaining = iter(sentences)
+        try:
+            for sentence in remaining:
+                pending.append(pool.submit(self.get_audio, sentence, lang, voice))
+                if len(pending) >= self.stream_concurrency:
+                    break
+            while pending:
+                _, clip = pending.popleft().result()
+                next_sentence = next(remaining, None)
+                if next_sentence is not None:
+                    pending.append(pool.submit(self.get_audio, next_sentence, lang, voice))
+                yield clip
+        finally:
+            # Client went away (or a sentence failed): drop work not yet started
+            for future in pending:
+                future.cancel()
+
+    def stream_audio(self, text, lang=None, voice=None):
+        """
+        Audio bytes sentence by sentence, in order, ready for a chunked
+        response. lang / voice are checked up front (ValueError), before
+        anything is streamed.
+        """
+        lang, voice = self.resolve(lang, voice)
+        sentences = split_sentences(text)
+        with self._lock:
+            self.streams += 1
+        return self.engine.stream(self._clips_in_order(sentences, lang, voice))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "engine": self.engine.name,
+                "disk_hits": self.disk_hits,
+                "syntheses": self.syntheses,
+                "streams": self.streams,
+                "stream_concurrency": self.stream_concurrency,
+            }
+        return {
+            **counters,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+def create_tts_service():
+    engine = create_tts_engine()
+    disk = None
+    if TTS_DISK_CACHE_MAX_MB > 0:
+        try:
+            disk = DiskAudioCache(TTS_DISK_CACHE_DIR, int(TTS_DISK_CACHE_MAX_MB * 1024 * 1024), suffix=engine.suffix)
+        except OSError:
+            logger.warning("⚠️ [TTS Cache] Disk tier disabled", exc_info=True)
+    return TTSService(engine=engine, disk=disk)
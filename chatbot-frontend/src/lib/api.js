@@ -20,25 +20,40 @@ export async function getSessionHistory(user) {
             headers['Authorization'] = `Bearer ${token}`;
         }
 
-        const url = `http://localhost:5000/history/${user.uid}`;
-        const response = await fetch(url, {
-            method: 'GET',
-            headers
-        });
-
-        if (!response.ok) {
-            const errorData = await response.json();
-            console.error(`getSessionHistory: Backend responded with error`, {
-                url,
-                userId: user.uid,
-                status: response.status,
-                message: errorData.error,
+        // The endpoint is paged; follow next_cursor until the whole list is loaded
+        const sessions = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({
+                limit: '200',
+                fields: 'session_id,title,last_updated',
+            });
+            if (cursor) {
+                params.set('start_after', cursor);
+            }
+            const url = `http://localhost:5000/history/${user.uid}?${params}`;
+            const response = await fetch(url, {
+                method: 'GET',
+                headers
             });
-            throw new Error(errorData.error || 'Failed to fetch session history');
-        }
 
-        const data = await response.json();
-        return data.sessions || [];
+            if (!response.ok) {
+                const errorData = await response.json();
+                console.error(`getSessionHistory: Backend responded with error`, {
+                    url,
+                    userId: user.uid,
+                    status: response.status,
+                    message: errorData.error,
+                });
+                throw new Error(errorData.error || 'Failed to fetch session history');
+            }
+
+            const data = await response.json();
+            sessions.push(...(data.sessions || []));
+            cursor = data.next_cursor || null;
+        } while (cursor);
+
+        return sessions;
     } catch (error) {
         console.error('getSessionHistory: Failed to fetch session history for UID:', user.uid, 'Error:', error);
         throw error;